@@ -0,0 +1,260 @@
+import asyncio
+import datetime
+import json
+import signal
+import sys
+import threading
+from urllib.parse import parse_qs, unquote, urlsplit
+
+import main
+from main import FIELDS, KEYS, MARGIN_COLUMNS, NUMBERS, Factory
+from query import empty_row
+
+HOST = "127.0.0.1"
+PORT = 8080
+MAX_BATCH = 500
+REFRESH_INTERVAL = 1.0
+MAX_BODY = 1 << 20
+
+REASONS = {200: "OK", 201: "Created", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+           413: "Payload Too Large", 500: "Internal Server Error"}
+CREATE = {"employees": Factory.create_employee, "cars": Factory.create_car, "sales": Factory.create_sale}
+
+
+class HttpError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+def resolve(batch, outcomes):
+    for (*_, future), (result, error) in zip(batch, outcomes):
+        if future.done():
+            continue
+        if error is None:
+            future.set_result(result)
+        else:
+            future.set_exception(error)
+
+
+class BatchWriter:
+    def __init__(self, repo):
+        self.repo = repo
+        self.queue = asyncio.Queue()
+        self.lock = threading.Lock()
+
+    async def submit(self, op, table, value):
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put((op, table, value, future))
+        return await future
+
+    async def read(self, function, *args):
+        return await asyncio.get_running_loop().run_in_executor(None, self.locked, function, *args)
+
+    def locked(self, function, *args):
+        with self.lock:
+            return function(*args)
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            try:
+                first = await asyncio.wait_for(self.queue.get(), REFRESH_INTERVAL)
+            except asyncio.TimeoutError:
+                await loop.run_in_executor(None, self.locked, self.repo.refresh)
+                continue
+            await asyncio.sleep(0)
+            batch = self.take([first])
+            resolve(batch, await loop.run_in_executor(None, self.locked, self.write, batch))
+
+    def take(self, batch):
+        while len(batch) < MAX_BATCH and not self.queue.empty():
+            batch.append(self.queue.get_nowait())
+        return batch
+
+    def write(self, batch):
+        try:
+            results = self.repo.write_batch([(op, table, value) for op, table, value, _ in batch])
+        except ValueError as error:
+            if len(batch) == 1:
+                return [(None, error)]
+            return [outcome for item in batch for outcome in self.write([item])]
+        except Exception as error:
+            return [(None, error)] * len(batch)
+        return [(result, None) for result in results]
+
+    def flush(self):
+        while not self.queue.empty():
+            batch = self.take([])
+            resolve(batch, self.locked(self.write, batch))
+
+
+def make_record(table, body):
+    if not isinstance(body, dict):
+        raise HttpError(400, "Ожидается JSON-объект")
+    missing = [field for field in FIELDS[table] if field not in body]
+    if missing:
+        raise HttpError(400, "Не заполнены поля: " + ", ".join(missing))
+    values = {field: body[field] for field in FIELDS[table]}
+    try:
+        for field in NUMBERS.get(table, ()):
+            values[field] = float(values[field])
+    except (TypeError, ValueError):
+        raise HttpError(400, "Некорректное число")
+    if table == "sales":
+        try:
+            values["date"] = datetime.date.fromisoformat(values["date"]).isoformat()
+        except (TypeError, ValueError):
+            raise HttpError(400, "Некорректная дата, ожидается ГГГГ-ММ-ДД")
+    return CREATE[table](**values).to_dict()
+
+
+def date_range(query):
+    try:
+        return query["from"], query["to"]
+    except KeyError:
+        raise HttpError(400, "Укажите параметры from и to")
+
+
+def best(repo, field, query):
+    top = repo.top(field, *date_range(query))
+    if not top:
+        return {"name": None, "count": 0}
+    return {"name": top[0][0], "count": top[0][1]}
+
+
+def report(repo, name, query):
+    if name == "profit":
+        total = repo.margin(None, *date_range(query)).get(None, empty_row())
+        return {"revenue": total["revenue"], "total_profit": total["margin"], "unmatched": total["unmatched"]}
+    if name == "best-seller":
+        return best(repo, "employee", query)
+    if name == "best-car":
+        return best(repo, "car", query)
+    if name == "summary":
+        field = query.get("field", "employee")
+        if field not in ("employee", "car"):
+            raise HttpError(400, "field должен быть employee или car")
+        return repo.summary(field, *date_range(query))
+    if name == "margin":
+        by = query.get("by", "car")
+        if by not in MARGIN_COLUMNS:
+            raise HttpError(400, "by должен быть employee, car, manufacturer или month")
+        return repo.margin(by, *date_range(query))
+    raise HttpError(404, "Неизвестный отчёт")
+
+
+async def route(repo, writer, method, path, query, body):
+    parts = [unquote(part) for part in path.strip("/").split("/")]
+    table = parts[0]
+    if table == "reports" and len(parts) == 2:
+        if method != "GET":
+            raise HttpError(405, "Метод не поддерживается")
+        return 200, await writer.read(report, repo, parts[1], query)
+    if table not in FIELDS or len(parts) != 1:
+        raise HttpError(404, "Ресурс не найден")
+    if method == "GET":
+        if table == "sales" and "employee" in query:
+            return 200, await writer.read(repo.sales_of, query["employee"])
+        if table == "sales" and ("from" in query or "to" in query):
+            return 200, await writer.read(repo.sales_between, *date_range(query))
+        return 200, await writer.read(lambda: list(repo.all(table)))
+    if method == "POST":
+        try:
+            data = json.loads(body or b"null")
+        except ValueError:
+            raise HttpError(400, "Некорректный JSON")
+        try:
+            return 201, await writer.submit("add", table, make_record(table, data))
+        except ValueError as error:
+            raise HttpError(400, f"Некорректное поле: {error}")
+    if method == "DELETE":
+        missing = [field for field in KEYS[table] if field not in query]
+        if missing:
+            raise HttpError(400, "Не указаны параметры: " + ", ".join(missing))
+        record = await writer.submit("delete", table, {field: query[field] for field in KEYS[table]})
+        if record is None:
+            raise HttpError(404, "Запись не найдена")
+        return 200, record
+    raise HttpError(405, "Метод не поддерживается")
+
+
+def encode_response(status, payload, keep_alive):
+    body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+    head = (f"HTTP/1.1 {status} {REASONS[status]}\r\n"
+            "Content-Type: application/json; charset=utf-8\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n")
+    return head.encode("latin-1") + body
+
+
+async def read_request(reader):
+    head = await reader.readuntil(b"\r\n\r\n")
+    lines = head.decode("latin-1").split("\r\n")
+    method, target, version = lines[0].split(" ", 2)
+    headers = {}
+    for line in lines[1:]:
+        if ":" in line:
+            name, value = line.split(":", 1)
+            headers[name.strip().lower()] = value.strip()
+    length = int(headers.get("content-length", 0))
+    if length > MAX_BODY:
+        raise HttpError(413, "Слишком большой запрос")
+    body = await reader.readexactly(length) if length else b""
+    connection = headers.get("connection", "").lower()
+    keep_alive = connection != "close" if version == "HTTP/1.1" else connection == "keep-alive"
+    return method, target, body, keep_alive
+
+
+async def handle(repo, writer, reader, stream):
+    try:
+        while True:
+            try:
+                method, target, body, keep_alive = await read_request(reader)
+            except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError):
+                break
+            except (HttpError, ValueError) as error:
+                status = error.status if isinstance(error, HttpError) else 400
+                stream.write(encode_response(status, {"error": str(error)}, False))
+                await stream.drain()
+                break
+            url = urlsplit(target)
+            query = {name: values[-1] for name, values in parse_qs(url.query).items()}
+            try:
+                status, payload = await route(repo, writer, method, url.path, query, body)
+            except HttpError as error:
+                status, payload = error.status, {"error": str(error)}
+            except Exception as error:
+                status, payload = 500, {"error": str(error)}
+            stream.write(encode_response(status, payload, keep_alive))
+            await stream.drain()
+            if not keep_alive:
+                break
+    except ConnectionError:
+        pass
+    finally:
+        stream.close()
+
+
+async def serve(host=HOST, port=PORT):
+    repo = main.init_repository()
+    writer = BatchWriter(repo)
+    persistence = asyncio.create_task(writer.run())
+    if hasattr(signal, "SIGTERM") and sys.platform != "win32":
+        asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, asyncio.current_task().cancel)
+    server = await asyncio.start_server(lambda reader, stream: handle(repo, writer, reader, stream), host, port)
+    print(f"API слушает http://{host}:{port}")
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        persistence.cancel()
+        writer.flush()
+        repo.flush()
+
+
+if __name__ == "__main__":
+    try:
+        asyncio.run(serve(port=int(sys.argv[1]) if len(sys.argv) > 1 else PORT))
+    except (KeyboardInterrupt, asyncio.CancelledError):
+        pass
@@ -0,0 +1,201 @@
+import gzip
+import json
+import os
+from collections import OrderedDict
+
+import columnar
+
+MANIFEST = "manifest.json"
+CACHE_SEGMENTS = 4
+
+
+def month_of(date):
+    return date[:7]
+
+
+def write_atomic(path, data, compress=False):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as file:
+        text = json.dumps(data, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        file.write(gzip.compress(text) if compress else text)
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(tmp_path, path)
+
+
+def merge_groups(result, rows):
+    for name, row in rows.items():
+        target = result.get(name)
+        if target is None:
+            result[name] = dict(row)
+        else:
+            for key, value in row.items():
+                target[key] += value
+    return result
+
+
+class SalesArchive:
+    def __init__(self, directory, group_fields, value_fields):
+        self.directory = directory
+        self.group_fields = group_fields
+        self.value_fields = value_fields
+        self.cache = OrderedDict()
+        self.reload()
+
+    def reload(self):
+        try:
+            with open(os.path.join(self.directory, MANIFEST), "r", encoding="utf-8") as file:
+                manifest = json.load(file)
+        except FileNotFoundError:
+            manifest = {}
+        self.months = manifest.get("months", {})
+        self.pending = manifest.get("pending")
+        self.garbage = manifest.get("garbage", [])
+        self.serial = manifest.get("serial", 0)
+
+    def _save_manifest(self):
+        os.makedirs(self.directory, exist_ok=True)
+        write_atomic(os.path.join(self.directory, MANIFEST), {
+            "months": dict(sorted(self.months.items())),
+            "pending": self.pending,
+            "garbage": self.garbage,
+            "serial": self.serial,
+        })
+
+    def _collect_garbage(self):
+        for name in self.garbage:
+            try:
+                os.remove(os.path.join(self.directory, name))
+            except FileNotFoundError:
+                pass
+        self.garbage = []
+
+    def _summarize(self, records):
+        dates = [record["date"] for record in records]
+        return {
+            "count": len(records),
+            "min_date": min(dates),
+            "max_date": max(dates),
+            "totals": {field: sum(record[field] for record in records) for field in self.value_fields},
+            "groups": {field: columnar.summarize(records, field, self.value_fields) for field in self.group_fields},
+        }
+
+    def _store(self, month, records):
+        if month in self.months:
+            self.garbage.append(self.months.pop(month)["file"])
+        if not records:
+            return
+        self.serial += 1
+        name = f"segment-{self.serial}.json.gz"
+        os.makedirs(self.directory, exist_ok=True)
+        write_atomic(os.path.join(self.directory, name), records, compress=True)
+        self.months[month] = {"file": name, **self._summarize(records)}
+        self.cache[name] = records
+
+    def records(self, month):
+        name = self.months[month]["file"]
+        records = self.cache.get(name)
+        if records is None:
+            with gzip.open(os.path.join(self.directory, name), "rt", encoding="utf-8") as file:
+                records = self.cache[name] = json.load(file)
+            while len(self.cache) > CACHE_SEGMENTS:
+                self.cache.popitem(last=False)
+        else:
+            self.cache.move_to_end(name)
+        return records
+
+    def seal(self, sales, cutoff):
+        by_month = {}
+        for sale in sales:
+            by_month.setdefault(month_of(sale["date"]), []).append(sale)
+        self._collect_garbage()
+        for month, records in sorted(by_month.items()):
+            existing = self.records(month) if month in self.months else []
+            self._store(month, sorted(existing + records, key=lambda sale: sale["date"]))
+        self.pending = cutoff
+        self._save_manifest()
+
+    def commit(self):
+        if self.pending is not None:
+            self.pending = None
+            self._save_manifest()
+
+    def remove(self, key):
+        month = month_of(key["date"])
+        if month not in self.months:
+            return None
+        records = self.records(month)
+        self._collect_garbage()
+        for i, record in enumerate(records):
+            if all(record[field] == value for field, value in key.items()):
+                self._store(month, records[:i] + records[i + 1:])
+                self._save_manifest()
+                return record
+        return None
+
+    def _overlapping(self, start_date, end_date):
+        for month, stats in sorted(self.months.items()):
+            if start_date is None:
+                yield month, stats, True
+            elif not (stats["max_date"] < start_date or stats["min_date"] > end_date):
+                yield month, stats, start_date <= stats["min_date"] and stats["max_date"] <= end_date
+
+    def count(self):
+        return sum(stats["count"] for stats in self.months.values())
+
+    def all(self):
+        return [record for month in sorted(self.months) for record in self.records(month)]
+
+    def slice(self, start, stop=None):
+        result, offset = [], 0
+        for month, stats in sorted(self.months.items()):
+            if stop is not None and offset >= stop:
+                break
+            if offset + stats["count"] > start:
+                records = self.records(month)
+                result += records[max(0, start - offset):None if stop is None else stop - offset]
+            offset += stats["count"]
+        return result
+
+    def between(self, start_date, end_date):
+        result = []
+        for month, stats, full in self._overlapping(start_date, end_date):
+            records = self.records(month)
+            result += records if full else [r for r in records if start_date <= r["date"] <= end_date]
+        return result
+
+    def partition(self, field, start_date, end_date):
+        summaries, records = [], []
+        for month, stats, full in self._overlapping(start_date, end_date):
+            if full and field in stats["groups"]:
+                summaries.append(({"date": month}, stats["groups"][field]))
+            elif full:
+                records += self.records(month)
+            else:
+                records += [r for r in self.records(month) if start_date <= r["date"] <= end_date]
+        return summaries, records
+
+    def matching(self, field, name):
+        return [record for month, stats in sorted(self.months.items()) if name in stats["groups"][field]
+                for record in self.records(month) if record[field] == name]
+
+    def total(self, value_field, start_date=None, end_date=None):
+        total = 0
+        for month, stats, full in self._overlapping(start_date, end_date):
+            if full:
+                total += stats["totals"][value_field]
+            else:
+                for record in self.records(month):
+                    if start_date <= record["date"] <= end_date:
+                        total += record[value_field]
+        return total
+
+    def group(self, field, start_date=None, end_date=None):
+        result = {}
+        for month, stats, full in self._overlapping(start_date, end_date):
+            if full:
+                rows = stats["groups"][field]
+            else:
+                rows = columnar.summarize(self.records(month), field, self.value_fields, start_date, end_date)
+            merge_groups(result, rows)
+        return result
@@ -0,0 +1,38 @@
+import sys
+import tracemalloc
+
+from main import Sale
+from student_work import Resident
+
+
+def unslotted(cls):
+    return type(cls.__name__, (), {"__init__": cls.__init__})
+
+
+def measure(build, rows):
+    tracemalloc.start()
+    records = [build(*row) for row in rows]
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del records
+    return size / len(rows)
+
+
+def main(count=1_000_000):
+    sales = [(f"Сотрудник {i % 500}", f"Модель {i % 200}", f"2024-{i % 12 + 1:02d}-{i % 28 + 1:02d}", float(i))
+             for i in range(count)]
+    residents = [(f"Жилец {i}", i % 100) for i in range(count)]
+    cases = [
+        ("sales: dict", lambda *row: dict(zip(Sale.__slots__, row)), sales),
+        ("sales: Sale (__dict__)", unslotted(Sale), sales),
+        ("sales: Sale (__slots__)", Sale, sales),
+        ("residents: Resident (__dict__)", unslotted(Resident), residents),
+        ("residents: Resident (__slots__)", Resident, residents),
+    ]
+    print(f"{count} записей, байт на запись (без учёта самих значений полей):")
+    for title, build, rows in cases:
+        print(f"  {title:<34} {measure(build, rows):8.1f}")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000)
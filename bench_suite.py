@@ -0,0 +1,215 @@
+import argparse
+import contextlib
+import datetime
+import importlib.util
+import io
+import json
+import os
+import platform
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+from statistics import fmean
+
+SIZES = (1_000, 100_000, 1_000_000)
+FORMATS = (("none", 0), ("gzip", 1), ("gzip", 6), ("gzip", 9), ("lzma", 6))
+HERE = os.path.dirname(os.path.abspath(__file__))
+YEAR = "2024"
+
+
+def load_bookshop():
+    spec = importlib.util.spec_from_file_location("bookshop", os.path.join(HERE, "bookshop24 (1).py"))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def random_date(rng):
+    return f"{YEAR}-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}"
+
+
+def dealership_data(count, seed=1):
+    rng = random.Random(seed)
+    employees = [{"name": f"Сотрудник {i}", "position": "Менеджер", "phone": f"+7900{i:07d}",
+                  "email": f"e{i}@example.com"} for i in range(max(10, count // 1000))]
+    cars = [{"manufacturer": f"Марка {i % 10}", "year": str(2000 + i % 25), "model": f"Модель {i}",
+             "cost_price": 1_000_000.0 + i, "sale_price": 1_200_000.0 + i} for i in range(max(10, count // 5000))]
+    sales = [{"employee": rng.choice(employees)["name"], "car": rng.choice(cars)["model"], "date": random_date(rng),
+              "real_price": float(rng.randint(900_000, 1_500_000))} for _ in range(count)]
+    return {"employees": employees, "cars": cars, "sales": sales}
+
+
+def bookshop_data(count, seed=2):
+    rng = random.Random(seed)
+    employees = [{"name": f"Продавец {i}", "position": "Продавец", "phone": f"+7901{i:07d}",
+                  "email": f"s{i}@example.com"} for i in range(max(10, count // 1000))]
+    books = [{"title": f"Книга {i}", "year": str(1950 + i % 70), "author": f"Автор {i % 300}",
+              "genre": f"Жанр {i % 12}", "cost": 200 + i % 500, "price": 400 + i % 700}
+             for i in range(max(10, count // 100))]
+    sales = []
+    for _ in range(count):
+        book = rng.choice(books)
+        price = book["price"] - rng.randint(0, 100)
+        sales.append({"employee": rng.choice(employees)["name"], "book": book["title"], "date": random_date(rng),
+                      "sale_price": price, "profit": price - book["cost"]})
+    return {"employees": employees, "books": books, "sales": sales}
+
+
+def building(student_work, count, seed=3):
+    rng = random.Random(seed)
+    house = student_work.Building(save_delay=0)
+    house.import_data(f"bench_house_{count}.json")
+    per_apartment = 4
+    for num in range(max(1, count // per_apartment)):
+        apartment = student_work.Apartment(num, num // 8, rng.choice(("студия", "1к", "2к", "3к")))
+        apartment.occupants = [student_work.Resident(f"Жилец {num}-{i}", rng.randint(0, 95))
+                               for i in range(per_apartment)]
+        house.units[num] = apartment
+    house.index = student_work.ResidentIndex(house.units.values())
+    return house
+
+
+def measure(func, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    tracemalloc.start()
+    func()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return {"repeat": repeat, "best_s": min(times), "mean_s": fmean(times), "peak_bytes": peak}
+
+
+def quietly(func, answers):
+    def run():
+        replies = iter(answers)
+        func.__globals__["input"] = lambda prompt="": next(replies)
+        with contextlib.redirect_stdout(io.StringIO()):
+            func()
+    return run
+
+
+def uncached(main, func):
+    def run():
+        main.repo.cache.clear()
+        func()
+    return run
+
+
+def bench_dealership(main, count, repeat):
+    data = dealership_data(count)
+    period = (f"{YEAR}-03-01", f"{YEAR}-09-30")
+    results = {
+        "save_data": measure(lambda: main.save_data(data), repeat),
+        "load_data": measure(main.load_data, repeat),
+    }
+    main.repo = main.Repository(main.load_data())
+    results["report_total_profit"] = measure(uncached(main, quietly(main.report_total_profit, period)), repeat)
+    results["report_best_seller"] = measure(uncached(main, quietly(main.report_best_seller, period)), repeat)
+    return results
+
+
+def bench_bookshop(bookshop, count, repeat):
+    storage = bookshop.DataStorage(f"bench_store_{count}.json")
+    storage.load()
+    data = bookshop_data(count)
+    results = {
+        "DataStorage.save": measure(lambda: storage.save(data), repeat),
+        "DataStorage.load": measure(storage.load, repeat),
+    }
+    manager = bookshop.StoreManager(storage)
+    employee, book = data["employees"][0]["name"], data["books"][0]["title"]
+    results["StoreManager.record_sale"] = measure(lambda: manager.record_sale(employee, book, 500), repeat)
+    results["StoreManager.calculate_profit"] = measure(manager.calculate_profit, repeat)
+    return results
+
+
+def bench_building(student_work, count, repeat):
+    house = building(student_work, count)
+    path = house.file_path
+    results = {"Building.export_data": measure(lambda: house.export_data(path), repeat)}
+    fresh = student_work.Building(save_delay=0)
+    results["Building.import_data"] = measure(lambda: fresh.import_data(path), repeat)
+    return results
+
+
+def bench_formats(packed, count, repeat):
+    data = dealership_data(count)
+    path = f"bench_format_{count}.json"
+
+    def save_json():
+        with open(path, "w", encoding="utf-8") as file:
+            json.dump(data, file, indent=4, ensure_ascii=False)
+
+    results = {"json indent=4": {"save": measure(save_json, repeat)}}
+    results["json indent=4"]["load"] = measure(lambda: packed.load(path), repeat)
+    results["json indent=4"]["bytes"] = os.path.getsize(path)
+    for compression, level in FORMATS:
+        target = f"bench_format_{count}_{compression}{level}{packed.EXTENSION}"
+
+        def save():
+            with open(target, "wb") as file:
+                packed.dump(data, file, compression, level)
+
+        name = f"packed {compression}" + (f" level={level}" if compression != "none" else "")
+        results[name] = {"save": measure(save, repeat), "load": measure(lambda: packed.load(target), repeat),
+                         "bytes": os.path.getsize(target)}
+    return results
+
+
+def run(sizes):
+    sys.path.insert(0, HERE)
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory(prefix="bench_", ignore_cleanup_errors=True) as workdir:
+        os.chdir(workdir)
+        try:
+            return collect(sizes)
+        finally:
+            os.chdir(cwd)
+
+
+def collect(sizes):
+    import main
+    import packed
+    import student_work
+    bookshop = load_bookshop()
+    report = {
+        "timestamp": datetime.datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "numpy": main.columnar.numpy() is not None,
+        "results": {},
+    }
+    for count in sizes:
+        repeat = max(1, min(5, 100_000 // count))
+        report["results"][str(count)] = {
+            "dealership": bench_dealership(main, count, repeat),
+            "bookshop": bench_bookshop(bookshop, count, repeat),
+            "building": bench_building(student_work, count, repeat),
+            "formats": bench_formats(packed, count, repeat),
+        }
+        print(f"{count} записей готово", file=sys.stderr)
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Замеры производительности сохранения и отчётов")
+    parser.add_argument("--sizes", default=",".join(map(str, SIZES)), help="размеры данных через запятую")
+    parser.add_argument("--output", help="файл для JSON-результатов (по умолчанию stdout)")
+    args = parser.parse_args()
+    output = os.path.abspath(args.output) if args.output else None
+    report = run([int(size) for size in args.sizes.split(",")])
+    text = json.dumps(report, ensure_ascii=False, indent=4)
+    if output:
+        with open(output, "w", encoding="utf-8") as file:
+            file.write(text + "\n")
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
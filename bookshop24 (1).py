@@ -1,51 +1,376 @@
 import json
-import tkinter as tk
-from tkinter import messagebox
+import os
+import queue
+import sys
+import threading
+from bisect import bisect_left
+from collections import Counter
+from contextlib import contextmanager
 from datetime import datetime
 
+import cli
+import columnar
+import formats
+import metrics
+import packed
+import snapshot
+import sqlite_storage
+from archive import SalesArchive, merge_groups, month_of
+from query import MarginQuery, empty_row, finish
+from report_cache import ReportCache
+from shared_file import SharedFile
+
+STORAGE = os.environ.get("STORAGE", "json")
+STORE_FILE = {"snapshot": "store" + snapshot.EXTENSION, "compact": "store" + packed.EXTENSION}.get(STORAGE, "store.json")
+ARCHIVE_DIR = "store_archive"
+PAGE_SIZE = 200
+MARGIN_COLUMNS = {None: "NULL", "employee": "s.employee", "book": "s.book", "author": "b.author", "genre": "b.genre",
+                  "month": "substr(s.date, 1, 7)"}
+MARGIN = MarginQuery("book", "sale_price", "cost", "price", MARGIN_COLUMNS, profit="profit")
+MARGIN_TITLES = {"employee": "Сотрудники", "book": "Книги", "author": "Авторы", "genre": "Жанры", "month": "Месяцы"}
+REFRESH_INTERVAL = 2
+STATUS_TEXT = {
+    "unsaved": "Есть несохранённые изменения",
+    "saving": "Сохранение...",
+    "saved": "Все изменения сохранены",
+    "error": "Ошибка сохранения",
+}
+
 
 class DataStorage:
     def __init__(self, filename="store.json"):
         self.filename = filename
+        self.shared = SharedFile(filename)
+        self.version = None
 
-    def save(self, data):
-        with open(self.filename, "w") as file:
-            json.dump(data, file, indent=4)
+    def _write(self, data):
+        size = formats.write(self.filename, lambda: data, lambda: json.dumps(data, indent=4))
+        if metrics.enabled:
+            metrics.count("bytes_written.store", size)
 
-    def load(self):
+    def _read(self):
         try:
-            with open(self.filename, "r") as file:
-                return json.load(file)
+            return formats.read(self.filename)
         except FileNotFoundError:
             return {"employees": [], "books": [], "sales": []}
 
+    @metrics.timed("DataStorage.save")
+    def save(self, data, changes=()):
+        with self.shared.lock():
+            merged = None
+            if self.shared.version() != self.version:
+                merged = self._read()
+                for table, record in changes:
+                    merged[table].append(record)
+            self._write(data if merged is None else merged)
+            self.version = self.shared.bump()
+        return merged
+
+    @metrics.timed("DataStorage.load")
+    def load(self):
+        with self.shared.lock(exclusive=False):
+            self.version = self.shared.version()
+            return self._loaded(self._read())
+
+    def _loaded(self, data):
+        return data
+
+    def reload(self):
+        return self.load()
+
+    def seal(self, archive, cutoff):
+        with self.shared.lock():
+            archive.reload()
+            data = self._read()
+            sales = data["sales"]
+            if archive.pending is not None:
+                sales = [sale for sale in sales if month_of(sale["date"]) >= archive.pending]
+            sealed = [sale for sale in sales if month_of(sale["date"]) < cutoff]
+            if sealed:
+                archive.seal(sealed, cutoff)
+            if archive.pending is None:
+                self.version = self.shared.version()
+            else:
+                data = {**data, "sales": [sale for sale in sales if month_of(sale["date"]) >= cutoff]}
+                self._write(data)
+                self.version = self.shared.bump()
+                archive.commit()
+            return self._loaded(data)
+
+    def changed(self):
+        return self.shared.current_version() != self.version
+
+    def flush(self):
+        pass
+
+    def poll(self):
+        return None
+
+
+class BackgroundStorage(DataStorage):
+    def __init__(self, filename="store.json"):
+        super().__init__(filename)
+        self.written = None
+        self.unwritten = []
+        self.seen_version = None
+        self.generation = 0
+        self.fresh = None
+        self.lock = threading.Lock()
+        self.wakeup = queue.Queue()
+        self.events = queue.Queue()
+        threading.Thread(target=self._run, daemon=True).start()
+
+    def _loaded(self, data):
+        self.written = {key: value.copy() for key, value in data.items()}
+        self.seen_version = self.version
+        return data
+
+    def reload(self):
+        data, self.fresh = self.fresh, None
+        return data
+
+    def changed(self):
+        return self.fresh is not None
+
+    def save(self, data, changes=()):
+        with self.lock:
+            self.unwritten.extend(changes)
+            self.generation += 1
+        self.events.put(("unsaved", None))
+        self.wakeup.put(True)
+
+    def _run(self):
+        while True:
+            try:
+                self.wakeup.get(timeout=REFRESH_INTERVAL)
+            except queue.Empty:
+                self._check_changes()
+                continue
+            with self.lock:
+                batch = list(self.unwritten)
+            try:
+                if batch:
+                    self.events.put(("saving", None))
+                    self._write_batch(batch)
+                    with self.lock:
+                        self.events.put(("unsaved" if self.unwritten else "saved", None))
+            except Exception as error:
+                self.version = None
+                self.events.put(("error", str(error)))
+            finally:
+                self.wakeup.task_done()
+
+    def _check_changes(self):
+        try:
+            version = self.shared.current_version()
+            with self.lock:
+                if version == self.seen_version:
+                    return
+            with self.shared.lock(exclusive=False):
+                data = self._read()
+                with self.lock:
+                    self.seen_version = self.shared.version()
+                    generation = self.generation
+                    for table, record in self.unwritten:
+                        data[table].append(record)
+            self.events.put(("reloaded", (data, generation)))
+        except Exception as error:
+            self.events.put(("error", str(error)))
+
+    @metrics.timed("DataStorage.save")
+    def _write_batch(self, batch):
+        with self.shared.lock():
+            old_version = self.shared.version()
+            if old_version != self.version:
+                self.written = self._read()
+            for table, record in batch:
+                self.written[table].append(record)
+            self._write(self.written)
+            self.version = self.shared.bump()
+            with self.lock:
+                del self.unwritten[:len(batch)]
+                if self.seen_version == old_version:
+                    self.seen_version = self.version
+
+    def flush(self):
+        self.wakeup.join()
+        with self.lock:
+            batch = list(self.unwritten)
+        if batch:
+            try:
+                self._write_batch(batch)
+            except Exception:
+                self.version = None
+                raise
+
+    def poll(self):
+        event = None
+        while True:
+            try:
+                state, message = self.events.get_nowait()
+            except queue.Empty:
+                return event
+            if state != "reloaded":
+                event = (state, message)
+                continue
+            data, generation = message
+            with self.lock:
+                if generation == self.generation:
+                    self.fresh = data
+                else:
+                    self.seen_version = None
+
+
+def open_archive():
+    return SalesArchive(ARCHIVE_DIR, ("employee", "book", "date"), ("sale_price", "profit"))
+
+
+def trigrams(text):
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+class TitleIndex:
+    def __init__(self, titles=()):
+        self.keys = sorted({(title.casefold(), title) for title in titles})
+        self.trigrams = {}
+        for key, title in self.keys:
+            for gram in trigrams(key):
+                self.trigrams.setdefault(gram, set()).add(title)
+
+    def add(self, title):
+        entry = (title.casefold(), title)
+        i = bisect_left(self.keys, entry)
+        if i < len(self.keys) and self.keys[i] == entry:
+            return
+        self.keys.insert(i, entry)
+        for gram in trigrams(entry[0]):
+            self.trigrams.setdefault(gram, set()).add(title)
+
+    def complete(self, prefix, limit=10):
+        prefix = prefix.casefold()
+        result = []
+        for key, title in self.keys[bisect_left(self.keys, (prefix,)):]:
+            if len(result) == limit or not key.startswith(prefix):
+                break
+            result.append(title)
+        return result
+
+    def search(self, fragment, limit=10):
+        fragment = fragment.casefold()
+        postings = sorted((self.trigrams.get(gram, set()) for gram in trigrams(fragment)), key=len)
+        if not postings:
+            return self.complete(fragment, limit)
+        candidates = postings[0].intersection(*postings[1:])
+        return sorted(title for title in candidates if fragment in title.casefold())[:limit]
+
 
 class StoreManager:
-    def __init__(self):
-        self.storage = DataStorage()
-        self.data = self.storage.load()
+    def __init__(self, storage=None, archive=None):
+        self.storage = storage or DataStorage()
+        self.archive = archive
+        self.cache = ReportCache()
+        self.changes = []
+        self.deferred = False
+        if archive is None:
+            self.set_data(self.storage.load())
+        else:
+            self.set_data(self.storage.seal(archive, datetime.now().strftime("%Y-%m")))
+
+    def set_data(self, data):
+        self.data = data
+        self.cache.clear()
+        self.employees_by_name = {}
+        for employee in self.data["employees"]:
+            self.employees_by_name.setdefault(employee["name"].casefold(), employee)
+        self.books_by_title = {}
+        for book in self.data["books"]:
+            self.books_by_title.setdefault(book["title"].casefold(), book)
+        self.title_index = None
+        sales = self.data["sales"]
+        if isinstance(sales, snapshot.Table):
+            self.total_profit = sales.total("profit")
+            self.profit_by_day = Counter(sales.group_total("date", "profit"))
+            self.profit_by_employee = Counter(sales.group_total("employee", "profit"))
+        else:
+            self.total_profit = 0
+            self.profit_by_day = Counter()
+            self.profit_by_employee = Counter()
+            for sale in sales:
+                self._count_sale(sale)
+        if self.archive is not None:
+            self.archive.reload()
+            self.total_profit += self.archive.total("profit")
+            self.profit_by_day.update({day: row["profit"] for day, row in self.archive.group("date").items()})
+            self.profit_by_employee.update({name: row["profit"] for name, row in self.archive.group("employee").items()})
+        self.columns = None
+
+    def _count_sale(self, sale):
+        self.cache.touch(tags=("sales",))
+        self.total_profit += sale["profit"]
+        self.profit_by_day[sale["date"]] += sale["profit"]
+        self.profit_by_employee[sale["employee"]] += sale["profit"]
+
+    @contextmanager
+    def batch(self):
+        deferred, self.deferred = self.deferred, True
+        try:
+            yield self
+        finally:
+            self.deferred = deferred
+            if not deferred and self.changes:
+                self.save_data()
 
     def save_data(self):
-        self.storage.save(self.data)
+        if self.deferred:
+            return
+        merged = self.storage.save(self.data, self.changes)
+        self.changes = []
+        if merged is not None:
+            self.set_data(merged)
+
+    def refresh(self):
+        if not self.storage.changed():
+            return False
+        self.set_data(self.storage.reload())
+        return True
+
+    def flush(self):
+        self.storage.flush()
 
+    def poll_storage(self):
+        return self.storage.poll()
+
+    @metrics.timed("StoreManager.add_employee")
     def add_employee(self, name, position, phone, email):
-        self.data["employees"].append(
-            {"name": name.title(), "position": position.title(), "phone": phone, "email": email}
-        )
+        employee = {"name": name.title(), "position": position.title(), "phone": phone, "email": email}
+        self.data["employees"].append(employee)
+        self.changes.append(("employees", employee))
+        self.employees_by_name.setdefault(employee["name"].casefold(), employee)
         self.save_data()
 
+    @metrics.timed("StoreManager.add_book")
     def add_book(self, title, year, author, genre, cost, price):
-        self.data["books"].append(
-            {"title": title.title(), "year": year, "author": author.title(), "genre": genre.title(), "cost": cost, "price": price}
-        )
+        book = {"title": title.title(), "year": year, "author": author.title(), "genre": genre.title(), "cost": cost, "price": price}
+        self.data["books"].append(book)
+        self.changes.append(("books", book))
+        self.books_by_title.setdefault(book["title"].casefold(), book)
+        self.cache.touch(tags=("books",))
+        if self.title_index is not None:
+            self.title_index.add(book["title"])
         self.save_data()
 
-    def record_sale(self, employee_name, book_title, sale_price):
-        employee_name = employee_name.lower()
-        book_title = book_title.lower()
+    def complete_title(self, text, limit=10):
+        if self.title_index is None:
+            self.title_index = TitleIndex(self.books_by_title[key]["title"] for key in self.books_by_title)
+        result = self.title_index.complete(text, limit)
+        if len(result) < limit and len(text) >= 3:
+            result += [title for title in self.title_index.search(text, limit) if title not in result][:limit - len(result)]
+        return result
 
-        employee = next((e for e in self.data["employees"] if e["name"].lower() == employee_name), None)
-        book = next((b for b in self.data["books"] if b["title"].lower() == book_title), None)
+    @metrics.timed("StoreManager.record_sale")
+    def record_sale(self, employee_name, book_title, sale_price):
+        employee = self.employees_by_name.get(employee_name.casefold())
+        book = self.books_by_title.get(book_title.casefold())
 
         if not employee or not book:
             raise ValueError("Сотрудник или книга не найдены")
@@ -59,19 +384,304 @@ class StoreManager:
         }
 
         self.data["sales"].append(sale)
+        self.changes.append(("sales", sale))
+        self._count_sale(sale)
+        if self.columns is not None:
+            self.columns.append(sale)
         self.save_data()
+        return sale
 
+    @metrics.timed("StoreManager.calculate_profit")
     def calculate_profit(self):
-        return sum(s["profit"] for s in self.data["sales"])
+        return self.total_profit
+
+    def day_profit(self, date):
+        return self.profit_by_day[date]
+
+    def employee_profit(self, name):
+        return self.profit_by_employee[name]
+
+    def sales_summary(self, field):
+        return self.cache.get(("sales_summary", field), lambda: self._sales_summary(field), tags=("sales",))
+
+    @metrics.timed("StoreManager.sales_summary")
+    def _sales_summary(self, field):
+        if metrics.enabled:
+            metrics.count("scanned.sales_summary", len(self.data["sales"]))
+        if self.columns is None and columnar.numpy() is not None:
+            self.columns = columnar.SalesColumns(self.data["sales"], ("employee", "book"), ("sale_price", "profit"))
+        if self.columns is not None:
+            summary = self.columns.group(field)
+        else:
+            summary = columnar.summarize(self.data["sales"], field, ("sale_price", "profit"))
+        if self.archive is not None:
+            merge_groups(summary, self.archive.group(field))
+        for row in summary.values():
+            row["margin"] = row["profit"] / row["sale_price"] * 100 if row["sale_price"] else 0
+        return summary
+
+    def _book(self, title):
+        return self.books_by_title.get(title.casefold())
+
+    def margin(self, by, start_date=None, end_date=None):
+        return self.cache.get(("margin", by, start_date, end_date), lambda: self._margin(by, start_date, end_date),
+                              tags=("sales", "books"))
+
+    @metrics.timed("StoreManager.margin")
+    def _margin(self, by, start_date, end_date):
+        sales = self.data["sales"]
+        if start_date is not None:
+            sales = [sale for sale in sales if start_date <= sale["date"] <= end_date]
+        summaries = []
+        if self.archive is not None:
+            summaries, archived = self.archive.partition(None if by == "employee" else MARGIN.key, start_date, end_date)
+            sales = archived + list(sales)
+        if metrics.enabled:
+            metrics.count("scanned.margin", len(sales))
+        return MARGIN.group(sales, self._book, by, summaries)
+
+    def sales_count(self):
+        return len(self.data["sales"]) + (self.archive.count() if self.archive is not None else 0)
+
+    @metrics.timed("StoreManager.get_sales")
+    def get_sales(self, start=0, count=None):
+        stop = None if count is None else start + count
+        archived = self.archive.count() if self.archive is not None else 0
+        sales = self.data["sales"][max(0, start - archived):None if stop is None else max(0, stop - archived)]
+        if start < archived:
+            sales = self.archive.slice(start, stop) + list(sales)
+        if metrics.enabled:
+            metrics.count("scanned.get_sales", len(sales))
+        return sales
+
+
+class SqliteStoreManager(StoreManager):
+    cache = None
+
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS employees (
+        id INTEGER PRIMARY KEY, name TEXT, name_key TEXT, position TEXT, phone TEXT, email TEXT
+    );
+    CREATE INDEX IF NOT EXISTS employees_name ON employees (name_key);
+    CREATE TABLE IF NOT EXISTS books (
+        id INTEGER PRIMARY KEY, title TEXT, title_key TEXT, year TEXT, author TEXT, genre TEXT, cost REAL, price REAL
+    );
+    CREATE INDEX IF NOT EXISTS books_title ON books (title_key);
+    CREATE INDEX IF NOT EXISTS books_exact_title ON books (title);
+    CREATE TABLE IF NOT EXISTS sales (
+        id INTEGER PRIMARY KEY, employee TEXT, book TEXT, date TEXT, sale_price REAL, profit REAL
+    );
+    CREATE INDEX IF NOT EXISTS sales_date ON sales (date);
+    """
+
+    def __init__(self, db_path="store.db", json_path="store.json"):
+        self.db = sqlite_storage.connect(db_path, self.SCHEMA)
+        self.columns = None
+        if sqlite_storage.is_empty(self.db, ("employees", "books", "sales")) and os.path.exists(json_path):
+            data = DataStorage(json_path).load()
+            data["sales"] = open_archive().all() + list(data["sales"])
+            with self.db:
+                for employee in data["employees"]:
+                    self._insert_employee(employee)
+                for book in data["books"]:
+                    self._insert_book(book)
+                for sale in data["sales"]:
+                    self._insert_sale(sale)
+
+    def _insert_employee(self, employee):
+        self.db.execute("INSERT INTO employees (name, name_key, position, phone, email) VALUES (?, ?, ?, ?, ?)",
+                        (employee["name"], employee["name"].casefold(), employee["position"], employee["phone"],
+                         employee["email"]))
+
+    def _insert_book(self, book):
+        self.db.execute(
+            "INSERT INTO books (title, title_key, year, author, genre, cost, price) VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (book["title"], book["title"].casefold(), book["year"], book["author"], book["genre"], book["cost"],
+             book["price"]),
+        )
+
+    def _insert_sale(self, sale):
+        self.db.execute("INSERT INTO sales (employee, book, date, sale_price, profit) VALUES (?, ?, ?, ?, ?)",
+                        (sale["employee"], sale["book"], sale["date"], sale["sale_price"], sale["profit"]))
+
+    @contextmanager
+    def batch(self):
+        yield self
+
+    def save_data(self):
+        pass
 
-    def get_sales(self):
-        return self.data["sales"]
+    def refresh(self):
+        return False
+
+    def flush(self):
+        pass
+
+    def poll_storage(self):
+        return None
+
+    @metrics.timed("StoreManager.add_employee")
+    def add_employee(self, name, position, phone, email):
+        with self.db:
+            self._insert_employee({"name": name.title(), "position": position.title(), "phone": phone, "email": email})
+
+    @metrics.timed("StoreManager.add_book")
+    def add_book(self, title, year, author, genre, cost, price):
+        with self.db:
+            self._insert_book({"title": title.title(), "year": year, "author": author.title(), "genre": genre.title(),
+                               "cost": cost, "price": price})
+
+    @metrics.timed("StoreManager.record_sale")
+    def record_sale(self, employee_name, book_title, sale_price):
+        employee = self.db.execute("SELECT name FROM employees WHERE name_key = ? ORDER BY id LIMIT 1",
+                                   (employee_name.casefold(),)).fetchone()
+        book = self.db.execute("SELECT title, cost FROM books WHERE title_key = ? ORDER BY id LIMIT 1",
+                               (book_title.casefold(),)).fetchone()
+
+        if not employee or not book:
+            raise ValueError("Сотрудник или книга не найдены")
+
+        sale = {
+            "employee": employee["name"],
+            "book": book["title"],
+            "date": datetime.now().strftime("%Y-%m-%d"),
+            "sale_price": sale_price,
+            "profit": sale_price - book["cost"]
+        }
+        with self.db:
+            self._insert_sale(sale)
+        return sale
+
+    def complete_title(self, text, limit=10):
+        key = text.casefold()
+        result = [row[0] for row in self.db.execute(
+            "SELECT DISTINCT title FROM books WHERE title_key >= ? AND title_key < ? ORDER BY title_key LIMIT ?",
+            (key, key + "\U0010ffff", limit))]
+        if len(result) < limit and len(key) >= 3:
+            for (title,) in self.db.execute("SELECT DISTINCT title FROM books WHERE instr(title_key, ?) > 0 "
+                                            "ORDER BY title_key LIMIT ?", (key, limit)):
+                if title not in result and len(result) < limit:
+                    result.append(title)
+        return result
+
+    @metrics.timed("StoreManager.calculate_profit")
+    def calculate_profit(self):
+        return self.db.execute("SELECT COALESCE(SUM(profit), 0) FROM sales").fetchone()[0]
+
+    def day_profit(self, date):
+        return self.db.execute("SELECT COALESCE(SUM(profit), 0) FROM sales WHERE date = ?", (date,)).fetchone()[0]
+
+    def employee_profit(self, name):
+        return self.db.execute("SELECT COALESCE(SUM(profit), 0) FROM sales WHERE employee = ?", (name,)).fetchone()[0]
+
+    def sales_count(self):
+        return self.db.execute("SELECT COUNT(*) FROM sales").fetchone()[0]
+
+    @metrics.timed("StoreManager.get_sales")
+    def get_sales(self, start=0, count=None):
+        sales = [dict(row) for row in self.db.execute(
+            "SELECT employee, book, date, sale_price, profit FROM sales ORDER BY id LIMIT ? OFFSET ?",
+            (-1 if count is None else count, start))]
+        if metrics.enabled:
+            metrics.count("scanned.get_sales", len(sales))
+        return sales
+
+    @metrics.timed("StoreManager.sales_summary")
+    def sales_summary(self, field):
+        if field not in ("employee", "book"):
+            raise ValueError(field)
+        summary = {}
+        for name, count, revenue, profit in self.db.execute(
+                f"SELECT {field}, COUNT(*), SUM(sale_price), SUM(profit) FROM sales GROUP BY {field}"):
+            summary[name] = {"count": count, "sale_price": revenue, "profit": profit,
+                             "margin": profit / revenue * 100 if revenue else 0}
+        if metrics.enabled:
+            metrics.count("scanned.sales_summary", sum(row["count"] for row in summary.values()))
+        return summary
+
+    @metrics.timed("StoreManager.margin")
+    def margin(self, by, start_date=None, end_date=None):
+        if by not in MARGIN_COLUMNS:
+            raise ValueError(by)
+        where, params = ("WHERE s.date BETWEEN ? AND ? ", (start_date, end_date)) if start_date is not None else ("", ())
+        result = {}
+        for row in self.db.execute(
+                f"SELECT {MARGIN_COLUMNS[by]}, COUNT(*), COALESCE(SUM(s.sale_price), 0), "
+                "COALESCE(SUM(s.sale_price - s.profit), 0), COALESCE(SUM(s.profit), 0), COALESCE(SUM(b.price), 0), "
+                "COALESCE(SUM(b.price - s.sale_price), 0), COUNT(*) - COUNT(b.id), COUNT(*) "
+                "FROM sales s LEFT JOIN books b ON b.id = (SELECT id FROM books WHERE title = s.book ORDER BY id LIMIT 1) "
+                f"{where}GROUP BY 1", params):
+            result[row[0]] = dict(zip(empty_row(), row[1:]))
+        if metrics.enabled:
+            metrics.count("scanned.margin", sum(row["count"] for row in result.values()))
+        return finish(result)
+
+
+def open_manager(storage_class=DataStorage):
+    if STORAGE == "sqlite":
+        return SqliteStoreManager()
+    return StoreManager(storage_class(STORE_FILE), open_archive())
+
+
+def format_sale(sale):
+    return f"{sale['date']} - {sale['employee']} продал {sale['book']} за {sale['sale_price']}₸\n"
+
+
+def format_stats(manager):
+    if manager.cache is None:
+        return metrics.report()
+    return metrics.report() + "\n" + manager.cache.report()
+
+
+def format_summary(manager):
+    lines = []
+    for title, field in (("Сотрудники", "employee"), ("Книги", "book")):
+        lines.append(f"{title}:")
+        summary = manager.sales_summary(field)
+        for name, row in sorted(summary.items(), key=lambda item: -item[1]["profit"]):
+            lines.append(f"{name}: {row['count']} шт., выручка {row['sale_price']}тг., "
+                         f"прибыль {row['profit']}тг., маржа {row['margin']:.1f}%")
+    return "\n".join(lines)
+
+
+def format_margin(manager, by, start_date=None, end_date=None):
+    lines = [f"{MARGIN_TITLES[by]}:"]
+    for name, row in cli.margin_rows(manager, by, start_date, end_date):
+        lines.append(f"{name or 'Нет в каталоге'}: {row['count']} шт., выручка {row['revenue']}тг., "
+                     f"прибыль {row['margin']}тг., маржа {row['margin_pct']:.1f}%")
+    return "\n".join(lines)
+
+
+def format_discounts(manager, start_date=None, end_date=None):
+    lines = ["Скидки от цены продажи:"]
+    for name, row in cli.margin_rows(manager, "book", start_date, end_date, "discount"):
+        if row["unmatched"]:
+            lines.append(f"{name}: {row['count']} шт., книги нет в каталоге")
+        else:
+            lines.append(f"{name}: {row['count']} шт., по цене {row['list_price']}тг., продано за {row['revenue']}тг., "
+                         f"скидка {row['discount']}тг. ({row['discount_pct']:.1f}%)")
+    return "\n".join(lines)
+
+
+def format_employee_profit(manager, start_date=None, end_date=None):
+    lines = ["Прибыльность сотрудников:"]
+    for name, row in cli.margin_rows(manager, "employee", start_date, end_date):
+        lines.append(f"{name}: {row['count']} шт., выручка {row['revenue']}тг., прибыль {row['margin']}тг. "
+                     f"({row['margin_pct']:.1f}%), в среднем {row['margin_per_sale']:.2f}тг. с продажи, "
+                     f"скидки {row['discount']}тг.")
+    return "\n".join(lines)
 
 
 class BookstoreApp:
     def __init__(self, root):
-        self.manager = StoreManager()
+        import tkinter as tk
+        from tkinter import messagebox
+        self.tk = tk
+        self.messagebox = messagebox
+        self.manager = open_manager(BackgroundStorage)
+        self.root = root
         root.title("Учёт продаж книг")
+        root.protocol("WM_DELETE_WINDOW", self.close)
 
         label_font = ("Arial", 12, "bold")
         entry_font = ("Arial", 12)
@@ -130,6 +740,10 @@ class BookstoreApp:
         tk.Label(root, text="Книга:", font=entry_font).grid(row=16, column=0)
         self.sale_book = tk.Entry(root)
         self.sale_book.grid(row=16, column=1)
+        self.sale_book.bind("<KeyRelease>", self.suggest_titles)
+        self.book_suggestions = tk.Listbox(root, height=5, width=30)
+        self.book_suggestions.grid(row=15, column=2, rowspan=4, padx=5)
+        self.book_suggestions.bind("<<ListboxSelect>>", self.pick_title)
 
         tk.Label(root, text="Цена продажи:", font=entry_font).grid(row=17, column=0)
         self.sale_price = tk.Entry(root)
@@ -138,14 +752,53 @@ class BookstoreApp:
         tk.Button(root, text="Оформить продажу", command=self.record_sale).grid(row=18, column=0, columnspan=2, pady=5)
 
         tk.Button(root, text="Посчитать прибыль", command=self.show_profit).grid(row=19, column=0, columnspan=2, pady=5)
+        tk.Button(root, text="Маржа и скидки", command=self.show_margin).grid(row=19, column=2, pady=5)
 
         self.sales_list = tk.Text(root, height=10, width=50)
         self.sales_list.grid(row=20, column=0, columnspan=2)
+
+        tk.Button(root, text="Сводка продаж", command=self.show_summary).grid(row=21, column=0, columnspan=2, pady=5)
+        if metrics.enabled:
+            tk.Button(root, text="Статистика", command=self.show_stats).grid(row=21, column=2, pady=5)
+
+        pages = tk.Frame(root)
+        pages.grid(row=22, column=0, columnspan=2, pady=5)
+        tk.Button(pages, text="<", command=lambda: self.show_sales(self.page - 1)).pack(side=tk.LEFT)
+        self.page_label = tk.Label(pages, font=entry_font)
+        self.page_label.pack(side=tk.LEFT, padx=5)
+        tk.Button(pages, text=">", command=lambda: self.show_sales(self.page + 1)).pack(side=tk.LEFT)
+        self.page = 0
         self.show_sales()
 
+        self.status = tk.Label(root, text=STATUS_TEXT["saved"], font=entry_font)
+        self.status.grid(row=23, column=0, columnspan=2, pady=5)
+        self.poll_storage()
+
+    def poll_storage(self):
+        event = self.manager.poll_storage()
+        if event is not None:
+            state, message = event
+            self.status.config(text=STATUS_TEXT[state])
+            if state == "error":
+                self.messagebox.showerror("Ошибка", f"Не удалось сохранить данные: {message}")
+        if self.manager.refresh():
+            self.show_sales(self.page)
+        self.root.after(100, self.poll_storage)
+
+    def close(self):
+        self.status.config(text=STATUS_TEXT["saving"])
+        self.root.update_idletasks()
+        try:
+            self.manager.flush()
+        except Exception as error:
+            self.status.config(text=STATUS_TEXT["error"])
+            self.messagebox.showerror("Ошибка", f"Не удалось сохранить данные: {error}")
+            return
+        self.root.destroy()
+
     def add_employee(self):
         self.manager.add_employee(self.emp_name.get(), self.emp_position.get(), self.emp_phone.get(), self.emp_email.get())
-        messagebox.showinfo("Успешное сохранение", "Сотрудник добавлен!")
+        self.messagebox.showinfo("Успешное сохранение", "Сотрудник добавлен!")
 
     def add_book(self):
         title = self.book_title.get().strip().title()
@@ -156,38 +809,197 @@ class BookstoreApp:
         price = self.book_price.get().strip()
 
         if not year.isdigit():
-            messagebox.showerror("Ошибка", "Год публикации должен содержать только цифры!")
+            self.messagebox.showerror("Ошибка", "Год публикации должен содержать только цифры!")
             return
 
         try:
             cost = float(cost)
             price = float(price)
         except ValueError:
-            messagebox.showerror("Ошибка", "Себестоимость и цена продажи должны быть числами!")
+            self.messagebox.showerror("Ошибка", "Себестоимость и цена продажи должны быть числами!")
             return
 
         self.manager.add_book(title, year, author, genre, cost, price)
-        messagebox.showinfo("Успешное сохранение", "Книга добавлена!")
+        self.messagebox.showinfo("Успешное сохранение", "Книга добавлена!")
 
     def record_sale(self):
         try:
-            self.manager.record_sale(self.sale_emp.get(), self.sale_book.get(), float(self.sale_price.get()))
-            messagebox.showinfo("Успешное сохранение", "Продажа записана!")
-            self.show_sales()
+            sale = self.manager.record_sale(self.sale_emp.get(), self.sale_book.get(), float(self.sale_price.get()))
+            self.messagebox.showinfo("Успешное сохранение", "Продажа записана!")
+            self.append_sale(sale)
         except ValueError as e:
-            messagebox.showerror("Ошибка", str(e))
+            self.messagebox.showerror("Ошибка", str(e))
+
+    def suggest_titles(self, event=None):
+        self.book_suggestions.delete(0, self.tk.END)
+        text = self.sale_book.get().strip()
+        if text:
+            for title in self.manager.complete_title(text):
+                self.book_suggestions.insert(self.tk.END, title)
+
+    def pick_title(self, event=None):
+        selection = self.book_suggestions.curselection()
+        if selection:
+            self.sale_book.delete(0, self.tk.END)
+            self.sale_book.insert(0, self.book_suggestions.get(selection[0]))
 
     def show_profit(self):
         profit = self.manager.calculate_profit()
-        messagebox.showinfo("Прибыль", f"Общая прибыль: {profit}тг.")
-
-    def show_sales(self):
-        self.sales_list.delete(1.0, tk.END)
-        for sale in self.manager.get_sales():
-            self.sales_list.insert(tk.END, f"{sale['date']} - {sale['employee']} продал {sale['book']} за {sale['sale_price']}₸\n")
+        today = self.manager.day_profit(datetime.now().strftime("%Y-%m-%d"))
+        self.messagebox.showinfo("Прибыль", f"Общая прибыль: {profit}тг.\nЗа сегодня: {today}тг.")
+
+    def show_margin(self):
+        self.messagebox.showinfo("Маржа и скидки", "\n\n".join([format_margin(self.manager, "genre"),
+                                                                  format_employee_profit(self.manager),
+                                                                  format_discounts(self.manager)]))
+
+    def show_summary(self):
+        self.messagebox.showinfo("Сводка продаж", format_summary(self.manager))
+
+    def show_stats(self):
+        self.messagebox.showinfo("Статистика", format_stats(self.manager))
+
+    def update_page_label(self, total):
+        self.page_label.config(text=f"Стр. {self.page + 1} из {max(1, -(-total // PAGE_SIZE))}")
+
+    def show_sales(self, page=None):
+        total = self.manager.sales_count()
+        last_page = max(0, (total - 1) // PAGE_SIZE)
+        self.page = last_page if page is None else min(max(page, 0), last_page)
+        self.sales_list.delete(1.0, self.tk.END)
+        for sale in self.manager.get_sales(self.page * PAGE_SIZE, PAGE_SIZE):
+            self.sales_list.insert(self.tk.END, format_sale(sale))
+        self.sales_list.see(self.tk.END)
+        self.update_page_label(total)
+
+    def append_sale(self, sale):
+        total = self.manager.sales_count()
+        new_page = (total - 1) // PAGE_SIZE
+        if self.page == new_page:
+            self.sales_list.insert(self.tk.END, format_sale(sale))
+            self.sales_list.see(self.tk.END)
+            self.update_page_label(total)
+        elif self.page == new_page - 1:
+            self.show_sales()
+        else:
+            self.update_page_label(total)
+
+
+def add_employee(manager, name, position, phone, email):
+    manager.add_employee(name, position, phone, email)
+    print("Сотрудник добавлен!")
+
+
+def add_book(manager, title, year, author, genre, cost, price):
+    if not year.strip().isdigit():
+        raise ValueError("Год публикации должен содержать только цифры!")
+    manager.add_book(title.strip(), year.strip(), author.strip(), genre.strip(), cost, price)
+    print("Книга добавлена!")
+
+
+def record_sale(manager, employee_name, book_title, sale_price):
+    manager.record_sale(employee_name, book_title, sale_price)
+    print("Продажа записана!")
+
+
+def print_profit(manager, day=None, employee=None):
+    if employee is not None:
+        print(f"Прибыль сотрудника {employee}: {manager.employee_profit(employee)}тг.")
+    elif day is not None:
+        print(f"Прибыль за {day}: {manager.day_profit(day)}тг.")
+    else:
+        print(f"Общая прибыль: {manager.calculate_profit()}тг.")
+
+
+def print_sales(manager, start=None, count=PAGE_SIZE):
+    if start is None:
+        start = max(0, manager.sales_count() - count)
+    for sale in manager.get_sales(start, count):
+        print(format_sale(sale), end="")
+
+
+def period(args):
+    if (args.start_date is None) != (args.end_date is None):
+        raise ValueError("Укажите обе даты: --from и --to")
+    return args.start_date, args.end_date
+
+
+def add_period(command):
+    command.add_argument("--from", dest="start_date", help="ГГГГ-ММ-ДД")
+    command.add_argument("--to", dest="end_date", help="ГГГГ-ММ-ДД")
+
+
+def build_parser():
+    parser, commands = cli.build_parser("bookshop", "Книжный магазин: команды без окна")
+    command = commands.add_parser("add-employee", help="добавить сотрудника")
+    command.add_argument("name")
+    command.add_argument("position")
+    command.add_argument("phone")
+    command.add_argument("email")
+    command.set_defaults(run=lambda manager, args: add_employee(manager, args.name, args.position,
+                                                                args.phone, args.email))
+    command = commands.add_parser("add-book", help="добавить книгу")
+    command.add_argument("title")
+    command.add_argument("year")
+    command.add_argument("author")
+    command.add_argument("genre")
+    command.add_argument("cost", type=float)
+    command.add_argument("price", type=float)
+    command.set_defaults(run=lambda manager, args: add_book(manager, args.title, args.year, args.author,
+                                                            args.genre, args.cost, args.price))
+    command = commands.add_parser("sale", help="оформить продажу")
+    command.add_argument("employee")
+    command.add_argument("book")
+    command.add_argument("price", type=float)
+    command.set_defaults(run=lambda manager, args: record_sale(manager, args.employee, args.book, args.price))
+    command = commands.add_parser("profit", help="прибыль: общая, за день или сотрудника")
+    command.add_argument("--day", help="ГГГГ-ММ-ДД")
+    command.add_argument("--employee")
+    command.set_defaults(run=lambda manager, args: print_profit(manager, args.day, args.employee))
+    command = commands.add_parser("summary", help="сводка по сотрудникам и книгам")
+    command.set_defaults(run=lambda manager, args: print(format_summary(manager)))
+    command = commands.add_parser("margin", help="прибыль и маржа по себестоимости из каталога")
+    command.add_argument("--by", choices=sorted(MARGIN_TITLES), default="book")
+    add_period(command)
+    command.set_defaults(run=lambda manager, args: print(format_margin(manager, args.by, *period(args))))
+    command = commands.add_parser("discounts", help="скидки от цены продажи по книгам")
+    add_period(command)
+    command.set_defaults(run=lambda manager, args: print(format_discounts(manager, *period(args))))
+    command = commands.add_parser("employee-profit", help="прибыльность сотрудников")
+    add_period(command)
+    command.set_defaults(run=lambda manager, args: print(format_employee_profit(manager, *period(args))))
+    command = commands.add_parser("sales", help="список продаж (по умолчанию последняя страница)")
+    command.add_argument("--start", type=int)
+    command.add_argument("--count", type=int, default=PAGE_SIZE)
+    command.set_defaults(run=lambda manager, args: print_sales(manager, args.start, args.count))
+    cli.add_common_commands(commands, lambda manager, args: print(format_stats(manager)),
+                            lambda manager, args: run_script(manager, args.path))
+    return parser
+
+
+def run_script(manager, path):
+    cli.run_script(build_parser(), path, lambda args: args.run(manager, args))
+
+
+def run_command(argv):
+    args = build_parser().parse_args(argv)
+    metrics.start()
+    manager = open_manager()
+    with manager.batch():
+        try:
+            args.run(manager, args)
+        except (ValueError, OSError) as error:
+            print(f"Ошибка: {error}", file=sys.stderr)
+            raise SystemExit(1)
 
 
-if __name__ == "__main__":
+def run_gui():
+    import tkinter as tk
+    metrics.start()
     root = tk.Tk()
-    app = BookstoreApp(root)
+    BookstoreApp(root)
     root.mainloop()
+
+
+if __name__ == "__main__":
+    cli.dispatch(run_command, run_gui)
@@ -0,0 +1,53 @@
+import argparse
+import shlex
+import sys
+
+
+def build_parser(prog, description):
+    parser = argparse.ArgumentParser(prog=prog, description=description)
+    return parser, parser.add_subparsers(dest="command", required=True)
+
+
+def add_common_commands(commands, stats, script, **defaults):
+    command = commands.add_parser("stats", help="статистика (при включённых метриках)")
+    command.set_defaults(run=stats, **defaults)
+    command = commands.add_parser("script", help="выполнить команды из файла (- для stdin) за одну загрузку")
+    command.add_argument("path")
+    command.set_defaults(run=script)
+
+
+def run_script(parser, path, run):
+    failures = 0
+    file = sys.stdin if path == "-" else open(path, "r", encoding="utf-8")
+    with file:
+        for line_no, line in enumerate(file, 1):
+            try:
+                words = shlex.split(line, comments=True)
+                if not words:
+                    continue
+                args = parser.parse_args(words)
+                if args.command == "script":
+                    raise ValueError("вложенные скрипты не поддерживаются")
+                run(args)
+            except SystemExit:
+                failures += 1
+                print(f"Строка {line_no}: неверная команда", file=sys.stderr)
+            except (ValueError, OSError) as error:
+                failures += 1
+                print(f"Строка {line_no}: {error}", file=sys.stderr)
+    if failures:
+        raise SystemExit(1)
+
+
+def dispatch(run_command, interactive):
+    if len(sys.argv) > 1 and sys.argv[1:] != ["--stats"]:
+        run_command([arg for arg in sys.argv[1:] if arg != "--stats"])
+    else:
+        interactive()
+
+
+def margin_rows(source, by, start_date=None, end_date=None, order="margin"):
+    rows = source.margin(by, start_date, end_date).items()
+    if by == "month":
+        return sorted(rows)
+    return sorted(rows, key=lambda item: -item[1][order])
@@ -0,0 +1,34 @@
+import json
+import math
+from json.encoder import encode_basestring, encode_basestring_ascii
+
+INDENT = "    "
+
+
+class Codec:
+    def __init__(self, ensure_ascii=True):
+        self.ensure_ascii = ensure_ascii
+        self.encode_string = encode_basestring_ascii if ensure_ascii else encode_basestring
+
+    def encode_value(self, value):
+        if type(value) is str:
+            return self.encode_string(value)
+        if type(value) is int or (type(value) is float and math.isfinite(value)):
+            return repr(value)
+        return json.dumps(value, ensure_ascii=self.ensure_ascii)
+
+    def encode(self, value, level=0):
+        if type(value) is dict:
+            if not value:
+                return "{}"
+            separator = ",\n" + INDENT * (level + 1)
+            items = separator.join([self.encode_string(key) + ": " + self.encode(item, level + 1)
+                                    for key, item in value.items()])
+            return "{\n" + INDENT * (level + 1) + items + "\n" + INDENT * level + "}"
+        if type(value) is list:
+            if not value:
+                return "[]"
+            separator = ",\n" + INDENT * (level + 1)
+            items = separator.join([self.encode(item, level + 1) for item in value])
+            return "[\n" + INDENT * (level + 1) + items + "\n" + INDENT * level + "]"
+        return self.encode_value(value)
@@ -0,0 +1,113 @@
+import datetime
+
+np = None
+numpy_checked = False
+
+
+def numpy():
+    global np, numpy_checked
+    if not numpy_checked:
+        numpy_checked = True
+        try:
+            import numpy as module
+        except ImportError:
+            module = None
+        np = module
+    return np
+
+
+def to_day(date):
+    try:
+        return datetime.date.fromisoformat(date[:10]).toordinal()
+    except (TypeError, ValueError):
+        return 0
+
+
+def summarize(sales, field, value_fields, start_date=None, end_date=None):
+    result = {}
+    for sale in sales:
+        if start_date is not None and not start_date <= sale["date"] <= end_date:
+            continue
+        row = result.setdefault(sale[field], dict.fromkeys(("count",) + value_fields, 0))
+        row["count"] += 1
+        for value_field in value_fields:
+            row[value_field] += sale[value_field]
+    return result
+
+
+class SalesColumns:
+    def __init__(self, sales, code_fields, value_fields):
+        numpy()
+        self.code_fields = code_fields
+        self.value_fields = value_fields
+        self.size = len(sales)
+        capacity = max(16, self.size)
+        self.codes = {}
+        self.names = {}
+        self.dictionaries = {}
+        for field in code_fields:
+            self.names[field] = []
+            self.dictionaries[field] = {}
+            self.codes[field] = np.zeros(capacity, dtype=np.int32)
+            self.codes[field][:self.size] = [self._encode(field, s[field]) for s in sales]
+        self.days = np.zeros(capacity, dtype=np.int32)
+        self.days[:self.size] = [to_day(s["date"]) for s in sales]
+        self.values = {}
+        for field in value_fields:
+            self.values[field] = np.zeros(capacity, dtype=np.float64)
+            self.values[field][:self.size] = [s[field] for s in sales]
+
+    def _encode(self, field, name):
+        code = self.dictionaries[field].get(name)
+        if code is None:
+            code = self.dictionaries[field][name] = len(self.names[field])
+            self.names[field].append(name)
+        return code
+
+    def _columns(self):
+        yield self.days
+        yield from self.codes.values()
+        yield from self.values.values()
+
+    def _grow(self):
+        capacity = len(self.days) * 2
+        self.days = np.resize(self.days, capacity)
+        self.codes = {f: np.resize(column, capacity) for f, column in self.codes.items()}
+        self.values = {f: np.resize(column, capacity) for f, column in self.values.items()}
+
+    def append(self, sale):
+        if self.size == len(self.days):
+            self._grow()
+        i = self.size
+        self.days[i] = to_day(sale["date"])
+        for field in self.code_fields:
+            self.codes[field][i] = self._encode(field, sale[field])
+        for field in self.value_fields:
+            self.values[field][i] = sale[field]
+        self.size += 1
+
+    def swap_remove(self, i):
+        self.size -= 1
+        for column in self._columns():
+            column[i] = column[self.size]
+
+    def _mask(self, start_date, end_date):
+        if start_date is None:
+            return slice(0, self.size)
+        days = self.days[:self.size]
+        return (days >= to_day(start_date)) & (days <= to_day(end_date))
+
+    def group(self, field, start_date=None, end_date=None):
+        mask = self._mask(start_date, end_date)
+        codes = self.codes[field][:self.size][mask]
+        width = len(self.names[field])
+        counts = np.bincount(codes, minlength=width)
+        sums = {f: np.bincount(codes, weights=self.values[f][:self.size][mask], minlength=width)
+                for f in self.value_fields}
+        result = {}
+        for code in np.flatnonzero(counts):
+            row = {"count": int(counts[code])}
+            for value_field in self.value_fields:
+                row[value_field] = float(sums[value_field][code])
+            result[self.names[field][code]] = row
+        return result
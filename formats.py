@@ -0,0 +1,31 @@
+import os
+
+import packed
+import snapshot
+
+BINARY = (snapshot.EXTENSION, packed.EXTENSION)
+
+
+def read(path):
+    if snapshot.is_snapshot(path):
+        return snapshot.load(path)
+    if path.endswith(BINARY) and not os.path.exists(path):
+        path = os.path.splitext(path)[0] + ".json"
+    return packed.load(path)
+
+
+def write(path, plain, text):
+    tmp_path = path + ".tmp"
+    binary = path.endswith(BINARY)
+    with open(tmp_path, "wb" if binary else "w", encoding=None if binary else "utf-8") as file:
+        if path.endswith(snapshot.EXTENSION):
+            snapshot.dump(plain(), file)
+        elif binary:
+            packed.dump(plain(), file)
+        else:
+            file.write(text())
+        file.flush()
+        os.fsync(file.fileno())
+        size = file.tell()
+    os.replace(tmp_path, path)
+    return size
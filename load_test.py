@@ -0,0 +1,80 @@
+import argparse
+import asyncio
+import json
+import random
+import time
+
+
+async def request(reader, writer, method, path, payload=None):
+    body = json.dumps(payload, ensure_ascii=False).encode("utf-8") if payload is not None else b""
+    writer.write((f"{method} {path} HTTP/1.1\r\nHost: localhost\r\nContent-Length: {len(body)}\r\n\r\n").encode("latin-1")
+                 + body)
+    await writer.drain()
+    head = await reader.readuntil(b"\r\n\r\n")
+    status = int(head.split(b" ", 2)[1])
+    length = 0
+    for line in head.split(b"\r\n"):
+        if line.lower().startswith(b"content-length:"):
+            length = int(line.split(b":", 1)[1])
+    await reader.readexactly(length)
+    return status
+
+
+def next_request(write_ratio):
+    if random.random() < write_ratio:
+        sale = {"employee": f"Сотрудник {random.randrange(50)}", "car": f"Модель {random.randrange(20)}",
+                "date": f"2024-{random.randint(1, 12):02d}-{random.randint(1, 28):02d}", "real_price": 1000.0}
+        return "POST", "/sales", sale
+    path = random.choice(("/reports/profit", "/reports/best-seller", "/reports/best-car"))
+    return "GET", path + "?from=2024-01-01&to=2024-12-31", None
+
+
+async def client(host, port, deadline, write_ratio, latencies, errors):
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        while time.perf_counter() < deadline:
+            method, path, payload = next_request(write_ratio)
+            started = time.perf_counter()
+            status = await request(reader, writer, method, path, payload)
+            latencies.append(time.perf_counter() - started)
+            if status >= 400:
+                errors.append(status)
+    finally:
+        writer.close()
+
+
+def percentile(values, p):
+    return values[min(len(values) - 1, int(len(values) * p / 100))]
+
+
+async def run(host, port, connections, duration, write_ratio):
+    latencies, errors = [], []
+    started = time.perf_counter()
+    deadline = started + duration
+    await asyncio.gather(*(client(host, port, deadline, write_ratio, latencies, errors) for _ in range(connections)))
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+    return {
+        "connections": connections,
+        "requests": len(latencies),
+        "errors": len(errors),
+        "requests_per_sec": round(len(latencies) / elapsed, 1),
+        "p50_ms": round(percentile(latencies, 50) * 1000, 3) if latencies else None,
+        "p99_ms": round(percentile(latencies, 99) * 1000, 3) if latencies else None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Нагрузочный тест API автосалона")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--connections", type=int, default=32)
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--write-ratio", type=float, default=0.2)
+    args = parser.parse_args()
+    result = asyncio.run(run(args.host, args.port, args.connections, args.duration, args.write_ratio))
+    print(json.dumps(result, ensure_ascii=False, indent=4))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,27 +1,750 @@
+import csv
 import json
+import os
+import sys
+import textwrap
 import datetime
+from bisect import bisect_left, bisect_right, insort
 from collections import Counter
+from contextlib import contextmanager
 
-DATA_FILE = "data.json"
+import cli
+import columnar
+import formats
+import metrics
+import packed
+import snapshot
+import sqlite_storage
+from archive import SalesArchive, merge_groups, month_of
+from codec import Codec
+from query import MarginQuery, empty_row, finish
+from report_cache import ReportCache
+from shared_file import SharedFile
 
+STORAGE = os.environ.get("STORAGE", "json")
+JSON_FILE = "data.json"
+DATA_FILE = {"snapshot": "data" + snapshot.EXTENSION, "compact": "data" + packed.EXTENSION}.get(STORAGE, JSON_FILE)
+DB_FILE = "data.db"
+JOURNAL_FILE = "data.journal"
+COMPACT_MIN = 1000
+COMPACT_RATIO = 0.25
+IMPORT_CHUNK = 1000
+ARCHIVE_DIR = "sales_archive"
+CODEC = Codec()
 
+journal_seq = 0
+journal_size = 0
+journal_offset = 0
+generation = 0
+data_file = SharedFile(DATA_FILE)
+
+
+@metrics.timed("load_data")
 def load_data():
+    global journal_seq
     try:
-        with open(DATA_FILE, "r") as file:
-            return json.load(file)
+        data = snapshot.to_plain(formats.read(DATA_FILE))
     except (FileNotFoundError, json.JSONDecodeError):
-        return {"employees": [], "cars": [], "sales": []}
+        data = {"employees": [], "cars": [], "sales": []}
+    journal_seq = data.pop("seq", 0)
+    return data
 
 
+@metrics.timed("save_data")
 def save_data(data):
-    with open(DATA_FILE, "w") as file:
-        json.dump(data, file, indent=4)
+    global journal_size, journal_offset
+    data = {**data, "seq": journal_seq}
+    size = formats.write(DATA_FILE, lambda: data, lambda: CODEC.encode(data))
+    if metrics.enabled:
+        metrics.count("bytes_written.data", size)
+    open(JOURNAL_FILE, "w").close()
+    journal_size = 0
+    journal_offset = 0
+
+
+def replay_journal(repo):
+    global journal_seq, journal_size, journal_offset
+    try:
+        with open(JOURNAL_FILE, "rb") as file:
+            file.seek(journal_offset)
+            for line in file:
+                if not line.endswith(b"\n"):
+                    break
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    break
+                journal_offset += len(line)
+                journal_size += 1
+                if entry["seq"] <= journal_seq:
+                    continue
+                repo.apply(entry["op"], entry["table"], entry["record"])
+                journal_seq = entry["seq"]
+    except FileNotFoundError:
+        pass
+
+
+def reload_repository(repo):
+    global generation, journal_size, journal_offset
+    generation = data_file.version()
+    journal_size = journal_offset = 0
+    repo.load(load_data())
+    replay_journal(repo)
+    if repo.archive is not None:
+        repo.archive.reload()
+        if repo.archive.pending is not None:
+            repo.drop_sealed()
+
+
+def catch_up(repo):
+    journal_length = os.path.getsize(JOURNAL_FILE) if os.path.exists(JOURNAL_FILE) else 0
+    if data_file.version() != generation or journal_length < journal_offset:
+        reload_repository(repo)
+    else:
+        replay_journal(repo)
+
+
+def compact(repo):
+    global generation
+    if repo.archive is not None:
+        repo.seal(datetime.date.today().strftime("%Y-%m"))
+    save_data(repo.data)
+    if repo.archive is not None:
+        repo.archive.commit()
+    generation = data_file.bump()
+
+
+def archive_changed():
+    global generation
+    generation = data_file.bump()
+
+
+@metrics.timed("journal.append")
+def log_changes(changes):
+    global journal_seq, journal_size, journal_offset
+    lines = []
+    for op, table, record in changes:
+        journal_seq += 1
+        entry = {"seq": journal_seq, "op": op, "table": table, "record": record}
+        lines.append(json.dumps(entry, ensure_ascii=False, separators=(",", ":")) + "\n")
+    block = "".join(lines).encode("utf-8")
+    with open(JOURNAL_FILE, "ab") as file:
+        file.truncate(journal_offset)
+        file.write(block)
+    journal_offset += len(block)
+    journal_size += len(lines)
+    if metrics.enabled:
+        metrics.count("bytes_written.journal", len(block))
+
+
+class SalesIndex:
+    def __init__(self, sales):
+        self.day_sales = {}
+        for sale in sales:
+            self.day_sales.setdefault(sale["date"], []).append(sale)
+        self.days = sorted(self.day_sales)
+
+    def add(self, sale):
+        day = sale["date"]
+        bucket = self.day_sales.get(day)
+        if bucket is not None:
+            bucket.append(sale)
+        elif not self.days or day > self.days[-1]:
+            self.day_sales[day] = [sale]
+            self.days.append(day)
+        else:
+            self.day_sales[day] = [sale]
+            insort(self.days, day)
+
+    def remove(self, sale):
+        self.day_sales[sale["date"]].remove(sale)
+
+    def _bounds(self, start_date, end_date):
+        return bisect_left(self.days, start_date), bisect_right(self.days, end_date)
+
+    def between(self, start_date, end_date):
+        lo, hi = self._bounds(start_date, end_date)
+        return [s for day in self.days[lo:hi] for s in self.day_sales[day]]
+
+
+class SalesAggregates:
+    FIELDS = ("employee", "car")
+
+    def __init__(self, sales):
+        self.days = []
+        self.by_day = {}
+        self.by_month = {}
+        for sale in sales:
+            self.add(sale)
+
+    def add(self, sale):
+        self._update(sale, 1)
+
+    def remove(self, sale):
+        self._update(sale, -1)
+
+    def _keys(self, sale):
+        for field in self.FIELDS:
+            yield field, sale[field]
+        yield self.FIELDS, tuple(sale[field] for field in self.FIELDS)
+
+    def _update(self, sale, sign):
+        day = sale["date"]
+        if day not in self.by_day:
+            insort(self.days, day)
+            self.by_day[day] = {"count": Counter(), "revenue": Counter()}
+        month = self.by_month.setdefault(day[:7], {"count": Counter(), "revenue": Counter()})
+        for bucket in (self.by_day[day], month):
+            for key in self._keys(sale):
+                bucket["count"][key] += sign
+                bucket["revenue"][key] += sign * sale["real_price"]
+                if not bucket["count"][key]:
+                    del bucket["count"][key]
+                    del bucket["revenue"][key]
+        if not self.by_day[day]["count"]:
+            del self.by_day[day]
+            del self.days[bisect_left(self.days, day)]
+        if not month["count"]:
+            del self.by_month[day[:7]]
+
+    def _buckets(self, start_date, end_date):
+        i, hi = bisect_left(self.days, start_date), bisect_right(self.days, end_date)
+        while i < hi:
+            month = self.days[i][:7]
+            month_start = bisect_left(self.days, month)
+            month_end = bisect_left(self.days, month + "\uffff")
+            if i == month_start and month_end <= hi:
+                yield month, self.by_month[month]
+                i = month_end
+            else:
+                yield self.days[i], self.by_day[self.days[i]]
+                i += 1
+
+    def top(self, field, start_date, end_date, k=1):
+        counts, revenue = Counter(), Counter()
+        for date, bucket in self._buckets(start_date, end_date):
+            for key, count in bucket["count"].items():
+                if key[0] == field:
+                    counts[key[1]] += count
+                    revenue[key[1]] += bucket["revenue"][key]
+        return [(name, count, revenue[name]) for name, count in counts.most_common(k)]
+
+    def summaries(self, by, start_date, end_date):
+        field = self.FIELDS if by == "employee" else "car"
+        result = []
+        for date, bucket in self._buckets(start_date, end_date):
+            scopes = {}
+            for key, count in bucket["count"].items():
+                if key[0] != field:
+                    continue
+                employee, car = key[1] if field == self.FIELDS else (None, key[1])
+                scopes.setdefault(employee, {})[car] = {"count": count, "real_price": bucket["revenue"][key]}
+            for employee, rows in scopes.items():
+                result.append(({"date": date} if employee is None else {"date": date, "employee": employee}, rows))
+        return result
+
+
+KEYS = {"employees": ("name",), "cars": ("model",), "sales": ("employee", "car", "date")}
+FIELDS = {
+    "employees": ("name", "position", "phone", "email"),
+    "cars": ("manufacturer", "year", "model", "cost_price", "sale_price"),
+    "sales": ("employee", "car", "date", "real_price"),
+}
+MARGIN_COLUMNS = {None: "NULL", "employee": "s.employee", "car": "s.car", "manufacturer": "c.manufacturer",
+                  "month": "substr(s.date, 1, 7)"}
+MARGIN = MarginQuery("car", "real_price", "cost_price", "sale_price", MARGIN_COLUMNS)
+JOINED_REPORTS = ("profit", "margin", "discounts", "employee-profit")
+STREAMED_REPORTS = ("sales",)
+READ_COMMANDS = ("report", "employee-sales", "list", "export", "stats")
+NUMBERS = {"cars": ("cost_price", "sale_price"), "sales": ("real_price",)}
+
+
+def is_iso_date(text):
+    try:
+        return datetime.date.fromisoformat(text).isoformat() == text
+    except ValueError:
+        return False
+
+
+def iso_date(text):
+    if not is_iso_date(text):
+        raise ValueError(text)
+    return text
+
+
+def check_record(table, record):
+    for field in FIELDS[table]:
+        if field not in record or not isinstance(record[field], (str, int, float)):
+            raise ValueError(field)
+    for field in NUMBERS.get(table, ()):
+        if isinstance(record[field], str):
+            raise ValueError(field)
+    if table == "sales" and (not isinstance(record["date"], str) or not is_iso_date(record["date"])):
+        raise ValueError("date")
+
+
+def check_batch(changes):
+    for op, table, value in changes:
+        if op == "add":
+            check_record(table, value)
+
+
+class Repository:
+    def __init__(self, data, archive=None):
+        self.archive = archive
+        self.cache = ReportCache()
+        self.in_session = False
+        self.logged = []
+        self.archived = False
+        self.needs_compact = False
+        self.load(data)
+
+    def load(self, data):
+        self.data = data
+        self.cache.clear()
+        self.positions = {}
+        self.indexes = {table: {} for table in KEYS}
+        self.sales_by_employee = {}
+        self.sales_index = SalesIndex(data["sales"])
+        self.aggregates = SalesAggregates(data["sales"])
+        self.columns = None
+        for table in KEYS:
+            for i, record in enumerate(data[table]):
+                self.positions[id(record)] = i
+                self._index(table, record)
+
+    def _index(self, table, record):
+        key = tuple(record[field] for field in KEYS[table])
+        self.indexes[table].setdefault(key, {})[id(record)] = record
+        if table == "sales":
+            self.sales_by_employee.setdefault(record["employee"], {})[id(record)] = record
+
+    def _unindex(self, table, record):
+        key = tuple(record[field] for field in KEYS[table])
+        bucket = self.indexes[table][key]
+        del bucket[id(record)]
+        if not bucket:
+            del self.indexes[table][key]
+        if table == "sales":
+            bucket = self.sales_by_employee[record["employee"]]
+            del bucket[id(record)]
+            if not bucket:
+                del self.sales_by_employee[record["employee"]]
+
+    def find(self, table, key):
+        bucket = self.indexes[table].get(tuple(key[field] for field in KEYS[table]))
+        return next(iter(bucket.values())) if bucket else None
+
+    def add(self, table, record):
+        rows = self.data[table]
+        self.positions[id(record)] = len(rows)
+        rows.append(record)
+        self._index(table, record)
+        if table == "sales":
+            self._touch(record)
+            self.sales_index.add(record)
+            self.aggregates.add(record)
+            if self.columns is not None:
+                self.columns.append(record)
+        elif table == "cars":
+            self.cache.touch(tags=("cars",))
+
+    @metrics.timed("delete")
+    def delete(self, table, key):
+        record = self.find(table, key)
+        if record is not None:
+            self._delete(table, record)
+        return record
+
+    def _delete(self, table, record):
+        rows = self.data[table]
+        i = self.positions.pop(id(record))
+        last = rows.pop()
+        if last is not record:
+            rows[i] = last
+            self.positions[id(last)] = i
+        self._unindex(table, record)
+        if table == "sales":
+            self._touch(record)
+            self.sales_index.remove(record)
+            self.aggregates.remove(record)
+            if self.columns is not None:
+                self.columns.swap_remove(i)
+        elif table == "cars":
+            self.cache.touch(tags=("cars",))
+
+    def _touch(self, sale):
+        self.cache.touch(month_of(sale["date"]), (("employee", sale["employee"]),))
+
+    def apply(self, op, table, record):
+        if op == "add":
+            self.add(table, record)
+            return
+        bucket = self.indexes[table].get(tuple(record[field] for field in KEYS[table]), {})
+        match = next((r for r in bucket.values() if r == record), None)
+        if match is not None:
+            self._delete(table, match)
+
+    def seal(self, cutoff):
+        sealed = [sale for sale in self.data["sales"] if month_of(sale["date"]) < cutoff]
+        if sealed:
+            self.archive.seal(sealed, cutoff)
+            self.drop_sealed()
+
+    def drop_sealed(self):
+        cutoff = self.archive.pending
+        self.load({**self.data, "sales": [sale for sale in self.data["sales"] if month_of(sale["date"]) >= cutoff]})
+
+    @contextmanager
+    def session(self):
+        if self.in_session:
+            yield self
+            return
+        with data_file.lock():
+            catch_up(self)
+            if self.archive is not None and self.archive.pending is not None:
+                compact(self)
+            self.in_session = True
+            try:
+                yield self
+            finally:
+                self.in_session = False
+                self._persist()
 
+    def _persist(self):
+        logged, self.logged = self.logged, []
+        if logged:
+            log_changes(logged)
+        if self.needs_compact or self.compact_due():
+            compact(self)
+        elif self.archived:
+            archive_changed()
+        self.archived = self.needs_compact = False
 
-data = load_data()
+    @metrics.timed("write_batch")
+    def write_batch(self, changes):
+        check_batch(changes)
+        results = []
+        with self.session():
+            for op, table, value in changes:
+                record = value if op == "add" else self.delete(table, value)
+                if op == "add":
+                    self.add(table, record)
+                if record is None and table == "sales" and self.archive is not None:
+                    record = self.archive.remove(value)
+                    if record is not None:
+                        self._touch(record)
+                        self.archived = True
+                elif record is not None:
+                    self.logged.append((op, table, record))
+                results.append(record)
+        return results
+
+    def insert(self, table, record):
+        self.write_batch([("add", table, record)])
+
+    def remove(self, table, key):
+        return self.write_batch([("delete", table, key)])[0]
+
+    def bulk_insert(self, table, chunks):
+        count = 0
+        with self.session():
+            for chunk in chunks:
+                for record in chunk:
+                    self.add(table, record)
+                count += len(chunk)
+            if count:
+                self.needs_compact = True
+        return count
+
+    def refresh(self):
+        if self.in_session:
+            return
+        with data_file.lock(exclusive=False):
+            catch_up(self)
+
+    def compact_due(self):
+        return journal_size >= max(COMPACT_MIN, COMPACT_RATIO * sum(len(records) for records in self.data.values()))
+
+    def flush(self):
+        with self.session():
+            pass
+
+    def all(self, table):
+        if table == "sales" and self.archive is not None and self.archive.months:
+            return self.archive.all() + self.data["sales"]
+        return self.data[table]
+
+    @metrics.timed("report.sales_of")
+    def sales_of(self, employee_name):
+        sales = list(self.sales_by_employee.get(employee_name, {}).values())
+        if self.archive is not None:
+            sales = self.archive.matching("employee", employee_name) + sales
+        if metrics.enabled:
+            metrics.count("scanned.sales_of", len(sales))
+        return sales
+
+    @metrics.timed("report.sales_between")
+    def sales_between(self, start_date, end_date):
+        sales = self.sales_index.between(start_date, end_date)
+        archived = self.archive.between(start_date, end_date) if self.archive is not None else []
+        if archived:
+            sales = sorted(archived + sales, key=lambda sale: sale["date"])
+        if metrics.enabled:
+            metrics.count("scanned.sales_between", len(sales))
+        return sales
+
+    @metrics.timed("report.top")
+    def top(self, field, start_date, end_date, k=1):
+        if self.archive is None or not self.archive.months:
+            return self.aggregates.top(field, start_date, end_date, k)
+        counts, revenue = Counter(), Counter()
+        for name, count, total in self.aggregates.top(field, start_date, end_date, None):
+            counts[name] += count
+            revenue[name] += total
+        for name, row in self.archive.group(field, start_date, end_date).items():
+            counts[name] += row["count"]
+            revenue[name] += row["real_price"]
+        return [(name, count, revenue[name]) for name, count in counts.most_common(k)]
+
+    @metrics.timed("report.summary")
+    def summary(self, field, start_date, end_date):
+        if self.columns is None and columnar.numpy() is not None:
+            self.columns = columnar.SalesColumns(self.data["sales"], ("employee", "car"), ("real_price",))
+        if self.columns is not None:
+            if metrics.enabled:
+                metrics.count("scanned.summary", self.columns.size)
+            summary = self.columns.group(field, start_date, end_date)
+        else:
+            summary = columnar.summarize(self.sales_index.between(start_date, end_date), field, ("real_price",))
+        if self.archive is not None:
+            merge_groups(summary, self.archive.group(field, start_date, end_date))
+        return summary
+
+    def _car(self, model):
+        bucket = self.indexes["cars"].get((model,))
+        return next(iter(bucket.values())) if bucket else None
+
+    @metrics.timed("report.margin")
+    def margin(self, by, start_date, end_date):
+        summaries = self.aggregates.summaries(by, start_date, end_date)
+        sales = []
+        if self.archive is not None:
+            archived, sales = self.archive.partition(None if by == "employee" else MARGIN.key, start_date, end_date)
+            summaries += archived
+        if metrics.enabled:
+            metrics.count("scanned.margin", len(sales))
+        return MARGIN.group(sales, self._car, by, summaries)
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS employees (id INTEGER PRIMARY KEY, name TEXT, position TEXT, phone TEXT, email TEXT);
+CREATE INDEX IF NOT EXISTS employees_name ON employees (name);
+CREATE TABLE IF NOT EXISTS cars (
+    id INTEGER PRIMARY KEY, manufacturer TEXT, year TEXT, model TEXT, cost_price REAL, sale_price REAL
+);
+CREATE INDEX IF NOT EXISTS cars_model ON cars (model);
+CREATE TABLE IF NOT EXISTS sales (id INTEGER PRIMARY KEY, employee TEXT, car TEXT, date TEXT, real_price REAL);
+CREATE INDEX IF NOT EXISTS sales_date ON sales (date);
+CREATE INDEX IF NOT EXISTS sales_key ON sales (employee, car, date);
+"""
+
+
+class SqliteRepository:
+    def __init__(self, path):
+        self.db = sqlite_storage.connect(path, SCHEMA)
+        self.cache = ReportCache()
+        self.in_session = False
+        self.data_version = self._data_version()
+
+    def _data_version(self):
+        return self.db.execute("PRAGMA data_version").fetchone()[0]
+
+    def _touch(self, sale):
+        self.cache.touch(month_of(sale["date"]), (("employee", sale["employee"]),))
+
+    def _rows(self, sql, params=()):
+        return [dict(row) for row in self.db.execute(sql, params)]
+
+    def _insert_rows(self, table, records):
+        fields = FIELDS[table]
+        self.db.executemany(
+            f"INSERT INTO {table} ({', '.join(fields)}) VALUES ({', '.join('?' * len(fields))})",
+            ([record[field] for field in fields] for record in records),
+        )
+        if table == "sales":
+            for record in records:
+                self._touch(record)
+        elif table == "cars":
+            self.cache.touch(tags=("cars",))
+
+    @contextmanager
+    def session(self):
+        if self.in_session:
+            yield self
+            return
+        self.in_session = True
+        try:
+            with self.db:
+                yield self
+        finally:
+            self.in_session = False
+
+    def import_data(self, data):
+        with self.session():
+            for table, records in data.items():
+                self._insert_rows(table, records)
+
+    @metrics.timed("write_batch")
+    def write_batch(self, changes):
+        check_batch(changes)
+        results = []
+        with self.session():
+            for op, table, value in changes:
+                if op == "add":
+                    self._insert_rows(table, [value])
+                    results.append(value)
+                else:
+                    results.append(self._remove(table, value))
+        return results
+
+    def insert(self, table, record):
+        self.import_data({table: [record]})
+
+    def bulk_insert(self, table, chunks):
+        count = 0
+        with self.session():
+            for chunk in chunks:
+                self.import_data({table: chunk})
+                count += len(chunk)
+        return count
+
+    def _remove(self, table, key):
+        fields = FIELDS[table]
+        where = " AND ".join(f"{field} = ?" for field in KEYS[table])
+        row = self.db.execute(
+            f"SELECT id, {', '.join(fields)} FROM {table} WHERE {where} ORDER BY id LIMIT 1",
+            [key[field] for field in KEYS[table]],
+        ).fetchone()
+        if row is None:
+            return None
+        self.db.execute(f"DELETE FROM {table} WHERE id = ?", (row["id"],))
+        record = {field: row[field] for field in fields}
+        if table == "sales":
+            self._touch(record)
+        elif table == "cars":
+            self.cache.touch(tags=("cars",))
+        return record
+
+    def remove(self, table, key):
+        with self.session():
+            return self._remove(table, key)
+
+    def refresh(self):
+        if self.in_session:
+            return
+        data_version = self._data_version()
+        if data_version != self.data_version:
+            self.data_version = data_version
+            self.cache.clear()
+
+    def flush(self):
+        self.db.close()
+
+    def all(self, table):
+        return self._rows(f"SELECT {', '.join(FIELDS[table])} FROM {table} ORDER BY id")
+
+    @metrics.timed("report.sales_of")
+    def sales_of(self, employee_name):
+        sales = self._rows("SELECT employee, car, date, real_price FROM sales WHERE employee = ? ORDER BY id",
+                           (employee_name,))
+        if metrics.enabled:
+            metrics.count("scanned.sales_of", len(sales))
+        return sales
+
+    @metrics.timed("report.sales_between")
+    def sales_between(self, start_date, end_date):
+        sales = self._rows("SELECT employee, car, date, real_price FROM sales WHERE date BETWEEN ? AND ? ORDER BY date",
+                           (start_date, end_date))
+        if metrics.enabled:
+            metrics.count("scanned.sales_between", len(sales))
+        return sales
+
+    def _group(self, field, start_date, end_date, tail="", params=()):
+        if field not in ("employee", "car"):
+            raise ValueError(field)
+        return self.db.execute(
+            f"SELECT {field}, COUNT(*), SUM(real_price) FROM sales WHERE date BETWEEN ? AND ? GROUP BY {field}{tail}",
+            (start_date, end_date) + params,
+        ).fetchall()
+
+    @metrics.timed("report.top")
+    def top(self, field, start_date, end_date, k=1):
+        return [tuple(row) for row in self._group(field, start_date, end_date, " ORDER BY COUNT(*) DESC LIMIT ?", (k,))]
+
+    @metrics.timed("report.summary")
+    def summary(self, field, start_date, end_date):
+        summary = {name: {"count": count, "real_price": total}
+                   for name, count, total in self._group(field, start_date, end_date)}
+        if metrics.enabled:
+            metrics.count("scanned.summary", sum(row["count"] for row in summary.values()))
+        return summary
+
+    @metrics.timed("report.margin")
+    def margin(self, by, start_date, end_date):
+        if by not in MARGIN_COLUMNS:
+            raise ValueError(by)
+        result = {}
+        for row in self.db.execute(
+                f"SELECT {MARGIN_COLUMNS[by]}, COUNT(*), COALESCE(SUM(s.real_price), 0), "
+                "COALESCE(SUM(c.cost_price), 0), COALESCE(SUM(s.real_price - c.cost_price), 0), "
+                "COALESCE(SUM(c.sale_price), 0), COALESCE(SUM(c.sale_price - s.real_price), 0), COUNT(*) - COUNT(c.id), COUNT(c.id) "
+                "FROM sales s LEFT JOIN cars c ON c.id = (SELECT id FROM cars WHERE model = s.car ORDER BY id LIMIT 1) "
+                "WHERE s.date BETWEEN ? AND ? GROUP BY 1", (start_date, end_date)):
+            result[row[0]] = dict(zip(empty_row(), row[1:]))
+        if metrics.enabled:
+            metrics.count("scanned.margin", sum(row["count"] for row in result.values()))
+        return finish(result)
+
+
+def load_repository():
+    repo = Repository({"employees": [], "cars": [], "sales": []},
+                      SalesArchive(ARCHIVE_DIR, SalesAggregates.FIELDS, ("real_price",)))
+    with data_file.lock(exclusive=False):
+        reload_repository(repo)
+    return repo
+
+
+def open_repository():
+    if STORAGE != "sqlite":
+        return load_repository()
+    repo = SqliteRepository(DB_FILE)
+    if sqlite_storage.is_empty(repo.db, FIELDS) and os.path.exists(JSON_FILE):
+        source = load_repository()
+        repo.import_data({**source.data, "sales": source.all("sales")})
+    return repo
+
+
+def insert(table, record):
+    repo.insert(table, record)
+
+
+def remove(table, **key):
+    return repo.remove(table, key)
+
+
+repo = None
+
+
+def init_repository():
+    global repo
+    repo = open_repository()
+    return repo
 
 
 class Employee:
+    __slots__ = ("name", "position", "phone", "email")
+
     def __init__(self, name, position, phone, email):
         self.name = name
         self.position = position
@@ -33,6 +756,8 @@ class Employee:
 
 
 class Car:
+    __slots__ = ("manufacturer", "year", "model", "cost_price", "sale_price")
+
     def __init__(self, manufacturer, year, model, cost_price, sale_price):
         self.manufacturer = manufacturer
         self.year = year
@@ -46,6 +771,8 @@ class Car:
 
 
 class Sale:
+    __slots__ = ("employee", "car", "date", "real_price")
+
     def __init__(self, employee, car, date, real_price):
         self.employee = employee
         self.car = car
@@ -70,15 +797,48 @@ class Factory:
         return Sale(employee, car, date, real_price)
 
 
+def save_employee(name, position, phone, email):
+    insert("employees", Factory.create_employee(name, position, phone, email).to_dict())
+    print("Сотрудник добавлен.")
+
+
+def save_car(manufacturer, year, model, cost_price, sale_price):
+    insert("cars", Factory.create_car(manufacturer, year, model, cost_price, sale_price).to_dict())
+    print("Автомобиль добавлен.")
+
+
+def save_sale(employee_name, car_model, sale_date, real_price):
+    insert("sales", Factory.create_sale(employee_name, car_model, sale_date, real_price).to_dict())
+    print("Продажа добавлена.")
+
+
+def drop_employee(employee_name):
+    if remove("employees", name=employee_name):
+        print(f"Сотрудник {employee_name} удален.")
+    else:
+        print("Сотрудник не найден.")
+
+
+def drop_car(car_model):
+    if remove("cars", model=car_model):
+        print(f"Автомобиль модели {car_model} удален.")
+    else:
+        print("Автомобиль не найден.")
+
+
+def drop_sale(employee_name, car_model, sale_date):
+    if remove("sales", employee=employee_name, car=car_model, date=sale_date):
+        print(f"Продажа сотрудника {employee_name} по автомобилю {car_model} от {sale_date} удалена.")
+    else:
+        print("Продажа не найдена.")
+
+
 def add_employee():
     name = input("Введите ФИО: ")
     position = input("Введите должность: ")
     phone = input("Введите телефон: ")
     email = input("Введите email: ")
-    employee = Factory.create_employee(name, position, phone, email)
-    data["employees"].append(employee.to_dict())
-    save_data(data)
-    print("Сотрудник добавлен.")
+    save_employee(name, position, phone, email)
 
 
 def add_car():
@@ -87,10 +847,7 @@ def add_car():
     model = input("Введите модель: ")
     cost_price = float(input("Введите себестоимость: "))
     sale_price = float(input("Введите потенциальную цену продажи: "))
-    car = Factory.create_car(manufacturer, year, model, cost_price, sale_price)
-    data["cars"].append(car.to_dict())
-    save_data(data)
-    print("Автомобиль добавлен.")
+    save_car(manufacturer, year, model, cost_price, sale_price)
 
 
 def add_sale():
@@ -98,91 +855,361 @@ def add_sale():
     car_model = input("Введите модель автомобиля: ")
     sale_date = input("Введите дату продажи (ГГГГ-ММ-ДД): ")
     real_price = float(input("Введите реальную цену продажи: "))
-    sale = Factory.create_sale(employee_name, car_model, sale_date, real_price)
-    data["sales"].append(sale.to_dict())
-    save_data(data)
-    print("Продажа добавлена.")
+    save_sale(employee_name, car_model, sale_date, real_price)
 
 
 def delete_employee():
-    employee_name = input("Введите ФИО сотрудника для удаления: ")
-    employee_found = False
-    for employee in data["employees"]:
-        if employee["name"] == employee_name:
-            data["employees"].remove(employee)
-            employee_found = True
-            break
-    if employee_found:
-        save_data(data)
-        print(f"Сотрудник {employee_name} удален.")
-    else:
-        print("Сотрудник не найден.")
+    drop_employee(input("Введите ФИО сотрудника для удаления: "))
 
 
 def delete_car():
-    car_model = input("Введите модель автомобиля для удаления: ")
-    car_found = False
-    for car in data["cars"]:
-        if car["model"] == car_model:
-            data["cars"].remove(car)
-            car_found = True
-            break
-    if car_found:
-        save_data(data)
-        print(f"Автомобиль модели {car_model} удален.")
-    else:
-        print("Автомобиль не найден.")
+    drop_car(input("Введите модель автомобиля для удаления: "))
 
 
 def delete_sale():
     employee_name = input("Введите ФИО сотрудника продавца: ")
     car_model = input("Введите модель автомобиля: ")
     sale_date = input("Введите дату продажи (ГГГГ-ММ-ДД): ")
-    sale_found = False
-    for sale in data["sales"]:
-        if sale["employee"] == employee_name and sale["car"] == car_model and sale["date"] == sale_date:
-            data["sales"].remove(sale)
-            sale_found = True
-            break
-    if sale_found:
-        save_data(data)
-        print(f"Продажа сотрудника {employee_name} по автомобилю {car_model} от {sale_date} удалена.")
-    else:
-        print("Продажа не найдена.")
+    drop_sale(employee_name, car_model, sale_date)
 
 
-def report_sales_by_date():
+def parse_sale(row):
+    if isinstance(row, str):
+        row = json.loads(row)
+    employee = row["employee"].strip()
+    car = row["car"].strip()
+    if not employee or not car:
+        raise ValueError("не указан продавец или модель")
+    date = datetime.date.fromisoformat(row["date"].strip()).isoformat()
+    real_price = float(row["real_price"])
+    return Factory.create_sale(employee, car, date, real_price).to_dict()
+
+
+def read_rows(path):
+    with open(path, "r", newline="", encoding="utf-8") as file:
+        if path.endswith(".csv"):
+            yield from enumerate(csv.DictReader(file), 2)
+        else:
+            for line_no, line in enumerate(file, 1):
+                if line.strip():
+                    yield line_no, line
+
+
+def read_sales(path, errors, chunk_size=IMPORT_CHUNK):
+    chunk = []
+    line_no = 0
+    try:
+        for line_no, row in read_rows(path):
+            try:
+                chunk.append(parse_sale(row))
+            except (ValueError, TypeError, KeyError, AttributeError) as error:
+                errors.append((line_no, f"{type(error).__name__}: {error}"))
+                continue
+            if len(chunk) == chunk_size:
+                yield chunk
+                chunk = []
+    except (UnicodeDecodeError, csv.Error) as error:
+        errors.append((line_no + 1, f"{type(error).__name__}: {error}"))
+    if chunk:
+        yield chunk
+
+
+def import_sales(path):
+    errors = []
+    count = repo.bulk_insert("sales", read_sales(path, errors))
+    return count, errors
+
+
+def dump_sales(sales, file):
+    count = 0
+    for sale in sales:
+        file.write(",\n" if count else "[\n")
+        file.write(textwrap.indent(json.dumps(sale, indent=4, ensure_ascii=False), "    "))
+        count += 1
+    file.write("\n]" if count else "[]")
+    return count
+
+
+def export_sales(sales, path):
+    with open(path, "w", newline="", encoding="utf-8") as file:
+        if path.endswith(".csv"):
+            writer = csv.DictWriter(file, fieldnames=FIELDS["sales"])
+            writer.writeheader()
+            count = 0
+            for sale in sales:
+                writer.writerow(sale)
+                count += 1
+        elif path.endswith(".jsonl"):
+            count = 0
+            for sale in sales:
+                file.write(json.dumps(sale, ensure_ascii=False, separators=(",", ":")) + "\n")
+                count += 1
+        else:
+            count = dump_sales(sales, file)
+    return count
+
+
+def import_sales_file(path):
+    try:
+        count, errors = import_sales(path)
+    except FileNotFoundError:
+        print("Файл не найден.")
+        return
+    except OSError as error:
+        print(f"Не удалось прочитать файл: {error}")
+        return
+    for line_no, error in errors[:20]:
+        print(f"Строка {line_no}: {error}")
+    print(f"Импортировано продаж: {count}, пропущено строк: {len(errors)}.")
+
+
+def export_sales_file(start_date, end_date, path):
+    count = export_sales(repo.sales_between(start_date, end_date), path)
+    print(f"Выгружено продаж: {count}.")
+
+
+def bulk_import_sales():
+    import_sales_file(input("Введите путь к файлу продаж (CSV или JSONL): "))
+
+
+def export_sales_by_date():
     start_date = input("Введите начальную дату (ГГГГ-ММ-ДД): ")
     end_date = input("Введите конечную дату (ГГГГ-ММ-ДД): ")
-    sales = [s for s in data["sales"] if start_date <= s["date"] <= end_date]
-    print(json.dumps(sales, indent=4, ensure_ascii=False))
+    path = input("Введите путь к файлу (.json, .jsonl или .csv): ")
+    export_sales_file(start_date, end_date, path)
 
 
-def report_total_profit():
+def print_report(kind, start_date, end_date):
+    render = REPORTS[kind]
+    if kind in STREAMED_REPORTS:
+        render(start_date, end_date)
+        return
+    print(repo.cache.get((kind, start_date, end_date), lambda: render(start_date, end_date),
+                         months=(month_of(start_date), month_of(end_date)),
+                         tags=("cars",) if kind in JOINED_REPORTS else ()))
+
+
+def print_stats():
+    print(metrics.report())
+    print(repo.cache.report())
+
+
+def print_employee_sales(employee_name):
+    print(repo.cache.get(("sales_of", employee_name),
+                         lambda: json.dumps(repo.sales_of(employee_name), indent=4, ensure_ascii=False),
+                         tags=(("employee", employee_name),)))
+
+
+def period_report(kind):
     start_date = input("Введите начальную дату (ГГГГ-ММ-ДД): ")
     end_date = input("Введите конечную дату (ГГГГ-ММ-ДД): ")
-    total_profit = sum(s["real_price"] for s in data["sales"] if start_date <= s["date"] <= end_date)
-    print(f"Суммарная прибыль: {total_profit}")
+    print_report(kind, start_date, end_date)
+
+
+def print_sales_by_date(start_date, end_date):
+    dump_sales(repo.sales_between(start_date, end_date), sys.stdout)
+    print()
+
+
+def render_total_profit(start_date, end_date):
+    total = repo.margin(None, start_date, end_date).get(None, empty_row())
+    lines = [f"Выручка: {total['revenue']}", f"Суммарная прибыль: {total['margin']}"]
+    if total["unmatched"]:
+        lines.append(f"Без учёта продаж автомобилей, которых нет в каталоге: {total['unmatched']}")
+    return "\n".join(lines)
+
+
+def render_best_seller(start_date, end_date):
+    best_seller = repo.top("employee", start_date, end_date)
+    if not best_seller:
+        return "Нет продаж в указанный период."
+    return f"Лучший продавец: {best_seller[0][0]} ({best_seller[0][1]} продаж)"
+
+
+def render_best_car(start_date, end_date):
+    best_car = repo.top("car", start_date, end_date)
+    if not best_car:
+        return "Нет продаж в указанный период."
+    return f"Самый продаваемый автомобиль: {best_car[0][0]} ({best_car[0][1]} продаж)"
+
+
+def render_sales_summary(start_date, end_date):
+    lines = []
+    for title, field in (("Сотрудники", "employee"), ("Автомобили", "car")):
+        summary = repo.summary(field, start_date, end_date)
+        lines.append(f"{title}:")
+        for name, row in sorted(summary.items(), key=lambda item: -item[1]["real_price"]):
+            lines.append(f"  {name}: {row['count']} продаж на сумму {row['real_price']}")
+    return "\n".join(lines)
+
+
+def render_margin(start_date, end_date):
+    lines = []
+    for title, by in (("Марки", "manufacturer"), ("Автомобили", "car")):
+        rows = cli.margin_rows(repo, by, start_date, end_date)
+        if not rows:
+            return "Нет продаж в указанный период."
+        lines.append(f"{title}:")
+        for name, row in rows:
+            if not row["costed"]:
+                lines.append(f"  {name or 'Нет в каталоге'}: {row['count']} продаж на сумму {row['revenue']}, "
+                             f"себестоимость неизвестна")
+            else:
+                lines.append(f"  {name}: {row['count']} продаж, выручка {row['revenue']}, "
+                             f"себестоимость {row['cost']}, прибыль {row['margin']} ({row['margin_pct']:.1f}%)")
+    return "\n".join(lines)
+
+
+def render_discounts(start_date, end_date):
+    rows = cli.margin_rows(repo, "car", start_date, end_date, "discount")
+    if not rows:
+        return "Нет продаж в указанный период."
+    lines = []
+    for name, row in rows:
+        if row["unmatched"]:
+            lines.append(f"{name}: {row['count']} продаж, автомобиля нет в каталоге")
+        else:
+            lines.append(f"{name}: {row['count']} продаж, по прайсу {row['list_price']}, продано за {row['revenue']}, "
+                         f"скидка {row['discount']} ({row['discount_pct']:.1f}%)")
+    return "\n".join(lines)
+
+
+def render_employee_profit(start_date, end_date):
+    rows = cli.margin_rows(repo, "employee", start_date, end_date)
+    if not rows:
+        return "Нет продаж в указанный период."
+    lines = []
+    for name, row in rows:
+        line = (f"{name}: {row['count']} продаж, выручка {row['revenue']}, прибыль {row['margin']} "
+                f"({row['margin_pct']:.1f}%), в среднем {row['margin_per_sale']:.2f} с продажи, "
+                f"скидки {row['discount']}")
+        if row["unmatched"]:
+            line += f", без себестоимости: {row['unmatched']}"
+        lines.append(line)
+    return "\n".join(lines)
+
+
+REPORTS = {
+    "sales": print_sales_by_date,
+    "profit": render_total_profit,
+    "best-seller": render_best_seller,
+    "best-car": render_best_car,
+    "summary": render_sales_summary,
+    "margin": render_margin,
+    "discounts": render_discounts,
+    "employee-profit": render_employee_profit,
+}
+
+
+def report_sales_by_date():
+    period_report("sales")
+
+
+def report_total_profit():
+    period_report("profit")
 
 
 def report_best_seller():
-    start_date = input("Введите начальную дату (ГГГГ-ММ-ДД): ")
-    end_date = input("Введите конечную дату (ГГГГ-ММ-ДД): ")
-    employees = [s["employee"] for s in data["sales"] if start_date <= s["date"] <= end_date]
-    if not employees:
-        print("Нет продаж в указанный период.")
-        return
-    best_seller = Counter(employees).most_common(1)
-    print(f"Лучший продавец: {best_seller[0][0]} ({best_seller[0][1]} продаж)")
+    period_report("best-seller")
+
+
+def report_best_car():
+    period_report("best-car")
+
+
+def report_sales_summary():
+    period_report("summary")
+
+
+def report_margin():
+    period_report("margin")
+
+
+def report_discounts():
+    period_report("discounts")
+
+
+def report_employee_profit():
+    period_report("employee-profit")
 
 
 def report_sales_by_employee():
-    employee_name = input("Введите ФИО сотрудника: ")
-    sales = [s for s in data["sales"] if s["employee"] == employee_name]
-    print(json.dumps(sales, indent=4, ensure_ascii=False))
+    print_employee_sales(input("Введите ФИО сотрудника: "))
+
+
+def build_parser():
+    parser, commands = cli.build_parser("main.py", "Автосалон: команды без интерактивного меню")
+    command = commands.add_parser("add-employee", help="добавить сотрудника")
+    command.add_argument("name")
+    command.add_argument("position")
+    command.add_argument("phone")
+    command.add_argument("email")
+    command.set_defaults(run=lambda args: save_employee(args.name, args.position, args.phone, args.email))
+    command = commands.add_parser("add-car", help="добавить автомобиль")
+    command.add_argument("manufacturer")
+    command.add_argument("year")
+    command.add_argument("model")
+    command.add_argument("cost_price", type=float)
+    command.add_argument("sale_price", type=float)
+    command.set_defaults(run=lambda args: save_car(args.manufacturer, args.year, args.model,
+                                                   args.cost_price, args.sale_price))
+    command = commands.add_parser("add-sale", help="добавить продажу")
+    command.add_argument("employee")
+    command.add_argument("car")
+    command.add_argument("date", type=iso_date, help="ГГГГ-ММ-ДД")
+    command.add_argument("real_price", type=float)
+    command.set_defaults(run=lambda args: save_sale(args.employee, args.car, args.date, args.real_price))
+    command = commands.add_parser("delete-employee", help="удалить сотрудника")
+    command.add_argument("name")
+    command.set_defaults(run=lambda args: drop_employee(args.name))
+    command = commands.add_parser("delete-car", help="удалить автомобиль")
+    command.add_argument("model")
+    command.set_defaults(run=lambda args: drop_car(args.model))
+    command = commands.add_parser("delete-sale", help="удалить продажу")
+    command.add_argument("employee")
+    command.add_argument("car")
+    command.add_argument("date")
+    command.set_defaults(run=lambda args: drop_sale(args.employee, args.car, args.date))
+    command = commands.add_parser("report", help="отчёт за период")
+    command.add_argument("kind", choices=sorted(REPORTS))
+    command.add_argument("--from", dest="start_date", required=True, help="ГГГГ-ММ-ДД")
+    command.add_argument("--to", dest="end_date", required=True, help="ГГГГ-ММ-ДД")
+    command.set_defaults(run=lambda args: print_report(args.kind, args.start_date, args.end_date))
+    command = commands.add_parser("employee-sales", help="продажи сотрудника")
+    command.add_argument("name")
+    command.set_defaults(run=lambda args: print_employee_sales(args.name))
+    command = commands.add_parser("list", help="вывести сотрудников или автомобили")
+    command.add_argument("table", choices=("employees", "cars"))
+    command.set_defaults(run=lambda args: print(json.dumps(repo.all(args.table), indent=4, ensure_ascii=False)))
+    command = commands.add_parser("import", help="импорт продаж из CSV или JSONL")
+    command.add_argument("path")
+    command.set_defaults(run=lambda args: import_sales_file(args.path))
+    command = commands.add_parser("export", help="выгрузка продаж за период")
+    command.add_argument("path")
+    command.add_argument("--from", dest="start_date", required=True, help="ГГГГ-ММ-ДД")
+    command.add_argument("--to", dest="end_date", required=True, help="ГГГГ-ММ-ДД")
+    command.set_defaults(run=lambda args: export_sales_file(args.start_date, args.end_date, args.path))
+    cli.add_common_commands(commands, lambda args: print_stats(), lambda args: run_script(args.path))
+    return parser
+
+
+def run_script(path):
+    cli.run_script(build_parser(), path, lambda args: args.run(args))
+
+
+def run_command(argv):
+    args = build_parser().parse_args(argv)
+    metrics.start()
+    if args.command in READ_COMMANDS:
+        repo.refresh()
+        args.run(args)
+        return
+    with repo.session():
+        args.run(args)
 
 
 def main():
+    metrics.start()
     while True:
         print("\nМеню:")
         print("1. Добавить сотрудника")
@@ -198,9 +1225,18 @@ def main():
         print("11. Удалить сотрудника")
         print("12. Удалить автомобиль")
         print("13. Удалить продажу")
+        print("14. Сводка продаж за период")
+        print("15. Импорт продаж из файла")
+        print("16. Выгрузка продаж за период в файл")
+        if metrics.enabled:
+            print("17. Статистика")
+        print("18. Маржа по маркам и автомобилям за период")
+        print("19. Скидки от цены продажи за период")
+        print("20. Прибыльность сотрудников за период")
         print("0. Выход")
 
         choice = input("Выберите действие: ")
+        repo.refresh()
         if choice == "1":
             add_employee()
         elif choice == "2":
@@ -214,11 +1250,11 @@ def main():
         elif choice == "6":
             report_best_seller()
         elif choice == "7":
-            print(json.dumps(data["employees"], indent=4, ensure_ascii=False))
+            print(json.dumps(repo.all("employees"), indent=4, ensure_ascii=False))
         elif choice == "8":
-            print(json.dumps(data["cars"], indent=4, ensure_ascii=False))
+            print(json.dumps(repo.all("cars"), indent=4, ensure_ascii=False))
         elif choice == "9":
-            report_sales_by_date()
+            report_best_car()
         elif choice == "10":
             report_sales_by_employee()
         elif choice == "11":
@@ -227,11 +1263,27 @@ def main():
             delete_car()
         elif choice == "13":
             delete_sale()
+        elif choice == "14":
+            report_sales_summary()
+        elif choice == "15":
+            bulk_import_sales()
+        elif choice == "16":
+            export_sales_by_date()
+        elif choice == "17" and metrics.enabled:
+            print_stats()
+        elif choice == "18":
+            report_margin()
+        elif choice == "19":
+            report_discounts()
+        elif choice == "20":
+            report_employee_profit()
         elif choice == "0":
+            repo.flush()
             break
         else:
             print("Некорректный ввод, попробуйте снова.")
 
 
 if __name__ == "__main__":
-    main()
+    init_repository()
+    cli.dispatch(run_command, main)
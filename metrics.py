@@ -0,0 +1,133 @@
+import atexit
+import functools
+import json
+import os
+import sys
+import threading
+import time
+from bisect import bisect_left
+
+enabled = "--stats" in sys.argv or os.environ.get("METRICS", "") not in ("", "0")
+METRICS_FILE = os.environ.get("METRICS_FILE", "metrics.json")
+METRICS_INTERVAL = float(os.environ.get("METRICS_INTERVAL", "60"))
+BUCKETS_MS = (0.1, 0.5, 1, 5, 10, 50, 100, 500, 1000, 5000)
+
+_lock = threading.Lock()
+_timers = {}
+_counters = {}
+_dumper = None
+
+
+class Histogram:
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS_MS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, ms):
+        self.counts[bisect_left(BUCKETS_MS, ms)] += 1
+        self.count += 1
+        self.total += ms
+        self.max = max(self.max, ms)
+
+    def percentile(self, p):
+        rank = self.count * p / 100
+        seen = 0
+        for i, count in enumerate(self.counts):
+            seen += count
+            if count and seen >= rank:
+                return min(BUCKETS_MS[i], self.max) if i < len(BUCKETS_MS) else self.max
+        return 0.0
+
+    def to_dict(self):
+        labels = [f"<={bound}ms" for bound in BUCKETS_MS] + [f">{BUCKETS_MS[-1]}ms"]
+        return {
+            "calls": self.count,
+            "total_ms": round(self.total, 3),
+            "mean_ms": round(self.total / self.count, 3) if self.count else 0.0,
+            "max_ms": round(self.max, 3),
+            "p50_ms": round(self.percentile(50), 3),
+            "p99_ms": round(self.percentile(99), 3),
+            "histogram": {label: count for label, count in zip(labels, self.counts) if count},
+        }
+
+
+def observe(name, ms):
+    with _lock:
+        histogram = _timers.get(name)
+        if histogram is None:
+            histogram = _timers[name] = Histogram()
+        histogram.observe(ms)
+
+
+def count(name, amount=1):
+    with _lock:
+        _counters[name] = _counters.get(name, 0) + amount
+
+
+def timed(name):
+    def decorate(func):
+        if not enabled:
+            return func
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                observe(name, (time.perf_counter() - start) * 1000)
+        return wrapper
+    return decorate
+
+
+def snapshot():
+    with _lock:
+        return {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "timers": {name: histogram.to_dict() for name, histogram in sorted(_timers.items())},
+            "counters": dict(sorted(_counters.items())),
+        }
+
+
+def report():
+    data = snapshot()
+    lines = ["Операции:"]
+    for name, row in data["timers"].items():
+        lines.append(f"  {name}: {row['calls']} вызовов, среднее {row['mean_ms']} мс, "
+                     f"p99 {row['p99_ms']} мс, макс {row['max_ms']} мс")
+    if not data["timers"]:
+        lines.append("  нет данных")
+    lines.append("Счётчики:")
+    for name, value in data["counters"].items():
+        lines.append(f"  {name}: {value}")
+    if not data["counters"]:
+        lines.append("  нет данных")
+    return "\n".join(lines)
+
+
+def dump(path=None):
+    path = path or METRICS_FILE
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as file:
+        json.dump(snapshot(), file, ensure_ascii=False, indent=4)
+    os.replace(tmp_path, path)
+
+
+def _dump_periodically(interval):
+    while True:
+        time.sleep(interval)
+        try:
+            dump()
+        except OSError:
+            pass
+
+
+def start(interval=METRICS_INTERVAL):
+    global _dumper
+    if not enabled or _dumper is not None:
+        return
+    _dumper = threading.Thread(target=_dump_periodically, args=(interval,), daemon=True)
+    _dumper.start()
+    atexit.register(dump)
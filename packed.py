@@ -0,0 +1,159 @@
+import gzip
+import io
+import json
+import lzma
+import os
+import sys
+
+EXTENSION = ".jsonz"
+FORMAT = "compact/1"
+COMPRESSION = os.environ.get("COMPRESSION", "gzip")
+LEVEL = int(os.environ.get("COMPRESSION_LEVEL", "6"))
+GZIP_MAGIC = b"\x1f\x8b"
+LZMA_MAGIC = b"\xfd7zXZ\x00"
+KEY = "__key__"
+CHUNK = 4096
+encoder = json.JSONEncoder(ensure_ascii=False, separators=(",", ":"))
+
+
+def is_table(value):
+    return type(value) is list and all(type(record) is dict for record in value)
+
+
+def infer_fields(records):
+    keys = {}
+    for record in records:
+        for key, value in record.items():
+            items = keys.setdefault(key, [])
+            if items is None:
+                continue
+            if is_table(value):
+                items.extend(value)
+            else:
+                keys[key] = None
+    return [[key, infer_fields(items)] if items else key for key, items in keys.items()]
+
+
+class Schema:
+    def __init__(self, fields):
+        self.fields = fields
+        self.names = [field[0] if type(field) is list else field for field in fields]
+        self.keys = set(self.names)
+        self.nested = [(i, field[0], Schema(field[1])) for i, field in enumerate(fields) if type(field) is list]
+
+    def encode(self, record):
+        if len(record) != len(self.names) or record.keys() != self.keys:
+            return record
+        row = [record[name] for name in self.names]
+        for i, _, schema in self.nested:
+            row[i] = [schema.encode(item) for item in row[i]]
+        return row
+
+    def decode(self, row):
+        if type(row) is dict:
+            return row
+        record = dict(zip(self.names, row))
+        for _, name, schema in self.nested:
+            record[name] = schema.decode_all(record[name])
+        return record
+
+    def decode_all(self, rows):
+        if self.nested:
+            return [self.decode(row) for row in rows]
+        names = self.names
+        return [row if type(row) is dict else dict(zip(names, row)) for row in rows]
+
+
+def compressor(file, compression, level):
+    if compression == "gzip":
+        return gzip.GzipFile(fileobj=file, mode="wb", compresslevel=level, mtime=0)
+    if compression == "lzma":
+        return lzma.LZMAFile(file, "wb", preset=level)
+    if compression == "none":
+        return None
+    raise ValueError(f"неизвестное сжатие: {compression}")
+
+
+def dump(data, file, compression=COMPRESSION, level=LEVEL):
+    if data and all(type(value) is dict for value in data.values()):
+        layout = "map"
+        parts = {"records": [{KEY: key, **value} for key, value in data.items()]}
+    else:
+        layout = "tables"
+        parts = data
+    tables = {key: value for key, value in parts.items() if is_table(value)}
+    schemas = {key: Schema(infer_fields(value)) for key, value in tables.items()}
+    header = {
+        "format": FORMAT,
+        "layout": layout,
+        "order": list(parts),
+        "meta": {key: value for key, value in parts.items() if key not in tables},
+        "tables": [[key, schemas[key].fields, len(value)] for key, value in tables.items()],
+    }
+    stream = compressor(file, compression, level)
+    text = io.TextIOWrapper(stream or file, encoding="utf-8", newline="\n")
+    text.write(encoder.encode(header) + "\n")
+    for key, records in tables.items():
+        encode = schemas[key].encode
+        for start in range(0, len(records), CHUNK):
+            text.write(encoder.encode([encode(record) for record in records[start:start + CHUNK]]) + "\n")
+    text.flush()
+    text.detach()
+    if stream is not None:
+        stream.close()
+
+
+def open_text(path):
+    with open(path, "rb") as file:
+        magic = file.read(len(LZMA_MAGIC))
+    if magic.startswith(GZIP_MAGIC):
+        stream = gzip.open(path, "rb")
+    elif magic.startswith(LZMA_MAGIC):
+        stream = lzma.open(path, "rb")
+    else:
+        stream = open(path, "rb")
+    return io.TextIOWrapper(stream, encoding="utf-8")
+
+
+def load(path):
+    with open_text(path) as text:
+        first = text.readline()
+        try:
+            header = json.loads(first)
+        except json.JSONDecodeError:
+            header = None
+        if type(header) is not dict or header.get("format") != FORMAT:
+            rest = text.read()
+            return json.loads(first + rest) if rest.strip() or header is None else header
+        parts = dict(header["meta"])
+        for key, fields, count in header["tables"]:
+            schema = Schema(fields)
+            records = parts[key] = []
+            while len(records) < count:
+                line = text.readline()
+                if not line:
+                    break
+                records += schema.decode_all(json.loads(line))
+            if len(records) != count:
+                raise json.JSONDecodeError("файл обрезан", first, 0)
+    parts = {key: parts[key] for key in header["order"]}
+    if header["layout"] == "map":
+        return {record.pop(KEY): record for record in parts["records"]}
+    return parts
+
+
+def convert(source, target, compression=COMPRESSION, level=LEVEL):
+    data = load(source)
+    if target.endswith(EXTENSION):
+        with open(target, "wb") as file:
+            dump(data, file, compression, level)
+    else:
+        with open(target, "w", encoding="utf-8") as file:
+            json.dump(data, file, indent=4, ensure_ascii=False)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 3:
+        print(f"Использование: python packed.py <откуда> <куда>  (в {EXTENSION} - компактный формат, иначе JSON)")
+        sys.exit(1)
+    convert(sys.argv[1], sys.argv[2])
@@ -0,0 +1,101 @@
+MEASURES = ("count", "revenue", "cost", "margin", "list_price", "discount", "unmatched", "costed")
+
+
+def hash_join(rows, key, lookup):
+    matches = {}
+    for row in rows:
+        value = row[key]
+        item = matches.get(value, matches)
+        if item is matches:
+            item = matches[value] = lookup(value)
+        yield row, item
+
+
+def empty_row():
+    return dict.fromkeys(MEASURES, 0)
+
+
+def finish(result):
+    for row in result.values():
+        sold = row["cost"] + row["margin"]
+        row["margin_pct"] = row["margin"] / sold * 100 if sold else 0
+        row["discount_pct"] = row["discount"] / row["list_price"] * 100 if row["list_price"] else 0
+        row["margin_per_sale"] = row["margin"] / row["costed"] if row["costed"] else 0
+    return result
+
+
+class MarginQuery:
+    def __init__(self, key, price, cost, list_price, groups, profit=None):
+        self.key = key
+        self.price = price
+        self.cost = cost
+        self.list_price = list_price
+        self.groups = groups
+        self.profit = profit
+
+    def group_key(self, by):
+        if by not in self.groups:
+            raise ValueError(by)
+        if by is None:
+            return lambda sale, item: None
+        if by == "month":
+            return lambda sale, item: sale["date"][:7]
+        return lambda sale, item: sale[by] if by in sale else None if item is None else item[by]
+
+    def add_summary(self, row, item, sums):
+        count, price = sums["count"], sums[self.price]
+        row["count"] += count
+        row["revenue"] += price
+        if item is None:
+            row["unmatched"] += count
+        else:
+            row["list_price"] += item[self.list_price] * count
+            row["discount"] += item[self.list_price] * count - price
+        if self.profit is not None:
+            margin = sums[self.profit]
+            cost = price - margin
+        elif item is not None:
+            cost = item[self.cost] * count
+            margin = price - cost
+        else:
+            return
+        row["costed"] += count
+        row["cost"] += cost
+        row["margin"] += margin
+
+    def group(self, sales, lookup, by=None, summaries=()):
+        name_of = self.group_key(by)
+        result = {}
+        for scope, rows in summaries:
+            for key, sums in rows.items():
+                item = lookup(key)
+                name = name_of({**scope, self.key: key}, item)
+                row = result.get(name)
+                if row is None:
+                    row = result[name] = empty_row()
+                self.add_summary(row, item, sums)
+        for sale, item in hash_join(sales, self.key, lookup):
+            name = name_of(sale, item)
+            row = result.get(name)
+            if row is None:
+                row = result[name] = empty_row()
+            price = sale[self.price]
+            row["count"] += 1
+            row["revenue"] += price
+            if item is None:
+                row["unmatched"] += 1
+            else:
+                row["list_price"] += item[self.list_price]
+                row["discount"] += item[self.list_price] - price
+            if self.profit is not None:
+                margin = sale[self.profit]
+                cost = price - margin
+            elif item is not None:
+                cost = item[self.cost]
+                margin = price - cost
+            else:
+                continue
+            row["costed"] += 1
+            row["cost"] += cost
+            row["margin"] += margin
+        return finish(result)
@@ -0,0 +1,89 @@
+import os
+import sys
+from collections import OrderedDict
+
+import metrics
+
+MAX_BYTES = int(float(os.environ.get("REPORT_CACHE_MB", "32")) * 1024 * 1024)
+
+
+def sizeof(value):
+    size = sys.getsizeof(value)
+    if isinstance(value, dict):
+        size += sum(sizeof(key) + sizeof(item) for key, item in value.items())
+    elif isinstance(value, (list, tuple)):
+        size += sum(sizeof(item) for item in value)
+    return size
+
+
+class ReportCache:
+    def __init__(self, max_bytes=MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.months = {}
+        self.tags = {}
+        self.version = 0
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def touch(self, month=None, tags=()):
+        self.version += 1
+        if month is not None:
+            self.months[month] = self.version
+        for tag in tags:
+            self.tags[tag] = self.version
+
+    def clear(self):
+        self.version += 1
+        self.entries.clear()
+        self.months.clear()
+        self.tags.clear()
+        self.size = 0
+
+    def _fresh(self, entry):
+        value, size, version, months, tags = entry
+        if months is not None:
+            first, last = months
+            if any(changed > version for month, changed in self.months.items() if first <= month <= last):
+                return False
+        return all(self.tags.get(tag, 0) <= version for tag in tags)
+
+    def _drop(self, key):
+        self.size -= self.entries.pop(key)[1]
+
+    def get(self, key, compute, months=None, tags=()):
+        entry = self.entries.get(key)
+        if entry is not None and self._fresh(entry):
+            self.entries.move_to_end(key)
+            self.hits += 1
+            if metrics.enabled:
+                metrics.count("report_cache.hit")
+            return entry[0]
+        self.misses += 1
+        if metrics.enabled:
+            metrics.count("report_cache.miss")
+        if entry is not None:
+            self._drop(key)
+        version = self.version
+        value = compute()
+        size = sizeof(value)
+        if size <= self.max_bytes:
+            self.entries[key] = (value, size, version, months, tuple(tags))
+            self.size += size
+            while self.size > self.max_bytes:
+                self._drop(next(iter(self.entries)))
+                self.evictions += 1
+                if metrics.enabled:
+                    metrics.count("report_cache.eviction")
+        return value
+
+    def stats(self):
+        return {"entries": len(self.entries), "bytes": self.size, "hits": self.hits,
+                "misses": self.misses, "evictions": self.evictions}
+
+    def report(self):
+        stats = self.stats()
+        return (f"Кэш отчётов: {stats['entries']} записей, {stats['bytes']} байт, попаданий {stats['hits']}, "
+                f"промахов {stats['misses']}, вытеснений {stats['evictions']}")
@@ -0,0 +1,50 @@
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+    import msvcrt
+
+
+class SharedFile:
+    def __init__(self, path):
+        self.path = path
+        self.lock_path = path + ".lock"
+        self._handle = None
+
+    @contextmanager
+    def lock(self, exclusive=True):
+        with open(self.lock_path, "a+") as handle:
+            if fcntl is not None:
+                fcntl.flock(handle, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+            else:
+                handle.seek(0)
+                msvcrt.locking(handle.fileno(), msvcrt.LK_LOCK, 1)
+            self._handle = handle
+            try:
+                yield self
+            finally:
+                self._handle = None
+                if fcntl is not None:
+                    fcntl.flock(handle, fcntl.LOCK_UN)
+                else:
+                    handle.seek(0)
+                    msvcrt.locking(handle.fileno(), msvcrt.LK_UNLCK, 1)
+
+    def version(self):
+        self._handle.seek(0)
+        text = self._handle.read().strip()
+        return int(text) if text else 0
+
+    def bump(self):
+        version = self.version() + 1
+        self._handle.seek(0)
+        self._handle.truncate()
+        self._handle.write(str(version))
+        self._handle.flush()
+        return version
+
+    def current_version(self):
+        with self.lock(exclusive=False):
+            return self.version()
@@ -0,0 +1,391 @@
+import json
+import mmap
+import struct
+import sys
+
+from columnar import numpy
+
+EXTENSION = ".snap"
+MAGIC = b"SNAPSHT1"
+TRAILER = struct.Struct("<Q8s")
+OFFSET = struct.Struct("<QQ")
+CODES = {"s": "I", "q": "q", "d": "d", "n": "dB", "j": "I"}
+DTYPES = {"s": ["<u4"], "q": ["<i8"], "d": ["<f8"], "n": ["<f8", "u1"], "j": ["<u4"]}
+INT64 = 2 ** 63
+MAX_EXACT = 2 ** 53
+COPY_CHUNK = 64 << 20
+
+
+def is_snapshot(path):
+    try:
+        with open(path, "rb") as file:
+            return file.read(len(MAGIC)) == MAGIC
+    except OSError:
+        return False
+
+
+def field_type(values):
+    kinds = set(map(type, values))
+    if kinds == {str}:
+        return "s"
+    if kinds == {int}:
+        return "q" if all(-INT64 <= v < INT64 for v in values) else "j"
+    if kinds == {float}:
+        return "d"
+    if kinds == {int, float} and all(type(v) is float or -MAX_EXACT <= v <= MAX_EXACT for v in values):
+        return "n"
+    return "j"
+
+
+def infer_fields(records):
+    if not records or not all(type(r) is dict for r in records):
+        return None
+    keys = tuple(records[0])
+    if any(tuple(r) != keys for r in records):
+        return None
+    return [(key, field_type([r[key] for r in records])) for key in keys]
+
+
+def fits(record, fields):
+    if type(record) is not dict or len(record) != len(fields):
+        return False
+    for (key, kind), (name, value) in zip(fields, record.items()):
+        if key != name:
+            return False
+        if kind == "s" and type(value) is not str:
+            return False
+        if kind == "q" and not (type(value) is int and -INT64 <= value < INT64):
+            return False
+        if kind == "d" and type(value) is not float:
+            return False
+        if kind == "n" and not (type(value) is float or type(value) is int and -MAX_EXACT <= value <= MAX_EXACT):
+            return False
+    return True
+
+
+class Pool:
+    def __init__(self, source=None):
+        self.source = source
+        self.base_count = source.pool_count if source else 0
+        self.base_size = source.pool_size if source else 0
+        self.index = {}
+        self.chunks = []
+        self.ends = []
+
+    def add(self, text):
+        i = self.index.get(text)
+        if i is None and self.source:
+            i = self.index[text] = self.source.code(text)
+        if i is None:
+            data = text.encode("utf-8")
+            self.chunks.append(data)
+            self.ends.append((self.ends[-1] if self.ends else self.base_size) + len(data))
+            i = self.index[text] = self.base_count + len(self.ends) - 1
+        return i
+
+    def write(self, file):
+        offsets_at = file.tell()
+        if self.source:
+            copy(file, self.source.mm, self.source.offsets_at, 8 * (self.base_count + 1))
+        else:
+            file.write(struct.pack("<Q", 0))
+        file.write(struct.pack(f"<{len(self.ends)}Q", *self.ends))
+        blob_at = file.tell()
+        if self.source:
+            copy(file, self.source.mm, self.source.blob_at, self.base_size)
+        for chunk in self.chunks:
+            file.write(chunk)
+        return {"count": self.base_count + len(self.ends), "offsets": offsets_at, "blob": blob_at}
+
+
+def copy(file, mm, start, length):
+    for position in range(start, start + length, COPY_CHUNK):
+        file.write(mm[position:min(start + length, position + COPY_CHUNK)])
+
+
+def encode_row(record, fields, pool):
+    row = []
+    for key, kind in fields:
+        value = record[key]
+        if kind == "s":
+            row.append(pool.add(value))
+        elif kind == "n":
+            row += [float(value), type(value) is int]
+        elif kind == "j":
+            row.append(pool.add(json.dumps(value, ensure_ascii=False)))
+        else:
+            row.append(value)
+    return row
+
+
+def write_table(file, name, records, pool):
+    offset = file.tell()
+    if isinstance(records, Table) and records.snapshot is pool.source and records.clean and \
+            (records.raw or all(fits(record, records.fields) for record in records.tail)):
+        rows, fields, raw = records.tail, records.fields, records.raw
+        copy(file, pool.source.mm, records.offset, records.base * records.struct.size)
+    else:
+        rows = list(records)
+        fields = infer_fields(rows)
+        raw = fields is None
+        fields = [("", "j")] if raw else fields
+    packer = struct.Struct("<" + "".join(CODES[kind] for _, kind in fields))
+    for record in rows:
+        file.write(packer.pack(*encode_row({"": record} if raw else record, fields, pool)))
+    return {"name": name, "fields": fields, "raw": raw, "count": len(records), "offset": offset}
+
+
+def dump(data, file):
+    if data and all(type(value) is dict for value in data.values()):
+        layout = "map"
+        parts = {"records": [{"__key__": key, **value} for key, value in data.items()]}
+    else:
+        layout = "tables"
+        parts = data
+    tables = {key: value for key, value in parts.items()
+              if isinstance(value, Table) or type(value) is list and all(type(r) is dict for r in value)}
+    source = next((value.snapshot for value in tables.values() if isinstance(value, Table)), None)
+    pool = Pool(source)
+    file.write(MAGIC)
+    header = {
+        "layout": layout,
+        "order": list(parts),
+        "meta": {key: value for key, value in parts.items() if key not in tables},
+        "tables": [write_table(file, key, value, pool) for key, value in tables.items()],
+    }
+    header["pool"] = pool.write(file)
+    header_at = file.tell()
+    file.write(json.dumps(header, ensure_ascii=False).encode("utf-8"))
+    file.write(TRAILER.pack(header_at, MAGIC))
+
+
+class Snapshot:
+    def __init__(self, path):
+        with open(path, "rb") as file:
+            self.mm = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        end = len(self.mm) - TRAILER.size
+        header_at, magic = TRAILER.unpack_from(self.mm, end)
+        if magic != MAGIC or self.mm[:len(MAGIC)] != MAGIC:
+            raise ValueError(f"{path}: не снимок")
+        header = json.loads(self.mm[header_at:end].decode("utf-8"))
+        self.layout = header["layout"]
+        self.order = header["order"]
+        self.meta = header["meta"]
+        self.pool_count = header["pool"]["count"]
+        self.offsets_at = header["pool"]["offsets"]
+        self.blob_at = header["pool"]["blob"]
+        self.pool_size = struct.unpack_from("<Q", self.mm, self.offsets_at + 8 * self.pool_count)[0]
+        self.strings = {}
+        self.codes = None
+        self.tables = {spec["name"]: Table(self, spec) for spec in header["tables"]}
+
+    def string(self, i):
+        text = self.strings.get(i)
+        if text is None:
+            start, end = OFFSET.unpack_from(self.mm, self.offsets_at + 8 * i)
+            text = self.strings[i] = self.mm[self.blob_at + start:self.blob_at + end].decode("utf-8")
+        return text
+
+    def code(self, text):
+        if self.codes is None:
+            ends = struct.unpack_from(f"<{self.pool_count + 1}Q", self.mm, self.offsets_at)
+            self.codes = {}
+            for i in range(self.pool_count - 1, -1, -1):
+                self.codes[self.mm[self.blob_at + ends[i]:self.blob_at + ends[i + 1]].decode("utf-8")] = i
+        return self.codes.get(text)
+
+    def data(self):
+        if self.layout == "map":
+            return {record["__key__"]: {k: v for k, v in record.items() if k != "__key__"}
+                    for record in self.tables["records"]}
+        return {key: self.tables[key] if key in self.tables else self.meta[key] for key in self.order}
+
+
+class Table:
+    def __init__(self, snapshot, spec):
+        self.snapshot = snapshot
+        self.fields = [tuple(field) for field in spec["fields"]]
+        self.raw = spec["raw"]
+        self.offset = spec["offset"]
+        self.base = spec["count"]
+        self.struct = struct.Struct("<" + "".join(CODES[kind] for _, kind in self.fields))
+        self.records = {}
+        self.tail = []
+        self.size = self.base
+        self.clean = True
+
+    def copy(self):
+        table = object.__new__(Table)
+        table.__dict__.update(self.__dict__)
+        table.records = dict(self.records)
+        table.tail = list(self.tail)
+        return table
+
+    def _decode(self, i):
+        values = iter(self.struct.unpack_from(self.snapshot.mm, self.offset + i * self.struct.size))
+        record = {}
+        for key, kind in self.fields:
+            value = next(values)
+            if kind == "s":
+                value = self.snapshot.string(value)
+            elif kind == "n":
+                value = int(value) if next(values) else value
+            elif kind == "j":
+                value = json.loads(self.snapshot.string(value))
+            record[key] = value
+        return record[""] if self.raw else record
+
+    def __len__(self):
+        return self.size
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(self.size))]
+        if i < 0:
+            i += self.size
+        if not 0 <= i < self.size:
+            raise IndexError(i)
+        if i >= self.base:
+            return self.tail[i - self.base]
+        record = self.records.get(i)
+        if record is None:
+            record = self.records[i] = self._decode(i)
+        return record
+
+    def __setitem__(self, i, record):
+        if i < 0:
+            i += self.size
+        if not 0 <= i < self.size:
+            raise IndexError(i)
+        if i >= self.base:
+            self.tail[i - self.base] = record
+        else:
+            self.records[i] = record
+            self.clean = False
+
+    def __iter__(self):
+        for i in range(self.size):
+            yield self[i]
+
+    def append(self, record):
+        if self.size < self.base:
+            self.records[self.size] = record
+        else:
+            self.tail.append(record)
+        self.size += 1
+
+    def pop(self):
+        if not self.size:
+            raise IndexError("pop from empty table")
+        record = self[self.size - 1]
+        if self.size > self.base:
+            self.tail.pop()
+        else:
+            self.records.pop(self.size - 1, None)
+            self.clean = False
+        self.size -= 1
+        return record
+
+    def _numeric(self, *fields):
+        kinds = dict(self.fields)
+        return self.clean and not self.raw and kinds.get(fields[-1]) in ("q", "d", "n") and \
+            all(kinds.get(field) == "s" for field in fields[:-1])
+
+    def _array(self):
+        names, formats = [], []
+        for key, kind in self.fields:
+            for j, dtype in enumerate(DTYPES[kind]):
+                names.append(key if j == 0 else key + ":int")
+                formats.append(dtype)
+        np = numpy()
+        dtype = np.dtype({"names": names, "formats": formats})
+        return np.frombuffer(self.snapshot.mm, dtype, count=self.base, offset=self.offset)
+
+    def _rows(self, key_field, value_field):
+        positions, i = {}, 0
+        for key, kind in self.fields:
+            positions[key] = i
+            i += len(CODES[kind])
+        k, v = positions.get(key_field), positions[value_field]
+        mixed = dict(self.fields)[value_field] == "n"
+        view = memoryview(self.snapshot.mm)[self.offset:self.offset + self.base * self.struct.size]
+        for row in self.struct.iter_unpack(view):
+            value = int(row[v]) if mixed and row[v + 1] else row[v]
+            yield (None if k is None else row[k]), value
+
+    def total(self, value_field):
+        total = 0
+        if not self._numeric(value_field):
+            for record in self:
+                total += record[value_field]
+            return total
+        np = numpy()
+        if self.base and np is not None:
+            columns = self._array()
+            kind = dict(self.fields)[value_field]
+            total = np.cumsum(columns[value_field])[-1].item()
+            if kind == "q" or kind == "n" and columns[value_field + ":int"].all():
+                total = int(total)
+        elif self.base:
+            for _, value in self._rows(None, value_field):
+                total += value
+        for record in self.tail:
+            total += record[value_field]
+        return total
+
+    def group_total(self, key_field, value_field):
+        result = {}
+        if not self._numeric(key_field, value_field):
+            for record in self:
+                result[record[key_field]] = result.get(record[key_field], 0) + record[value_field]
+            return result
+        np = numpy()
+        if self.base and np is not None:
+            columns = self._array()
+            kind = dict(self.fields)[value_field]
+            codes, inverse = np.unique(columns[key_field], return_inverse=True)
+            sums = np.bincount(inverse, weights=columns[value_field], minlength=len(codes))
+            if kind == "n":
+                floats = np.bincount(inverse, weights=columns[value_field + ":int"] == 0, minlength=len(codes))
+            for j, code in enumerate(codes.tolist()):
+                total = sums[j].item()
+                if kind == "q" or kind == "n" and not floats[j]:
+                    total = int(total)
+                name = self.snapshot.string(code)
+                result[name] = result.get(name, 0) + total
+        elif self.base:
+            by_code = {}
+            for code, value in self._rows(key_field, value_field):
+                by_code[code] = by_code.get(code, 0) + value
+            for code, total in by_code.items():
+                name = self.snapshot.string(code)
+                result[name] = result.get(name, 0) + total
+        for record in self.tail:
+            result[record[key_field]] = result.get(record[key_field], 0) + record[value_field]
+        return result
+
+
+def load(path):
+    return Snapshot(path).data()
+
+
+def to_plain(data):
+    return {key: list(value) if isinstance(value, Table) else value for key, value in data.items()}
+
+
+def convert(source, target):
+    if is_snapshot(source):
+        with open(target, "w", encoding="utf-8") as file:
+            json.dump(to_plain(load(source)), file, indent=4, ensure_ascii=False)
+    else:
+        with open(source, "r", encoding="utf-8") as file:
+            data = json.load(file)
+        with open(target, "wb") as file:
+            dump(data, file)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 3:
+        print("Использование: python snapshot.py <откуда> <куда>  (JSON -> снимок или снимок -> JSON)")
+        sys.exit(1)
+    convert(sys.argv[1], sys.argv[2])
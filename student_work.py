@@ -1,9 +1,36 @@
+import argparse
+import atexit
 import json
-from typing import List, Dict
+import sys
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from bisect import bisect_left, bisect_right, insort
+from collections import Counter
+from contextlib import contextmanager
+from typing import List, Dict, Optional
 import os
 
+import cli
+import formats
+import metrics
+import packed
+import snapshot
+import sqlite_storage
+from codec import Codec
+from shared_file import SharedFile
+
+STORAGE = os.environ.get("STORAGE", "json")
+DB_FILE = "house_data.db"
+EXTENSION = {"snapshot": snapshot.EXTENSION, "compact": packed.EXTENSION}.get(STORAGE, ".json")
+HOUSE_FILE = "house_data" + EXTENSION
+SAVE_DELAY = float(os.environ.get("SAVE_DELAY", "0"))
+PORTFOLIO_DIR = os.environ.get("PORTFOLIO_DIR", "portfolio")
+CODEC = Codec(ensure_ascii=False)
+
 
 class Resident:
+    __slots__ = ("full_name", "years_old")
+
     def __init__(self, full_name: str, years_old: int):
         self.full_name = full_name
         self.years_old = years_old
@@ -17,17 +44,25 @@ class Resident:
 
 
 class Apartment:
+    __slots__ = ("num", "lvl", "category", "occupants", "dirty")
+
     def __init__(self, num: int, lvl: int, category: str):
         self.num = num
         self.lvl = lvl
         self.category = category
         self.occupants: List[Resident] = []
+        self.dirty = True
 
     def settle_resident(self, person: Resident):
         self.occupants.append(person)
+        self.dirty = True
 
     def evict_resident(self, person_name: str):
-        self.occupants = [p for p in self.occupants if p.full_name != person_name]
+        evicted = [p for p in self.occupants if p.full_name == person_name]
+        if evicted:
+            self.occupants = [p for p in self.occupants if p.full_name != person_name]
+            self.dirty = True
+        return evicted
 
     def to_dict(self):
         return {
@@ -44,45 +79,694 @@ class Apartment:
         return apartment
 
 
+def encode_apartment(apartment: Apartment):
+    encode = CODEC.encode_value
+    occupants = ",\n".join([
+        "            {\n"
+        "                \"full_name\": " + encode(p.full_name) + ",\n"
+        "                \"years_old\": " + encode(p.years_old) + "\n"
+        "            }"
+        for p in apartment.occupants
+    ])
+    return ("{\n"
+            "        \"num\": " + encode(apartment.num) + ",\n"
+            "        \"lvl\": " + encode(apartment.lvl) + ",\n"
+            "        \"category\": " + encode(apartment.category) + ",\n"
+            "        \"occupants\": " + ("[\n" + occupants + "\n        ]" if occupants else "[]") + "\n"
+            "    }")
+
+
+class ResidentIndex:
+    def __init__(self, apartments=()):
+        self.by_name: Dict[str, Counter] = {}
+        self.floors: List[int] = []
+        self.by_floor: Dict[int, set] = {}
+        self.ages: Dict[int, list] = {}
+        self.all_ages: list = []
+        self.people: Dict[int, tuple] = {}
+        for apartment in apartments:
+            self.add_apartment(apartment)
+
+    def add_apartment(self, apartment: Apartment):
+        if apartment.lvl not in self.by_floor:
+            insort(self.floors, apartment.lvl)
+            self.by_floor[apartment.lvl] = set()
+            self.ages[apartment.lvl] = []
+        self.by_floor[apartment.lvl].add(apartment.num)
+        for person in apartment.occupants:
+            self.add_resident(apartment, person)
+
+    def remove_apartment(self, apartment: Apartment):
+        for person in apartment.occupants:
+            self.remove_resident(apartment, person)
+        self.by_floor[apartment.lvl].discard(apartment.num)
+        if not self.by_floor[apartment.lvl]:
+            del self.by_floor[apartment.lvl]
+            del self.ages[apartment.lvl]
+            del self.floors[bisect_left(self.floors, apartment.lvl)]
+
+    def add_resident(self, apartment: Apartment, person: Resident):
+        self.by_name.setdefault(person.full_name, Counter())[apartment.num] += 1
+        key = (person.years_old, id(person))
+        insort(self.ages[apartment.lvl], key)
+        insort(self.all_ages, key)
+        self.people[id(person)] = (apartment.num, person)
+
+    def remove_resident(self, apartment: Apartment, person: Resident):
+        apartments = self.by_name[person.full_name]
+        apartments[apartment.num] -= 1
+        if not apartments[apartment.num]:
+            del apartments[apartment.num]
+            if not apartments:
+                del self.by_name[person.full_name]
+        key = (person.years_old, id(person))
+        for ages in (self.ages[apartment.lvl], self.all_ages):
+            del ages[bisect_left(ages, key)]
+        del self.people[id(person)]
+
+    def apartments_of(self, name: str):
+        return sorted(self.by_name.get(name, ()))
+
+    def apartments_on(self, min_floor=None, max_floor=None):
+        lo = bisect_left(self.floors, min_floor) if min_floor is not None else 0
+        hi = bisect_right(self.floors, max_floor) if max_floor is not None else len(self.floors)
+        return sorted(num for lvl in self.floors[lo:hi] for num in self.by_floor[lvl])
+
+    def search(self, min_age=None, max_age=None, min_floor=None, max_floor=None):
+        if min_floor is None and max_floor is None:
+            lists = [self.all_ages]
+        else:
+            lo = bisect_left(self.floors, min_floor) if min_floor is not None else 0
+            hi = bisect_right(self.floors, max_floor) if max_floor is not None else len(self.floors)
+            lists = [self.ages[lvl] for lvl in self.floors[lo:hi]]
+        result = []
+        for ages in lists:
+            lo = bisect_left(ages, (min_age,)) if min_age is not None else 0
+            hi = bisect_left(ages, (max_age + 1,)) if max_age is not None else len(ages)
+            result.extend(self.people[person_id] for _, person_id in ages[lo:hi])
+        return result
+
+
 class Building:
-    def __init__(self):
+    def __init__(self, save_delay: float = SAVE_DELAY, file_path: str = "house_data.json"):
         self.units: Dict[int, Apartment] = {}
+        self.file_path = file_path
+        self.shared = SharedFile(file_path)
+        self.version: Optional[int] = None
+        self.pending: List[tuple] = []
+        self.save_delay = save_delay
+        self._encoded: Dict[int, str] = {}
+        self._changed = False
+        self._deferred = False
+        self._timer = None
+        self._lock = threading.RLock()
+        self.index = ResidentIndex()
+        if save_delay:
+            atexit.register(self.flush)
 
     def register_apartment(self, apartment: Apartment):
-        self.units[apartment.num] = apartment
-        self.save_data()
+        with self._lock:
+            if apartment.num in self.units:
+                self.index.remove_apartment(self.units[apartment.num])
+            self.units[apartment.num] = apartment
+            self.index.add_apartment(apartment)
+            self.pending.append(("register", apartment.num, apartment.to_dict()))
+            self.save_data()
 
     def demolish_apartment(self, num: int):
-        if num in self.units:
-            del self.units[num]
-            self.save_data()
+        with self._lock:
+            if num in self.units:
+                self.index.remove_apartment(self.units.pop(num))
+                self._encoded.pop(num, None)
+                self.pending.append(("demolish", num, None))
+                self.save_data()
+
+    def _encode(self, num: int, apartment: Apartment):
+        if apartment.dirty or num not in self._encoded:
+            self._encoded[num] = encode_apartment(apartment)
+            apartment.dirty = False
+        return self._encoded[num]
+
+    def _text(self):
+        parts = [f"    {json.dumps(str(num))}: {self._encode(num, apt)}" for num, apt in self.units.items()]
+        return "{\n" + ",\n".join(parts) + "\n}" if parts else "{}"
+
+    def _write(self, file_path: str):
+        size = formats.write(file_path, lambda: {str(num): apt.to_dict() for num, apt in self.units.items()},
+                             self._text)
+        if metrics.enabled:
+            metrics.count("bytes_written.house", size)
+
+    def _read(self):
+        try:
+            return formats.read(self.file_path)
+        except FileNotFoundError:
+            return {}
 
+    def _merge(self, data: dict):
+        units = {int(k): Apartment.from_dict(v) for k, v in data.items()}
+        for op, num, value in self.pending:
+            if op == "register":
+                units[num] = Apartment.from_dict(value)
+            elif num not in units:
+                continue
+            elif op == "demolish":
+                del units[num]
+            elif op == "settle":
+                units[num].settle_resident(Resident.from_dict(value))
+            elif op == "evict":
+                units[num].evict_resident(value)
+        self.units = units
+        self._encoded = {}
+        self.index = ResidentIndex(self.units.values())
+
+    @metrics.timed("Building.export_data")
     def export_data(self, file_path: str = "house_data.json"):
-        with open(file_path, "w", encoding="utf-8") as file:
-            json.dump({num: apt.to_dict() for num, apt in self.units.items()}, file, indent=4, ensure_ascii=False)
+        with self._lock:
+            if file_path != self.file_path:
+                self._write(file_path)
+                return
+            with self.shared.lock():
+                if self.shared.version() != self.version:
+                    self._merge(self._read())
+                self._write(file_path)
+                self.version = self.shared.bump()
+            self.pending = []
+            self._changed = False
 
+    @metrics.timed("Building.import_data")
     def import_data(self, file_path: str = "house_data.json"):
-        if os.path.exists(file_path):
-            with open(file_path, "r", encoding="utf-8") as file:
-                data = json.load(file)
-                self.units = {int(k): Apartment.from_dict(v) for k, v in data.items()}
+        with self._lock:
+            self.file_path = file_path
+            self.shared = SharedFile(file_path)
+            with self.shared.lock(exclusive=False):
+                self.version = self.shared.version()
+                self._merge(self._read())
+
+    def refresh(self):
+        with self._lock:
+            if self.shared.current_version() == self.version:
+                return
+            with self.shared.lock(exclusive=False):
+                self.version = self.shared.version()
+                self._merge(self._read())
 
+    @metrics.timed("Building.save_data")
     def save_data(self):
-        self.export_data()
+        with self._lock:
+            self._changed = True
+            if self._deferred:
+                return
+            if not self.save_delay:
+                self.export_data(self.file_path)
+            elif self._timer is None:
+                self._timer = threading.Timer(self.save_delay, self.flush)
+                self._timer.daemon = True
+                self._timer.start()
+
+    @contextmanager
+    def batch(self):
+        with self._lock:
+            deferred, self._deferred = self._deferred, True
+            try:
+                yield self
+            finally:
+                self._deferred = deferred
+                if not deferred:
+                    self.flush()
+
+    def flush(self):
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            if self._changed:
+                self.export_data(self.file_path)
+
+    def has_apartment(self, num: int):
+        return num in self.units
+
+    @metrics.timed("Building.settle_resident")
+    def settle_resident(self, num: int, person: Resident):
+        with self._lock:
+            self.units[num].settle_resident(person)
+            self.index.add_resident(self.units[num], person)
+            self.pending.append(("settle", num, person.to_dict()))
+            self.save_data()
+
+    @metrics.timed("Building.evict_resident")
+    def evict_resident(self, num: int, person_name: str):
+        with self._lock:
+            for person in self.units[num].evict_resident(person_name):
+                self.index.remove_resident(self.units[num], person)
+            self.pending.append(("evict", num, person_name))
+            self.save_data()
 
     def show_residents(self):
         return [p.to_dict() for apt in self.units.values() for p in apt.occupants]
 
-    def show_apartments(self):
-        return [apt.to_dict() for apt in self.units.values()]
+    def show_apartments(self, min_floor: Optional[int] = None, max_floor: Optional[int] = None):
+        if min_floor is None and max_floor is None:
+            return [apt.to_dict() for apt in self.units.values()]
+        return [self.units[num].to_dict() for num in self.index.apartments_on(min_floor, max_floor)]
 
     def apartment_details(self, num: int):
         return self.units[num].to_dict() if num in self.units else None
 
+    @metrics.timed("Building.find_resident")
+    def find_resident(self, name: str):
+        return self.index.apartments_of(name)
+
+    @metrics.timed("Building.search_residents")
+    def search_residents(self, min_age: Optional[int] = None, max_age: Optional[int] = None,
+                         min_floor: Optional[int] = None, max_floor: Optional[int] = None):
+        residents = [{"num": num, **person.to_dict()}
+                     for num, person in self.index.search(min_age, max_age, min_floor, max_floor)]
+        if metrics.enabled:
+            metrics.count("scanned.search_residents", len(residents))
+        return residents
+
+
+class SqliteBuilding(Building):
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS apartments (num INTEGER PRIMARY KEY, lvl INTEGER, category TEXT);
+    CREATE TABLE IF NOT EXISTS residents (id INTEGER PRIMARY KEY, apartment INTEGER, full_name TEXT, years_old INTEGER);
+    CREATE INDEX IF NOT EXISTS residents_apartment ON residents (apartment);
+    CREATE INDEX IF NOT EXISTS residents_name ON residents (full_name);
+    CREATE INDEX IF NOT EXISTS residents_age ON residents (years_old);
+    CREATE INDEX IF NOT EXISTS apartments_lvl ON apartments (lvl);
+    """
+
+    def __init__(self, db_path: str = DB_FILE):
+        super().__init__()
+        self.db = sqlite_storage.connect(db_path, self.SCHEMA)
+
+    def _insert(self, apartment: Apartment):
+        self.db.execute("DELETE FROM residents WHERE apartment = ?", (apartment.num,))
+        self.db.execute("INSERT OR REPLACE INTO apartments (num, lvl, category) VALUES (?, ?, ?)",
+                        (apartment.num, apartment.lvl, apartment.category))
+        self.db.executemany("INSERT INTO residents (apartment, full_name, years_old) VALUES (?, ?, ?)",
+                            [(apartment.num, p.full_name, p.years_old) for p in apartment.occupants])
+
+    def register_apartment(self, apartment: Apartment):
+        with self.db:
+            self._insert(apartment)
+
+    def demolish_apartment(self, num: int):
+        with self.db:
+            self.db.execute("DELETE FROM residents WHERE apartment = ?", (num,))
+            self.db.execute("DELETE FROM apartments WHERE num = ?", (num,))
+
+    def export_data(self, file_path: str = "house_data.json"):
+        with open(file_path, "w", encoding="utf-8") as file:
+            json.dump({apt["num"]: apt for apt in self.show_apartments()}, file, indent=4, ensure_ascii=False)
+
+    def import_data(self, file_path: str = "house_data.json"):
+        if sqlite_storage.is_empty(self.db, ("apartments",)) and os.path.exists(file_path):
+            super().import_data(file_path)
+            with self.db:
+                for apartment in self.units.values():
+                    self._insert(apartment)
+            self.units = {}
+            self.index = ResidentIndex()
+
+    def save_data(self):
+        pass
+
+    def refresh(self):
+        pass
+
+    def has_apartment(self, num: int):
+        return self.db.execute("SELECT 1 FROM apartments WHERE num = ?", (num,)).fetchone() is not None
+
+    @metrics.timed("Building.settle_resident")
+    def settle_resident(self, num: int, person: Resident):
+        with self.db:
+            self.db.execute("INSERT INTO residents (apartment, full_name, years_old) VALUES (?, ?, ?)",
+                            (num, person.full_name, person.years_old))
+
+    @metrics.timed("Building.evict_resident")
+    def evict_resident(self, num: int, person_name: str):
+        with self.db:
+            self.db.execute("DELETE FROM residents WHERE apartment = ? AND full_name = ?", (num, person_name))
+
+    def show_residents(self):
+        return [dict(row) for row in self.db.execute("SELECT full_name, years_old FROM residents ORDER BY id")]
+
+    def _apartments(self, num=None, min_floor=None, max_floor=None):
+        conditions, params = [], []
+        for column, op, value in (("num", "=", num), ("lvl", ">=", min_floor), ("lvl", "<=", max_floor)):
+            if value is not None:
+                conditions.append(f"{column} {op} ?")
+                params.append(value)
+        where = " WHERE " + " AND ".join(conditions) if conditions else ""
+        apartment_sql = "SELECT num, lvl, category FROM apartments" + where
+        resident_sql = "SELECT apartment, full_name, years_old FROM residents"
+        if conditions:
+            resident_sql += f" WHERE apartment IN (SELECT num FROM apartments{where})"
+        apartments = {row["num"]: {**dict(row), "occupants": []}
+                      for row in self.db.execute(apartment_sql + " ORDER BY num", params)}
+        for row in self.db.execute(resident_sql + " ORDER BY id", params):
+            apartments[row["apartment"]]["occupants"].append({"full_name": row["full_name"], "years_old": row["years_old"]})
+        return list(apartments.values())
+
+    def show_apartments(self, min_floor: Optional[int] = None, max_floor: Optional[int] = None):
+        return self._apartments(min_floor=min_floor, max_floor=max_floor)
+
+    def apartment_details(self, num: int):
+        apartments = self._apartments(num)
+        return apartments[0] if apartments else None
+
+    @metrics.timed("Building.find_resident")
+    def find_resident(self, name: str):
+        return [row[0] for row in self.db.execute(
+            "SELECT DISTINCT apartment FROM residents WHERE full_name = ? ORDER BY apartment", (name,))]
+
+    @metrics.timed("Building.search_residents")
+    def search_residents(self, min_age: Optional[int] = None, max_age: Optional[int] = None,
+                         min_floor: Optional[int] = None, max_floor: Optional[int] = None):
+        conditions, params = [], []
+        for column, op, value in (("r.years_old", ">=", min_age), ("r.years_old", "<=", max_age),
+                                  ("a.lvl", ">=", min_floor), ("a.lvl", "<=", max_floor)):
+            if value is not None:
+                conditions.append(f"{column} {op} ?")
+                params.append(value)
+        where = " WHERE " + " AND ".join(conditions) if conditions else ""
+        return [dict(row) for row in self.db.execute(
+            "SELECT r.apartment AS num, r.full_name, r.years_old FROM residents r "
+            f"JOIN apartments a ON a.num = r.apartment{where} ORDER BY r.years_old", params)]
+
+
+def age_group(years_old: int):
+    start = years_old // 10 * 10
+    return f"{start}-{start + 9}"
+
+
+def building_stats(file_path: str):
+    house = Building(save_delay=0)
+    house.import_data(file_path)
+    stats = {"version": house.version, "apartments": len(house.units), "occupied": 0, "residents": 0,
+             "categories": {}, "ages": {}}
+    for apartment in house.units.values():
+        category = stats["categories"].setdefault(apartment.category, [0, 0])
+        category[0] += 1
+        if apartment.occupants:
+            stats["occupied"] += 1
+        else:
+            category[1] += 1
+        stats["residents"] += len(apartment.occupants)
+        for person in apartment.occupants:
+            group = age_group(person.years_old)
+            stats["ages"][group] = stats["ages"].get(group, 0) + 1
+    return stats
+
+
+class Portfolio:
+    def __init__(self, directory: str = PORTFOLIO_DIR):
+        self.directory = directory
+        self.buildings_dir = os.path.join(directory, "buildings")
+        self.summary_path = os.path.join(directory, "summary.json")
+        self.extension = EXTENSION
+        self.buildings: Dict[str, Building] = {}
+
+    def path(self, name: str):
+        if not name or name.startswith(".") or "/" in name or "\\" in name:
+            raise ValueError(f"недопустимое имя дома: {name!r}")
+        return os.path.join(self.buildings_dir, name + self.extension)
+
+    def names(self):
+        if not os.path.isdir(self.buildings_dir):
+            return []
+        return sorted(entry[:-len(self.extension)] for entry in os.listdir(self.buildings_dir)
+                      if entry.endswith(self.extension))
+
+    def add_building(self, name: str):
+        path = self.path(name)
+        if os.path.exists(path):
+            return False
+        os.makedirs(self.buildings_dir, exist_ok=True)
+        house = Building(save_delay=0)
+        house.import_data(path)
+        house.export_data(path)
+        self.buildings[name] = house
+        return True
+
+    def building(self, name: str):
+        house = self.buildings.get(name)
+        if house is None:
+            path = self.path(name)
+            if not os.path.exists(path):
+                raise ValueError(f"дом {name} не найден")
+            house = self.buildings[name] = Building(file_path=path)
+            house.import_data(path)
+        return house
+
+    def _load_summary(self):
+        try:
+            with open(self.summary_path, "r", encoding="utf-8") as file:
+                return json.load(file)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {}
+
+    def _save_summary(self, summary: dict):
+        tmp_path = self.summary_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as file:
+            json.dump(summary, file, ensure_ascii=False)
+        os.replace(tmp_path, self.summary_path)
+
+    @metrics.timed("Portfolio.collect")
+    def collect(self, workers: Optional[int] = None):
+        cached = self._load_summary()
+        summary, changed = {}, []
+        for name in self.names():
+            stats = cached.get(name)
+            if stats is not None and stats["version"] == SharedFile(self.path(name)).current_version():
+                summary[name] = stats
+            else:
+                changed.append(name)
+        paths = [self.path(name) for name in changed]
+        if len(paths) > 1 and workers != 1:
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                results = list(pool.map(building_stats, paths, chunksize=max(1, len(paths) // 32)))
+        else:
+            results = [building_stats(path) for path in paths]
+        summary.update(zip(changed, results))
+        if changed or len(summary) != len(cached):
+            self._save_summary(summary)
+        if metrics.enabled:
+            metrics.count("portfolio.recomputed", len(changed))
+        return summary, changed
+
+    def report(self, workers: Optional[int] = None):
+        summary, changed = self.collect(workers)
+        apartments = sum(stats["apartments"] for stats in summary.values())
+        occupied = sum(stats["occupied"] for stats in summary.values())
+        categories, ages = {}, Counter()
+        for stats in summary.values():
+            for category, (total, vacant) in stats["categories"].items():
+                row = categories.setdefault(category, {"apartments": 0, "vacant": 0})
+                row["apartments"] += total
+                row["vacant"] += vacant
+            ages.update(stats["ages"])
+        for row in categories.values():
+            row["vacancy"] = row["vacant"] / row["apartments"] * 100
+        return {
+            "buildings": len(summary),
+            "recomputed": len(changed),
+            "apartments": apartments,
+            "occupied": occupied,
+            "occupancy": occupied / apartments * 100 if apartments else 0,
+            "residents": sum(stats["residents"] for stats in summary.values()),
+            "vacancy_by_category": dict(sorted(categories.items())),
+            "age_distribution": dict(sorted(ages.items(), key=lambda item: int(item[0].split("-")[0]))),
+        }
+
+
+def read_optional_int(prompt: str):
+    while True:
+        value = input(prompt).strip()
+        if not value:
+            return None
+        try:
+            return int(value)
+        except ValueError:
+            print("Ошибка: введите целое число или оставьте поле пустым.")
+
+
+def add_apartment(house: Building, num: int, lvl: int, category: str):
+    house.register_apartment(Apartment(num, lvl, category))
+    print(f"Квартира №{num} добавлена.")
+
+
+def remove_apartment(house: Building, num: int):
+    if house.has_apartment(num):
+        house.demolish_apartment(num)
+        print(f"квартира №{num} удалена.")
+    else:
+        print(f"ввартира №{num} не найдена.")
+
+
+def settle(house: Building, num: int, name: str, age: int):
+    if not house.has_apartment(num):
+        print(f"Ошибка: Квартира №{num} не существует. Добавьте её сначала")
+        return
+    house.settle_resident(num, Resident(name, age))
+    print(f"Жилец {name}, {age} лет добавлен в квартиру №{num}.")
+
+
+def evict(house: Building, num: int, name: str):
+    if not house.has_apartment(num):
+        print(f"Ошибка: Квартира №{num} не найдена:(")
+        return
+    house.evict_resident(num, name)
+    print(f"Жилец {name} выселен из квартиры №{num}.")
+
+
+def print_apartments(house: Building, min_floor=None, max_floor=None):
+    print("\nСписок квартир:")
+    for apt in house.show_apartments(min_floor, max_floor):
+        print(f"Квартира №{apt['num']} (этаж {apt['lvl']}, тип: {apt['category']})")
+        if apt["occupants"]:
+            print("  Жильцы:")
+            for occupant in apt["occupants"]:
+                print(f"    - {occupant['full_name']}, возраст {occupant['years_old']}")
+
+
+def print_residents(house: Building):
+    print("\nСписок жильцов:")
+    for resident in house.show_residents():
+        print(f"{resident['full_name']}, возраст {resident['years_old']} ")
+
+
+def print_resident_apartments(house: Building, name: str):
+    apartments = house.find_resident(name)
+    if apartments:
+        print(f"Жилец {name} проживает в квартирах: " + ", ".join(f"№{num}" for num in apartments))
+    else:
+        print(f"Жилец {name} не найден.")
+
+
+def print_search(house: Building, min_age=None, max_age=None, min_floor=None, max_floor=None):
+    residents = house.search_residents(min_age, max_age, min_floor, max_floor)
+    print(f"\nНайдено жильцов: {len(residents)}")
+    for resident in residents:
+        print(f"{resident['full_name']}, возраст {resident['years_old']}, квартира №{resident['num']}")
+
+
+def print_portfolio_report(workers: Optional[int] = None, as_json: bool = False):
+    report = Portfolio().report(workers)
+    if as_json:
+        print(json.dumps(report, ensure_ascii=False, indent=4))
+        return
+    print(f"Домов: {report['buildings']} (пересчитано: {report['recomputed']})")
+    print(f"Квартир: {report['apartments']}, заселено: {report['occupied']} ({report['occupancy']:.1f}%), "
+          f"жильцов: {report['residents']}")
+    print("Свободные квартиры по типам:")
+    for category, row in report["vacancy_by_category"].items():
+        print(f"  {category}: {row['vacant']} из {row['apartments']} ({row['vacancy']:.1f}%)")
+    print("Возраст жильцов:")
+    for group, count in report["age_distribution"].items():
+        print(f"  {group}: {count}")
+
+
+def add_portfolio_building(name: str):
+    if Portfolio().add_building(name):
+        print(f"Дом {name} добавлен в портфель.")
+    else:
+        print(f"Дом {name} уже есть в портфеле.")
+
+
+def non_negative(value: str):
+    number = int(value)
+    if number < 0:
+        raise argparse.ArgumentTypeError("значение не может быть отрицательным")
+    return number
+
+
+def build_parser():
+    parser, commands = cli.build_parser("student_work.py", "Дом: команды без интерактивного меню")
+    parser.add_argument("--building", help="дом из портфеля вместо house_data")
+    parser.set_defaults(standalone=False)
+    command = commands.add_parser("add-apartment", help="добавить квартиру")
+    command.add_argument("num", type=non_negative)
+    command.add_argument("lvl", type=non_negative)
+    command.add_argument("category")
+    command.set_defaults(run=lambda house, args: add_apartment(house, args.num, args.lvl, args.category))
+    command = commands.add_parser("remove-apartment", help="удалить квартиру")
+    command.add_argument("num", type=int)
+    command.set_defaults(run=lambda house, args: remove_apartment(house, args.num))
+    command = commands.add_parser("settle", help="добавить жильца")
+    command.add_argument("num", type=int)
+    command.add_argument("name")
+    command.add_argument("age", type=non_negative)
+    command.set_defaults(run=lambda house, args: settle(house, args.num, args.name, args.age))
+    command = commands.add_parser("evict", help="выселить жильца")
+    command.add_argument("num", type=int)
+    command.add_argument("name")
+    command.set_defaults(run=lambda house, args: evict(house, args.num, args.name))
+    command = commands.add_parser("apartments", help="показать квартиры")
+    command.add_argument("--min-floor", type=int)
+    command.add_argument("--max-floor", type=int)
+    command.set_defaults(run=lambda house, args: print_apartments(house, args.min_floor, args.max_floor))
+    command = commands.add_parser("residents", help="показать жильцов")
+    command.set_defaults(run=lambda house, args: print_residents(house))
+    command = commands.add_parser("find", help="найти квартиры жильца")
+    command.add_argument("name")
+    command.set_defaults(run=lambda house, args: print_resident_apartments(house, args.name))
+    command = commands.add_parser("search", help="поиск жильцов по возрасту и этажам")
+    command.add_argument("--min-age", type=int)
+    command.add_argument("--max-age", type=int)
+    command.add_argument("--min-floor", type=int)
+    command.add_argument("--max-floor", type=int)
+    command.set_defaults(run=lambda house, args: print_search(house, args.min_age, args.max_age,
+                                                              args.min_floor, args.max_floor))
+    command = commands.add_parser("portfolio-add", help="добавить дом в портфель")
+    command.add_argument("name")
+    command.set_defaults(run=lambda house, args: add_portfolio_building(args.name), standalone=True)
+    command = commands.add_parser("portfolio-list", help="дома портфеля")
+    command.set_defaults(run=lambda house, args: print("\n".join(Portfolio().names())), standalone=True)
+    command = commands.add_parser("portfolio-report", help="заселённость, свободные квартиры и возраст по портфелю")
+    command.add_argument("--workers", type=int, help="число процессов (1 - без пула)")
+    command.add_argument("--json", action="store_true", help="вывести отчёт в JSON")
+    command.set_defaults(run=lambda house, args: print_portfolio_report(args.workers, args.json), standalone=True)
+    cli.add_common_commands(commands, lambda house, args: print(metrics.report()),
+                            lambda house, args: run_script(house, args.path), standalone=True)
+    return parser
+
+
+def run_script(house: Building, path: str):
+    def run(args):
+        if args.building is not None:
+            raise ValueError("--building указывается только в командной строке")
+        args.run(house, args)
+
+    cli.run_script(build_parser(), path, run)
+
+
+def open_building():
+    house = SqliteBuilding() if STORAGE == "sqlite" else Building(file_path=HOUSE_FILE)
+    house.import_data(HOUSE_FILE)
+    return house
+
+
+def run_command(argv: List[str]):
+    args = build_parser().parse_args(argv)
+    metrics.start()
+    try:
+        if args.standalone:
+            args.run(None, args)
+            return
+        house = Portfolio().building(args.building) if args.building else open_building()
+        with house.batch():
+            args.run(house, args)
+    except (ValueError, OSError) as error:
+        print(f"Ошибка: {error}", file=sys.stderr)
+        raise SystemExit(1)
+
 
 def main():
-    house = Building()
-    house.import_data()
+    metrics.start()
+    house = open_building()
 
     while True:
         print("\nМеню:")
@@ -93,8 +777,13 @@ def main():
         print("5. Показать квартиры")
         print("6. Показать жильцов")
         print("7. Выйти")
+        print("8. Найти квартиры жильца")
+        print("9. Поиск жильцов по возрасту и этажам")
+        if metrics.enabled:
+            print("10. Статистика")
 
         choice = input("Выберите действие: ")
+        house.refresh()
 
         if choice == "1":
             while True:
@@ -118,18 +807,12 @@ def main():
                     print("Ошибка: Введите корректный этаж (целое число).")
 
             category = input("Тип квартиры: ")
-            house.register_apartment(Apartment(num, lvl, category))
-            print(f"Квартира №{num} добавлена.")
+            add_apartment(house, num, lvl, category)
         elif choice == "2":
-            num = int(input("номер квартиры для удаления: "))
-            if num in house.units:
-                house.demolish_apartment(num)
-                print(f"квартира №{num} удалена.")
-            else:
-                print(f"ввартира №{num} не найдена.")
+            remove_apartment(house, int(input("номер квартиры для удаления: ")))
         elif choice == "3":
             num = int(input("Номер квртиры: "))
-            if num not in house.units:
+            if not house.has_apartment(num):
                 print(f"Ошибка: Квартира №{num} не существует. Добавьте её сначала")
                 continue
             name = input("Имя жильца: ")
@@ -142,35 +825,33 @@ def main():
                         break
                 except ValueError:
                     print("Ошибка: введите корректный возраст (число).")
-            house.units[num].settle_resident(Resident(name, age))
-            house.save_data()
-            print(f"Жилец {name}, {age} лет добавлен в квартиру №{num}.")
+            settle(house, num, name, age)
         elif choice == "4":
             num = int(input("Номер квартиры: "))
-            if num not in house.units:
+            if not house.has_apartment(num):
                 print(f"Ошибка: Квартира №{num} не найдена:(")
                 continue
-            name = input("нейм жильца для выселения: ")
-            house.units[num].evict_resident(name)
-            house.save_data()
-            print(f"Жилец {name} выселен из квартиры №{num}.")
+            evict(house, num, input("нейм жильца для выселения: "))
         elif choice == "5":
-            print("\nСписок квартир:")
-            for apt in house.show_apartments():
-                print(f"Квартира №{apt['num']} (этаж {apt['lvl']}, тип: {apt['category']})")
-                if apt["occupants"]:
-                    print("  Жильцы:")
-                    for occupant in apt["occupants"]:
-                        print(f"    - {occupant['full_name']}, возраст {occupant['years_old']}")
+            print_apartments(house)
         elif choice == "6":
-            print("\nСписок жильцов:")
-            for resident in house.show_residents():
-                print(f"{resident['full_name']}, возраст {resident['years_old']} ")
+            print_residents(house)
         elif choice == "7":
+            house.flush()
             break
+        elif choice == "8":
+            print_resident_apartments(house, input("Имя жильца: "))
+        elif choice == "9":
+            min_age = read_optional_int("Возраст от (пусто - без ограничения): ")
+            max_age = read_optional_int("Возраст до (пусто - без ограничения): ")
+            min_floor = read_optional_int("Этаж от (пусто - без ограничения): ")
+            max_floor = read_optional_int("Этаж до (пусто - без ограничения): ")
+            print_search(house, min_age, max_age, min_floor, max_floor)
+        elif choice == "10" and metrics.enabled:
+            print(metrics.report())
         else:
             print("неверный ввод попробуйте снова")
 
 
 if __name__ == "__main__":
-    main()
+    cli.dispatch(run_command, main)
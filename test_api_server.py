@@ -0,0 +1,107 @@
+import asyncio
+import datetime
+import importlib
+import json
+
+import pytest
+
+import api_server
+import main
+
+TODAY = datetime.date.today().isoformat()
+CAR = {"manufacturer": "M", "year": "2020", "model": "X", "cost_price": 100, "sale_price": "150"}
+
+
+@pytest.fixture
+def repo(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.delenv("STORAGE", raising=False)
+    return importlib.reload(main).init_repository()
+
+
+def sale(employee, price, date=TODAY):
+    return {"employee": employee, "car": "X", "date": date, "real_price": price}
+
+
+async def with_writer(repo, work):
+    writer = api_server.BatchWriter(repo)
+    task = asyncio.create_task(writer.run())
+    try:
+        return await work(writer)
+    finally:
+        task.cancel()
+
+
+def call(repo, requests):
+    async def work(writer):
+        responses = []
+        for method, path, query, body in requests:
+            try:
+                responses.append(await api_server.route(repo, writer, method, path, query, body))
+            except api_server.HttpError as error:
+                responses.append((error.status, str(error)))
+        return responses
+
+    return asyncio.run(with_writer(repo, work))
+
+
+def test_routes(repo):
+    period = {"from": TODAY, "to": TODAY}
+    responses = call(repo, [
+        ("POST", "/cars", {}, json.dumps(CAR).encode()),
+        ("POST", "/sales", {}, json.dumps(sale("ann", "120.5")).encode()),
+        ("POST", "/sales", {}, json.dumps(sale("bob", 90, "17.10.2026")).encode()),
+        ("POST", "/sales", {}, b"{not json"),
+        ("POST", "/sales", {}, json.dumps({"employee": "bob"}).encode()),
+        ("GET", "/sales", {"employee": "ann"}, b""),
+        ("GET", "/reports/profit", period, b""),
+        ("GET", "/reports/best-seller", period, b""),
+        ("GET", "/reports/profit", {}, b""),
+        ("DELETE", "/sales", {"employee": "bob", "car": "X", "date": TODAY}, b""),
+        ("DELETE", "/sales", {"employee": "ann", "car": "X", "date": TODAY}, b""),
+        ("GET", "/sales", period, b""),
+        ("GET", "/nosuch", {}, b""),
+        ("PUT", "/sales", {}, b""),
+        ("GET", "/reports/nosuch", period, b""),
+    ])
+    assert [status for status, _ in responses] == [201, 201, 400, 400, 400, 200, 200, 200, 400, 404, 200, 200, 404, 405, 404]
+    assert responses[0][1]["cost_price"] == 100.0 and responses[0][1]["sale_price"] == 150.0
+    assert responses[1][1] == sale("ann", 120.5)
+    assert responses[5][1] == [sale("ann", 120.5)]
+    assert responses[6][1] == {"revenue": 120.5, "total_profit": 20.5, "unmatched": 0}
+    assert responses[7][1] == {"name": "ann", "count": 1}
+    assert responses[11][1] == []
+
+
+def test_batched_writes_isolate_bad_records(repo):
+    async def work(writer):
+        records = [sale(f"e{i}", float(i)) for i in range(50)]
+        records[10]["date"] = "2026-13-01"
+        return await asyncio.gather(*(writer.submit("add", "sales", record) for record in records),
+                                    return_exceptions=True)
+
+    results = asyncio.run(with_writer(repo, work))
+    assert isinstance(results[10], ValueError)
+    assert [result["employee"] for i, result in enumerate(results) if i != 10] == \
+        [f"e{i}" for i in range(50) if i != 10]
+    assert len(importlib.reload(main).init_repository().all("sales")) == 49
+
+
+def test_http_keep_alive(repo):
+    async def work(writer):
+        server = await asyncio.start_server(lambda reader, stream: api_server.handle(repo, writer, reader, stream),
+                                            "127.0.0.1", 0)
+        async with server:
+            reader, stream = await asyncio.open_connection(*server.sockets[0].getsockname()[:2])
+            body = json.dumps(sale("Анна", 10)).encode()
+            stream.write(b"POST /sales HTTP/1.1\r\nContent-Length: %d\r\n\r\n%s" % (len(body), body))
+            stream.write(b"GET /sales?employee=%D0%90%D0%BD%D0%BD%D0%B0 HTTP/1.1\r\nConnection: close\r\n\r\n")
+            await stream.drain()
+            data = await reader.read()
+            stream.close()
+            return data
+
+    data = asyncio.run(with_writer(repo, work)).decode("utf-8")
+    assert data.startswith("HTTP/1.1 201 Created\r\n")
+    assert "HTTP/1.1 200 OK\r\n" in data and "Connection: close" in data
+    assert data.endswith(json.dumps([sale("Анна", 10.0)], ensure_ascii=False))
@@ -0,0 +1,76 @@
+import os
+
+from archive import SalesArchive
+
+
+def sale(employee, date, price):
+    return {"employee": employee, "car": "X", "date": date, "real_price": price}
+
+
+def open_archive(path):
+    return SalesArchive(str(path), ("employee", "car"), ("real_price",))
+
+
+def segments(path):
+    return sorted(name for name in os.listdir(path) if name.startswith("segment-"))
+
+
+def test_seal_summarises_months(tmp_path):
+    archive = open_archive(tmp_path)
+    archive.seal([sale("ann", "2024-01-05", 10.0), sale("bob", "2024-01-20", 5.0), sale("ann", "2024-02-01", 1.0)],
+                 "2024-03")
+    archive.commit()
+    archive = open_archive(tmp_path)
+    assert archive.pending is None
+    assert archive.count() == 3
+    assert archive.total("real_price") == 16.0
+    assert archive.group("employee")["ann"] == {"count": 2, "real_price": 11.0}
+    assert archive.between("2024-01-10", "2024-02-28") == [sale("bob", "2024-01-20", 5.0), sale("ann", "2024-02-01", 1.0)]
+
+
+def test_replaced_segments_are_pruned(tmp_path):
+    archive = open_archive(tmp_path)
+    archive.seal([sale("ann", "2024-01-05", 10.0), sale("bob", "2024-01-20", 5.0)], "2024-02")
+    archive.commit()
+    first = segments(tmp_path)
+    assert archive.remove({"employee": "bob", "car": "X", "date": "2024-01-20"}) == sale("bob", "2024-01-20", 5.0)
+    assert archive.garbage == first
+    assert set(first) < set(segments(tmp_path))
+    archive.seal([sale("cid", "2024-01-07", 2.0)], "2024-02")
+    archive.commit()
+    assert len(segments(tmp_path)) == 2
+    assert not set(first) & set(segments(tmp_path))
+    assert open_archive(tmp_path).group("employee") == {"ann": {"count": 1, "real_price": 10.0},
+                                                        "cid": {"count": 1, "real_price": 2.0}}
+
+
+def test_removing_last_record_drops_month(tmp_path):
+    archive = open_archive(tmp_path)
+    archive.seal([sale("ann", "2024-01-05", 10.0)], "2024-02")
+    archive.commit()
+    archive.remove({"employee": "ann", "car": "X", "date": "2024-01-05"})
+    assert archive.months == {}
+    assert archive.remove({"employee": "ann", "car": "X", "date": "2024-01-05"}) is None
+
+
+def test_uncommitted_seal_stays_pending(tmp_path):
+    archive = open_archive(tmp_path)
+    archive.seal([sale("ann", "2024-01-05", 10.0)], "2024-02")
+    reopened = open_archive(tmp_path)
+    assert reopened.pending == "2024-02"
+    assert reopened.count() == 1
+    reopened.commit()
+    assert open_archive(tmp_path).pending is None
+
+
+def test_partition_decodes_only_boundary_months(tmp_path):
+    archive = open_archive(tmp_path)
+    archive.seal([sale("ann", f"2024-0{month}-{day:02d}", 1.0) for month in (1, 2, 3) for day in (1, 15, 28)],
+                 "2024-04")
+    archive.commit()
+    summaries, records = archive.partition("car", "2024-01-10", "2024-03-31")
+    assert [scope["date"] for scope, _ in summaries] == ["2024-02", "2024-03"]
+    assert summaries[0][1] == {"X": {"count": 3, "real_price": 3.0}}
+    assert [r["date"] for r in records] == ["2024-01-15", "2024-01-28"]
+    summaries, records = archive.partition(None, "2024-01-01", "2024-01-31")
+    assert summaries == [] and len(records) == 3
@@ -0,0 +1,178 @@
+import datetime
+import importlib.util
+import json
+import os
+
+import pytest
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+@pytest.fixture
+def bookshop(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.delenv("STORAGE", raising=False)
+    spec = importlib.util.spec_from_file_location("bookshop", os.path.join(HERE, "bookshop24 (1).py"))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def stock(manager):
+    with manager.batch():
+        manager.add_employee("анна иванова", "продавец", "", "")
+        manager.add_book("война и мир", "1869", "толстой", "роман", 300.0, 500.0)
+        manager.add_book("dune", "1965", "herbert", "фантастика", 8.0, 12.0)
+
+
+def write_store(employees, books, sales):
+    with open("store.json", "w", encoding="utf-8") as file:
+        json.dump({"employees": employees, "books": books, "sales": sales}, file)
+
+
+def old_sales():
+    return [{"employee": "Анна Иванова" if day % 3 else "Борис", "book": ("Война И Мир", "Dune", "Нет")[day % 3],
+             "date": f"2024-0{month}-{day:02d}", "sale_price": 10.0 * day, "profit": float(day)}
+            for month in (3, 4) for day in range(1, 29)]
+
+
+def write_old_store():
+    write_store([{"name": "Анна Иванова", "position": "Продавец", "phone": "", "email": ""}],
+                [{"title": "Война И Мир", "year": "1869", "author": "Толстой", "genre": "Роман", "cost": 5.0,
+                  "price": 300.0},
+                 {"title": "Dune", "year": "1965", "author": "Herbert", "genre": "Фантастика", "cost": 8.0,
+                  "price": 250.0}],
+                old_sales())
+
+
+def test_sqlite_manager_matches_json(bookshop):
+    write_old_store()
+    manager = bookshop.open_manager()
+    for i in range(4):
+        manager.record_sale("анна иванова", ("dune", "война и мир")[i % 2], 100.0 + i)
+
+    def reports(manager):
+        return (manager.calculate_profit(), manager.sales_count(), manager.get_sales(), manager.get_sales(55, 3),
+                manager.day_profit("2024-03-10"), manager.employee_profit("Борис"), manager.complete_title("вой"),
+                manager.sales_summary("book"), {by: manager.margin(by) for by in (None, "book", "author", "month")},
+                manager.margin("employee", "2024-03-15", "2024-04-02"))
+
+    expected = reports(manager)
+    database = bookshop.SqliteStoreManager()
+    assert reports(database) == expected
+    database.record_sale("АННА ИВАНОВА", "DUNE", 5.0)
+    with pytest.raises(ValueError):
+        database.record_sale("Анна Иванова", "Нет", 5.0)
+    reopened = bookshop.SqliteStoreManager()
+    assert reopened.sales_count() == expected[1] + 1
+    assert reopened.get_sales(expected[1])[0]["profit"] == -3.0
+
+
+def test_title_index(bookshop):
+    index = bookshop.TitleIndex(["Dune", "Dune Messiah", "Emma", "Anna Karenina", "Dune"])
+    index.add("Война И Мир")
+    index.add("Emma")
+    assert index.keys == sorted(index.keys) and len(index.keys) == 5
+    assert index.complete("du") == ["Dune", "Dune Messiah"]
+    assert index.complete("DUNE M") == ["Dune Messiah"]
+    assert index.complete("", 2) == ["Anna Karenina", "Dune"]
+    assert index.search("UNE") == ["Dune", "Dune Messiah"]
+    assert index.search("renin") == ["Anna Karenina"]
+    assert index.search("мир") == ["Война И Мир"]
+    assert index.search("em") == ["Emma"]
+    assert index.search("xyz") == []
+
+
+def test_record_sale_ignores_case(bookshop):
+    manager = bookshop.open_manager()
+    stock(manager)
+    sale = manager.record_sale("АННА ИВАНОВА", "ВОЙНА И МИР", 450.0)
+    assert (sale["employee"], sale["book"], sale["profit"]) == ("Анна Иванова", "Война И Мир", 150.0)
+    with pytest.raises(ValueError):
+        manager.record_sale("Борис", "Война и мир", 1.0)
+    assert manager.complete_title("вой") == ["Война И Мир"]
+    manager.add_book("войлок", "2000", "автор", "справочник", 1.0, 2.0)
+    assert manager.complete_title("ВОЙ") == ["Войлок", "Война И Мир"]
+    assert manager.complete_title("мир") == ["Война И Мир"]
+
+
+def test_running_profit_totals(bookshop):
+    manager = bookshop.open_manager()
+    stock(manager)
+    for price in (450.0, 500.0, 320.0):
+        manager.record_sale("анна иванова", "война и мир", price)
+    today = datetime.date.today().isoformat()
+    totals = (manager.calculate_profit(), manager.day_profit(today), manager.employee_profit("Анна Иванова"))
+    assert totals == (370.0, 370.0, 370.0)
+    reloaded = bookshop.open_manager()
+    assert (reloaded.calculate_profit(), reloaded.day_profit(today), reloaded.employee_profit("Анна Иванова")) == totals
+    assert reloaded.day_profit("2024-01-01") == 0
+
+
+def test_totals_and_paging_span_the_archive(bookshop):
+    write_old_store()
+    manager = bookshop.open_manager()
+    assert manager.archive.count() == 56 and manager.data["sales"] == []
+    recorded = [manager.record_sale("анна иванова", "dune", 20.0 + i) for i in range(3)]
+    everything = old_sales() + recorded
+    assert manager.sales_count() == 59
+    assert manager.get_sales() == everything
+    assert manager.get_sales(50, 5) == everything[50:55]
+    assert manager.get_sales(57) == everything[57:]
+    assert manager.calculate_profit() == sum(sale["profit"] for sale in everything)
+    assert manager.day_profit("2024-03-10") == 10.0
+    assert manager.employee_profit("Борис") == sum(sale["profit"] for sale in everything if sale["employee"] == "Борис")
+
+
+def test_background_storage_retries_failed_writes(bookshop):
+    storage = bookshop.BackgroundStorage("store.json")
+    manager = bookshop.StoreManager(storage)
+    stock(manager)
+    manager.flush()
+    assert manager.poll_storage() == ("saved", None)
+
+    def fail(data):
+        raise OSError("диск заполнен")
+
+    storage._write = fail
+    manager.record_sale("анна иванова", "dune", 12.0)
+    with pytest.raises(OSError):
+        manager.flush()
+    assert manager.poll_storage() == ("error", "диск заполнен")
+    assert len(storage.unwritten) == 1
+    del storage._write
+    manager.flush()
+    assert storage.unwritten == []
+    with open("store.json", encoding="utf-8") as file:
+        assert [sale["sale_price"] for sale in json.load(file)["sales"]] == [12.0]
+
+
+def test_background_storage_picks_up_other_writers(bookshop):
+    manager = bookshop.StoreManager(bookshop.BackgroundStorage("store.json"))
+    stock(manager)
+    manager.flush()
+    other = bookshop.StoreManager(bookshop.DataStorage("store.json"))
+    other.record_sale("анна иванова", "dune", 20.0)
+    manager.storage._check_changes()
+    manager.poll_storage()
+    assert manager.refresh()
+    assert [sale["sale_price"] for sale in manager.get_sales()] == [20.0]
+    assert manager.calculate_profit() == 12.0
+
+
+def test_margin_uses_archive_summaries(bookshop):
+    write_old_store()
+    manager = bookshop.open_manager()
+    archived = manager.archive.all()
+    decoded = []
+    records = manager.archive.records
+    manager.archive.records = lambda month: decoded.append(month) or records(month)
+    for by in (None, "book", "author", "genre", "month"):
+        result = manager.margin(by, "2024-03-01", "2024-04-30")
+        assert decoded == []
+        expected = bookshop.MARGIN.group(archived, manager._book, by)
+        assert result.keys() == expected.keys()
+        for name, row in expected.items():
+            assert result[name] == pytest.approx(row)
+    assert manager.margin(None, "2024-03-10", "2024-04-30")[None]["count"] == 19 + 28
+    assert decoded == ["2024-03"]
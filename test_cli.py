@@ -0,0 +1,47 @@
+import io
+import sys
+
+import pytest
+
+import cli
+
+
+def make_parser(runs):
+    parser, commands = cli.build_parser("test", "тест")
+    command = commands.add_parser("add")
+    command.add_argument("value", type=int)
+    command.set_defaults(run=lambda args: runs.append(args.value))
+    command = commands.add_parser("fail")
+    command.set_defaults(run=lambda args: int("x"))
+    cli.add_common_commands(commands, lambda args: runs.append("stats"), lambda args: None)
+    return parser
+
+
+def test_run_script_reports_failed_lines(tmp_path, capsys):
+    runs = []
+    path = tmp_path / "script.txt"
+    path.write_text("add 1\n# комментарий\n\nadd x\nfail\nadd 'unterminated\nscript other.txt\nstats\nadd 2  # два\n",
+                    encoding="utf-8")
+    with pytest.raises(SystemExit) as error:
+        cli.run_script(make_parser(runs), str(path), lambda args: args.run(args))
+    assert error.value.code == 1
+    assert runs == [1, "stats", 2]
+    assert [line.split(":")[0] for line in capsys.readouterr().err.splitlines() if line.startswith("Строка")] == \
+        ["Строка 4", "Строка 5", "Строка 6", "Строка 7"]
+
+
+def test_run_script_reads_stdin(monkeypatch):
+    runs = []
+    monkeypatch.setattr(sys, "stdin", io.StringIO("add 3\nadd 4\n"))
+    cli.run_script(make_parser(runs), "-", lambda args: args.run(args))
+    assert runs == [3, 4]
+
+
+def test_margin_rows_order():
+    class Source:
+        def margin(self, by, start_date, end_date):
+            return {"2024-02": {"margin": 1, "revenue": 9}, "2024-01": {"margin": 5, "revenue": 2}}
+
+    assert [name for name, _ in cli.margin_rows(Source(), "month")] == ["2024-01", "2024-02"]
+    assert [name for name, _ in cli.margin_rows(Source(), "car")] == ["2024-01", "2024-02"]
+    assert [name for name, _ in cli.margin_rows(Source(), "car", order="revenue")] == ["2024-02", "2024-01"]
@@ -0,0 +1,39 @@
+import random
+
+import pytest
+
+import columnar
+
+
+def make_sales(count, seed):
+    rng = random.Random(seed)
+    return [{"employee": f"e{rng.randint(1, 5)}", "car": f"c{rng.randint(1, 3)}",
+             "date": f"2024-0{rng.randint(1, 9)}-{rng.randint(1, 28):02d}", "real_price": float(rng.randint(1, 100))}
+            for _ in range(count)]
+
+
+def test_summarize_filters_by_date():
+    sales = make_sales(100, 1)
+    summary = columnar.summarize(sales, "employee", ("real_price",), "2024-03-01", "2024-05-31")
+    inside = [s for s in sales if "2024-03-01" <= s["date"] <= "2024-05-31"]
+    assert sum(row["count"] for row in summary.values()) == len(inside)
+    assert sum(row["real_price"] for row in summary.values()) == sum(s["real_price"] for s in inside)
+
+
+def test_columns_match_summarize_after_edits():
+    pytest.importorskip("numpy")
+    sales = make_sales(300, 2)
+    columns = columnar.SalesColumns(sales[:10], ("employee", "car"), ("real_price",))
+    for sale in sales[10:]:
+        columns.append(sale)
+    live = list(sales)
+    for i in (3, 0, 150, 296, 42):
+        last = live.pop()
+        if i < len(live):
+            live[i] = last
+        columns.swap_remove(i)
+    assert columns.size == len(live) == 295
+    for field in ("employee", "car"):
+        assert columns.group(field) == columnar.summarize(live, field, ("real_price",))
+        for start, end in (("2024-01-01", "2024-09-30"), ("2024-03-15", "2024-06-02"), ("2024-04-04", "2024-04-04")):
+            assert columns.group(field, start, end) == columnar.summarize(live, field, ("real_price",), start, end)
@@ -0,0 +1,28 @@
+import json
+import os
+
+import pytest
+
+import formats
+import packed
+import snapshot
+
+
+DATA = {"employees": [{"name": "Иван", "phone": ""}], "sales": [{"employee": "Иван", "price": 1.5}], "seq": 2}
+
+
+@pytest.mark.parametrize("name", ["data.json", "data" + packed.EXTENSION, "data" + snapshot.EXTENSION])
+def test_write_and_read_back(tmp_path, name):
+    path = str(tmp_path / name)
+    size = formats.write(path, lambda: DATA, lambda: json.dumps(DATA, indent=4))
+    assert size == os.path.getsize(path)
+    assert not os.path.exists(path + ".tmp")
+    assert snapshot.to_plain(formats.read(path)) == DATA
+
+
+def test_binary_formats_fall_back_to_json(tmp_path):
+    with open(tmp_path / "data.json", "w", encoding="utf-8") as file:
+        json.dump(DATA, file)
+    assert formats.read(str(tmp_path / ("data" + packed.EXTENSION))) == DATA
+    with pytest.raises(FileNotFoundError):
+        formats.read(str(tmp_path / "other.json"))
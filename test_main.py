@@ -0,0 +1,321 @@
+import csv
+import datetime
+import importlib
+import json
+import os
+import random
+import subprocess
+import sys
+
+import pytest
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+TODAY = datetime.date.today().isoformat()
+
+
+@pytest.fixture
+def main(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.delenv("STORAGE", raising=False)
+    import main
+    return restart(main)
+
+
+def sale(employee, price, date=TODAY, car="X"):
+    return {"employee": employee, "car": car, "date": date, "real_price": price}
+
+
+def restart(main):
+    main = importlib.reload(main)
+    main.init_repository()
+    return main
+
+
+def test_journal_replay_after_restart(main):
+    for i in range(5):
+        main.insert("sales", sale(f"e{i}", 100.0 + i))
+    main.remove("sales", employee="e2", car="X", date=TODAY)
+    assert main.journal_size == 6 and not os.path.exists(main.DATA_FILE)
+    main = restart(main)
+    assert sorted(s["employee"] for s in main.repo.all("sales")) == ["e0", "e1", "e3", "e4"]
+    assert sum(s["real_price"] for s in main.repo.all("sales")) == 100.0 + 101.0 + 103.0 + 104.0
+
+
+def test_journal_replay_ignores_torn_tail(main):
+    main.insert("sales", sale("ann", 10.0))
+    with open(main.JOURNAL_FILE, "a") as file:
+        file.write('{"seq": 99, "op": "add", "table": "sales", "rec')
+    main = restart(main)
+    assert [s["employee"] for s in main.repo.all("sales")] == ["ann"]
+
+
+def test_refresh_replays_other_process(main):
+    main.insert("sales", sale("ann", 10.0))
+    subprocess.run([sys.executable, "-c", f"import main; main.init_repository(); main.insert('sales', {sale('bob', 20.0)!r})"],
+                   check=True, env={**os.environ, "PYTHONPATH": HERE}, capture_output=True)
+    main.repo.refresh()
+    assert sorted(s["employee"] for s in main.repo.all("sales")) == ["ann", "bob"]
+    assert sum(s["real_price"] for s in main.repo.all("sales")) == 30.0
+
+
+def test_compaction_relative_to_data_size(main, monkeypatch):
+    monkeypatch.setattr(main, "COMPACT_MIN", 4)
+    monkeypatch.setattr(main, "COMPACT_RATIO", 0.25)
+    main.repo.bulk_insert("sales", [[sale(f"e{i}", 1.0) for i in range(20)]])
+    for i in range(6):
+        main.insert("sales", sale("ann", 1.0))
+    assert main.journal_size == 6
+    main.insert("sales", sale("ann", 1.0))
+    assert main.journal_size == 0
+    with open(main.DATA_FILE) as file:
+        assert len(json.load(file)["sales"]) == 27
+
+
+def test_sales_index_between(main):
+    random.seed(1)
+    sales = [sale(f"e{i}", 1.0, f"2026-01-{random.randint(1, 28):02d}") for i in range(300)]
+    index = main.SalesIndex(sales[:200])
+    for record in sales[200:]:
+        index.add(record)
+    for record in sales[:50]:
+        index.remove(record)
+    live = sales[50:]
+    for start, end in (("2026-01-01", "2026-01-31"), ("2026-01-05", "2026-01-09"), ("2026-01-10", "2026-01-10")):
+        found = index.between(start, end)
+        assert [s["date"] for s in found] == sorted(s["date"] for s in found)
+        assert sorted(s["employee"] for s in found) == sorted(s["employee"] for s in live if start <= s["date"] <= end)
+
+
+def employee(name):
+    return {"name": name, "position": "Продавец", "phone": "", "email": ""}
+
+
+def test_delete_moves_last_record_into_the_gap(main):
+    with main.repo.session():
+        for i in range(5):
+            main.repo.add("employees", employee(f"e{i}"))
+    assert main.remove("employees", name="e1")["name"] == "e1"
+    rows = main.repo.all("employees")
+    assert [e["name"] for e in rows] == ["e0", "e4", "e2", "e3"]
+    assert [main.repo.positions[id(record)] for record in rows] == [0, 1, 2, 3]
+    assert main.repo.find("employees", {"name": "e4"}) is rows[1]
+    assert main.repo.find("employees", {"name": "e1"}) is None
+    assert main.remove("employees", name="e1") is None
+
+
+def test_random_deletes_keep_indexes_consistent(main):
+    random.seed(3)
+    sales = [sale(f"e{random.randint(1, 4)}", float(i), f"{TODAY[:7]}-0{random.randint(1, 5)}", random.choice("XY"))
+             for i in range(120)]
+    repo = main.repo
+    repo.bulk_insert("sales", [sales])
+    live = list(repo.all("sales"))
+    for _ in range(60):
+        record = random.choice(live)
+        removed = repo.remove("sales", {key: record[key] for key in main.KEYS["sales"]})
+        assert removed is not None
+        live.remove(removed)
+    assert sorted(map(id, repo.data["sales"])) == sorted(map(id, live))
+    assert {id(record): i for i, record in enumerate(repo.data["sales"])} == repo.positions
+    by_key = {}
+    for record in live:
+        by_key.setdefault((record["employee"], record["car"], record["date"]), []).append(id(record))
+    assert {key: sorted(bucket) for key, bucket in repo.indexes["sales"].items()} == \
+        {key: sorted(ids) for key, ids in by_key.items()}
+    for name, bucket in repo.sales_by_employee.items():
+        assert sorted(bucket) == sorted(id(record) for record in live if record["employee"] == name)
+
+
+def test_aggregates_top_matches_full_scan(main):
+    random.seed(4)
+    sales = [sale(f"e{random.randint(1, 6)}", float(i), f"2026-0{random.randint(1, 3)}-{random.randint(1, 28):02d}",
+                  f"c{random.randint(1, 4)}") for i in range(300)]
+    aggregates = main.SalesAggregates(sales[:200])
+    for record in sales[200:]:
+        aggregates.add(record)
+    for record in sales[:60]:
+        aggregates.remove(record)
+    live = sales[60:]
+    for start, end in (("2026-01-01", "2026-03-31"), ("2026-01-15", "2026-02-28"), ("2026-02-03", "2026-02-03")):
+        for field in ("employee", "car"):
+            expected = {}
+            for s in live:
+                if start <= s["date"] <= end:
+                    count, total = expected.get(s[field], (0, 0.0))
+                    expected[s[field]] = (count + 1, total + s["real_price"])
+            top = aggregates.top(field, start, end, None)
+            assert {name: (count, total) for name, count, total in top} == expected
+            assert [count for _, count, _ in aggregates.top(field, start, end, 2)] == \
+                sorted((count for count, _ in expected.values()), reverse=True)[:2]
+    for record in live:
+        aggregates.remove(record)
+    assert aggregates.days == [] and aggregates.by_day == {} and aggregates.by_month == {}
+
+
+def test_top_merges_archived_months(main):
+    old = [sale("ann", 1.0, "2024-01-05"), sale("ann", 2.0, "2024-01-06"), sale("bob", 3.0, "2024-01-07")]
+    main.repo.bulk_insert("sales", [old + [sale("bob", 4.0), sale("bob", 5.0)]])
+    assert list(main.repo.archive.months) == ["2024-01"]
+    assert main.repo.top("employee", "2024-01-01", TODAY, 2) == [("bob", 3, 12.0), ("ann", 2, 3.0)]
+    assert main.repo.top("employee", TODAY, TODAY) == [("bob", 2, 9.0)]
+
+
+def test_summary_follows_adds_and_deletes(main):
+    month = TODAY[:7]
+    main.repo.bulk_insert("sales", [[sale(f"e{i % 4}", float(i), f"{month}-0{i % 9 + 1}") for i in range(40)]])
+    period = (f"{month}-01", f"{month}-09")
+    main.repo.summary("employee", *period)
+    main.insert("sales", sale("new", 5.0, f"{month}-02"))
+    for i in (0, 7, 13):
+        main.remove("sales", employee=f"e{i % 4}", car="X", date=f"{month}-0{i % 9 + 1}")
+    for start, end in (period, (f"{month}-02", f"{month}-04")):
+        for field in ("employee", "car"):
+            expected = main.columnar.summarize(main.repo.all("sales"), field, ("real_price",), start, end)
+            assert main.repo.summary(field, start, end) == expected
+
+
+def test_sqlite_repository_matches_json(main, monkeypatch):
+    main.insert("cars", {"manufacturer": "M", "year": "2020", "model": "X", "cost_price": 100.0, "sale_price": 150.0})
+    records = [sale(f"e{i % 3}", 10.0 * i, f"2026-01-{i % 28 + 1:02d}", "XY"[i % 2]) for i in range(40)]
+    main.repo.bulk_insert("sales", [records + [sale("ann", 7.0)]])
+    main.remove("sales", employee="e1", car="Y", date="2026-01-02")
+    period = ("2026-01-01", TODAY)
+
+    def reports(repo):
+        return (sorted(tuple(s.values()) for s in repo.sales_between(*period)),
+                repo.summary("employee", *period), sorted(repo.top("car", *period, 2)),
+                {by: repo.margin(by, *period) for by in (None, "employee", "manufacturer", "month")},
+                sorted(tuple(s.values()) for s in repo.sales_of("e2")))
+
+    expected = reports(main.repo)
+    monkeypatch.setenv("STORAGE", "sqlite")
+    main = restart(main)
+    assert isinstance(main.repo, main.SqliteRepository)
+    assert reports(main.repo) == expected
+    main.insert("sales", sale("zed", 1.0))
+    main.remove("sales", employee="e0", car="X", date="2026-01-01")
+    main = restart(main)
+    assert len(main.repo.all("sales")) == 40
+    assert main.repo.sales_of("zed") == [sale("zed", 1.0)]
+    assert sorted(s["date"] for s in main.repo.sales_of("e0")) == \
+        sorted(f"2026-01-{i % 28 + 1:02d}" for i in range(3, 40, 3))
+
+
+def test_import_skips_bad_rows(main, tmp_path):
+    path = tmp_path / "sales.csv"
+    path.write_text("employee,car,date,real_price\nann,X,2026-01-05,10\n,X,2026-01-05,1\nbob,Y,05.03.2024,2\n"
+                    "bob,Y,2026-01-06,20.5\n", encoding="utf-8")
+    count, errors = main.import_sales(str(path))
+    assert count == 2
+    assert [line_no for line_no, _ in errors] == [3, 4]
+    path = tmp_path / "sales.jsonl"
+    path.write_text('{"employee": "cid", "car": "X", "date": "2026-01-07", "real_price": 5}\nnot json\n\n'
+                    '{"employee": "cid", "car": "X", "date": "2026-01-08"}\n', encoding="utf-8")
+    count, errors = main.import_sales(str(path))
+    assert count == 1
+    assert [line_no for line_no, _ in errors] == [2, 4]
+    assert sorted(s["employee"] for s in main.repo.all("sales")) == ["ann", "bob", "cid"]
+
+
+def test_import_reports_unreadable_files(main, tmp_path, capsys):
+    path = tmp_path / "sales.csv"
+    path.write_bytes(b"employee,car,date,real_price\nann,X,2026-01-05,10\nbob,X,2026-01-05,1\xff0\n")
+    count, errors = main.import_sales(str(path))
+    assert errors and errors[0][1].startswith("UnicodeDecodeError")
+    main.import_sales_file(str(tmp_path))
+    assert "Не удалось прочитать файл" in capsys.readouterr().out
+
+
+def test_export_round_trip(main, tmp_path):
+    sales = [sale("ann", 10.0, "2026-01-05"), sale("Борис", 20.5, "2026-01-06", "Y")]
+    for name in ("sales.csv", "sales.jsonl", "sales.json"):
+        path = str(tmp_path / name)
+        assert main.export_sales(sales, path) == 2
+        with open(path, encoding="utf-8", newline="") as file:
+            if name.endswith(".csv"):
+                assert [main.parse_sale(row) for row in csv.DictReader(file)] == sales
+            elif name.endswith(".jsonl"):
+                assert [main.parse_sale(line) for line in file] == sales
+            else:
+                assert json.load(file) == sales
+    assert main.import_sales(str(tmp_path / "sales.csv")) == (2, [])
+    assert main.export_sales([], str(tmp_path / "empty.json")) == 0
+    with open(tmp_path / "empty.json", encoding="utf-8") as file:
+        assert json.load(file) == []
+
+
+def test_codec_matches_json(main):
+    data = {"employees": [{"name": "Иван", "phone": ""}], "cars": [], "sales": [sale("a\"b", 1.5), sale("c", 2)],
+            "seq": 3, "nested": {"empty": {}, "none": None, "flag": True, "big": 1e300}}
+    assert main.CODEC.encode(data) == json.dumps(data, indent=4)
+
+
+def test_script_applies_good_lines_and_reports_bad_ones(main, tmp_path):
+    script = tmp_path / "commands.txt"
+    script.write_text("# продажи\nadd-sale ann X 2026-01-05 10\nadd-sale bob X 05.01.2026 10\n\n"
+                      "add-sale cid X 2026-01-06 abc\nnosuch\nadd-sale dan X 2026-01-07 20\n", encoding="utf-8")
+    result = subprocess.run([sys.executable, os.path.join(HERE, "main.py"), "script", str(script)],
+                            capture_output=True, text=True, env={**os.environ, "PYTHONPATH": HERE})
+    assert result.returncode == 1
+    assert [line.split(":")[0] for line in result.stderr.splitlines() if line.startswith("Строка")] == \
+        ["Строка 3", "Строка 5", "Строка 6"]
+    main = restart(main)
+    assert sorted(s["employee"] for s in main.repo.all("sales")) == ["ann", "dan"]
+
+
+def test_check_record_rejects_bad_dates(main):
+    for date in ("05.01.2026", "2026-1-5", "2026-02-30", 20260105):
+        with pytest.raises(ValueError):
+            main.check_record("sales", sale("ann", 1.0, date))
+    with pytest.raises(ValueError):
+        main.check_record("sales", sale("ann", "1.0"))
+    main.check_record("sales", sale("ann", 1))
+
+
+def test_margin_uses_archive_summaries(main):
+    with main.repo.session():
+        main.repo.add("cars", {"manufacturer": "M", "year": "2020", "model": "X", "cost_price": 100.0,
+                               "sale_price": 150.0})
+        for day in range(1, 29):
+            main.repo.add("sales", sale("ann", 120.0 + day, f"2024-03-{day:02d}"))
+            main.repo.add("sales", sale("bob", 130.0, f"2024-04-{day:02d}", car="Y"))
+        main.repo.needs_compact = True
+    repo = main.load_repository()
+    assert sorted(repo.archive.months) == ["2024-03", "2024-04"]
+    archived = repo.archive.all()
+    decoded = []
+    records = repo.archive.records
+    repo.archive.records = lambda month: decoded.append(month) or records(month)
+    for by in (None, "car", "manufacturer", "month"):
+        result = repo.margin(by, "2024-03-01", "2024-04-30")
+        assert decoded == []
+        expected = main.MARGIN.group(archived, repo._car, by)
+        assert result.keys() == expected.keys()
+        for name, row in expected.items():
+            assert result[name] == pytest.approx(row)
+    assert repo.margin(None, "2024-03-10", "2024-04-30")[None]["count"] == 19 + 28
+    assert decoded == ["2024-03"]
+
+
+def test_margin_from_aggregates_matches_join(main):
+    random.seed(2)
+    with main.repo.session():
+        for model, cost in (("X", 100.0), ("Y", 80.0)):
+            main.repo.add("cars", {"manufacturer": "M" + model, "year": "2020", "model": model, "cost_price": cost,
+                                   "sale_price": cost * 1.5})
+    start = datetime.date.today().replace(day=1)
+    sales = [sale(f"e{random.randint(1, 3)}", random.randint(90, 160) * 1.0,
+                  (start + datetime.timedelta(days=random.randint(0, 9))).isoformat(), random.choice("XYZ"))
+             for _ in range(60)]
+    main.repo.bulk_insert("sales", [sales])
+    main.repo.remove("sales", {key: sales[0][key] for key in main.KEYS["sales"]})
+    live = main.repo.all("sales")
+    end = (start + datetime.timedelta(days=9)).isoformat()
+    for period in ((start.isoformat(), end), ((start + datetime.timedelta(days=2)).isoformat(), end)):
+        hot = [s for s in live if period[0] <= s["date"] <= period[1]]
+        for by in (None, "employee", "car", "manufacturer", "month"):
+            result = main.repo.margin(by, *period)
+            expected = main.MARGIN.group(hot, main.repo._car, by)
+            assert result.keys() == expected.keys()
+            for name, row in expected.items():
+                assert result[name] == pytest.approx(row)
@@ -0,0 +1,57 @@
+import json
+
+import pytest
+
+import metrics
+
+
+@pytest.fixture
+def enabled(monkeypatch):
+    monkeypatch.setattr(metrics, "enabled", True)
+    monkeypatch.setattr(metrics, "_timers", {})
+    monkeypatch.setattr(metrics, "_counters", {})
+
+
+def test_histogram_percentiles():
+    histogram = metrics.Histogram()
+    for ms in [0.05] * 90 + [3] * 9 + [7000]:
+        histogram.observe(ms)
+    assert histogram.percentile(50) == 0.1
+    assert histogram.percentile(99) == 5
+    assert histogram.percentile(100) == 7000
+    row = histogram.to_dict()
+    assert (row["calls"], row["max_ms"], row["p50_ms"]) == (100, 7000, 0.1)
+    assert row["histogram"] == {"<=0.1ms": 90, "<=5ms": 9, ">5000ms": 1}
+    assert metrics.Histogram().to_dict()["mean_ms"] == 0.0
+
+
+def test_timed_and_counters(enabled, tmp_path):
+    @metrics.timed("work")
+    def work(fail):
+        if fail:
+            raise ValueError
+        return 42
+
+    assert work(False) == 42
+    with pytest.raises(ValueError):
+        work(True)
+    metrics.count("scanned", 3)
+    metrics.count("scanned")
+    data = metrics.snapshot()
+    assert data["timers"]["work"]["calls"] == 2
+    assert data["counters"] == {"scanned": 4}
+    report = metrics.report()
+    assert "work: 2 вызовов" in report and "scanned: 4" in report
+    path = str(tmp_path / "metrics.json")
+    metrics.dump(path)
+    with open(path, encoding="utf-8") as file:
+        assert json.load(file)["counters"] == {"scanned": 4}
+
+
+def test_timed_is_free_when_disabled(monkeypatch):
+    monkeypatch.setattr(metrics, "enabled", False)
+
+    def work():
+        return 1
+
+    assert metrics.timed("work")(work) is work
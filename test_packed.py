@@ -0,0 +1,51 @@
+import json
+
+import pytest
+
+import packed
+
+DATA = {
+    "employees": [{"name": "Иван", "phone": ""}, {"name": "Ann", "phone": "1"}],
+    "sales": [{"employee": f"e{i % 3}", "date": "2024-01-02", "price": i * 1.5} for i in range(packed.CHUNK + 10)],
+    "mixed": [{"a": 1}, {"a": 2, "b": {"c": [1]}}],
+    "empty": [],
+    "seq": 4,
+}
+
+
+def dump(data, path, compression="gzip"):
+    with open(path, "wb") as file:
+        packed.dump(data, file, compression=compression)
+
+
+@pytest.mark.parametrize("compression", ["gzip", "lzma", "none"])
+def test_round_trip(tmp_path, compression):
+    path = str(tmp_path / "data.jsonz")
+    dump(DATA, path, compression)
+    loaded = packed.load(path)
+    assert list(loaded) == list(DATA)
+    assert loaded == DATA
+
+
+def test_map_layout_round_trip(tmp_path):
+    data = {"1": {"lvl": 1, "occupants": []}, "7": {"lvl": 2, "occupants": [{"full_name": "Ян", "years_old": 4}]}}
+    path = str(tmp_path / "house.jsonz")
+    dump(data, path)
+    assert packed.load(path) == data
+
+
+def test_loads_plain_json(tmp_path):
+    path = tmp_path / "data.json"
+    path.write_text(json.dumps(DATA, indent=4), encoding="utf-8")
+    assert packed.load(str(path)) == DATA
+
+
+def test_truncated_file_is_rejected(tmp_path):
+    path = str(tmp_path / "data.jsonz")
+    dump(DATA, path, "none")
+    with open(path, "rb") as file:
+        lines = file.readlines()
+    with open(path, "wb") as file:
+        file.writelines(lines[:-1])
+    with pytest.raises(json.JSONDecodeError):
+        packed.load(path)
@@ -0,0 +1,54 @@
+from report_cache import ReportCache
+
+
+def cached(cache, key, value, **scope):
+    calls = []
+
+    def compute():
+        calls.append(key)
+        return value
+
+    cache.get(key, compute, **scope)
+    return cache.get(key, compute, **scope), len(calls)
+
+
+def test_month_touch_invalidates_overlapping_reports():
+    cache = ReportCache()
+    assert cached(cache, "jan", 1, months=("2024-01", "2024-01")) == (1, 1)
+    assert cached(cache, "q1", 2, months=("2024-01", "2024-03")) == (2, 1)
+    assert cached(cache, "apr", 3, months=("2024-04", "2024-04")) == (3, 1)
+    cache.touch("2024-02")
+    computed = []
+    for key, months in (("jan", ("2024-01", "2024-01")), ("q1", ("2024-01", "2024-03")),
+                        ("apr", ("2024-04", "2024-04"))):
+        cache.get(key, lambda: computed.append(key), months=months)
+    assert computed == ["q1"]
+    assert cache.stats()["hits"] == 5
+
+
+def test_tag_touch_invalidates_tagged_reports():
+    cache = ReportCache()
+    cache.get("joined", lambda: "a", months=("2024-01", "2024-01"), tags=("cars",))
+    cache.get("plain", lambda: "b", months=("2024-01", "2024-01"))
+    cache.get("ann", lambda: "c", tags=(("employee", "ann"),))
+    cache.touch(tags=("cars",))
+    assert cache.get("joined", lambda: "A", months=("2024-01", "2024-01"), tags=("cars",)) == "A"
+    assert cache.get("plain", lambda: "B", months=("2024-01", "2024-01")) == "b"
+    cache.touch("2024-01", (("employee", "bob"),))
+    assert cache.get("ann", lambda: "C", tags=(("employee", "ann"),)) == "c"
+    cache.touch("2024-05", (("employee", "ann"),))
+    assert cache.get("ann", lambda: "C", tags=(("employee", "ann"),)) == "C"
+
+
+def test_eviction_by_size():
+    cache = ReportCache(max_bytes=1000)
+    for i in range(20):
+        cache.get(i, lambda: "x" * 200)
+    stats = cache.stats()
+    assert stats["bytes"] <= 1000 and stats["entries"] == len(cache.entries) < 20
+    assert stats["evictions"] == 20 - stats["entries"]
+    assert list(cache.entries) == list(range(20 - stats["entries"], 20))
+    assert cache.get("big", lambda: "x" * 2000) == "x" * 2000 and "big" not in cache.entries
+    cache.clear()
+    assert cache.stats()["entries"] == cache.stats()["bytes"] == 0
+    assert "Кэш отчётов: 0 записей" in cache.report()
@@ -0,0 +1,72 @@
+import os
+
+import snapshot
+
+DATA = {
+    "employees": [{"name": "Иван", "position": "Продавец"}, {"name": "Ann", "position": "Менеджер"}],
+    "sales": [{"employee": f"e{i % 4}", "date": f"2024-01-{i % 28 + 1:02d}", "price": 100 + i, "profit": i / 2}
+              for i in range(50)],
+    "mixed": [{"a": 1}, {"b": [1, 2]}, {"a": 2 ** 70}],
+    "seq": 7,
+    "note": "текст",
+}
+
+
+def dump(data, path):
+    with open(path, "wb") as file:
+        snapshot.dump(data, file)
+
+
+def test_round_trip(tmp_path):
+    path = str(tmp_path / "data.snap")
+    dump(DATA, path)
+    assert snapshot.is_snapshot(path)
+    loaded = snapshot.load(path)
+    assert list(loaded) == list(DATA)
+    assert snapshot.to_plain(loaded) == DATA
+
+
+def test_map_layout_round_trip(tmp_path):
+    data = {"1": {"lvl": 1, "occupants": []}, "2": {"lvl": 3, "occupants": [{"full_name": "Ян", "years_old": 4}]}}
+    path = str(tmp_path / "house.snap")
+    dump(data, path)
+    assert snapshot.load(path) == data
+
+
+def test_resave_keeps_pool_and_rows(tmp_path):
+    path = str(tmp_path / "data.snap")
+    dump(DATA, path)
+    pool = snapshot.Snapshot(path).pool_count
+    for i in range(3):
+        data = snapshot.load(path)
+        data["sales"].append({"employee": "e1", "date": "2024-01-02", "price": 1, "profit": 0.5})
+        dump(data, path + ".tmp")
+        os.replace(path + ".tmp", path)
+    assert snapshot.Snapshot(path).pool_count == pool
+    sales = snapshot.load(path)["sales"]
+    assert len(sales) == 53
+    assert list(sales) == DATA["sales"] + [{"employee": "e1", "date": "2024-01-02", "price": 1, "profit": 0.5}] * 3
+
+
+def test_group_total_merges_tail(tmp_path):
+    path = str(tmp_path / "data.snap")
+    dump(DATA, path)
+    sales = snapshot.load(path)["sales"]
+    sales.append({"employee": "e1", "date": "2024-01-02", "price": 5, "profit": 1.0})
+    expected = {}
+    for record in list(sales):
+        expected[record["employee"]] = expected.get(record["employee"], 0) + record["price"]
+    assert sales.group_total("employee", "price") == expected
+    assert sales.total("price") == sum(record["price"] for record in sales)
+
+
+def test_table_edits(tmp_path):
+    path = str(tmp_path / "data.snap")
+    dump(DATA, path)
+    sales = snapshot.load(path)["sales"]
+    last = sales.pop()
+    sales[0] = last
+    assert len(sales) == 49
+    assert sales[0] == DATA["sales"][-1]
+    dump({"sales": sales}, path + ".2")
+    assert snapshot.to_plain(snapshot.load(path + ".2"))["sales"] == [DATA["sales"][-1]] + DATA["sales"][1:49]
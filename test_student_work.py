@@ -0,0 +1,145 @@
+import json
+
+import pytest
+
+from student_work import Apartment, Building, Portfolio, Resident, ResidentIndex, SqliteBuilding
+
+
+def open_building(path):
+    house = Building(save_delay=0, file_path=path)
+    house.import_data(path)
+    return house
+
+
+def residents(house, num):
+    return [person["full_name"] for person in house.apartment_details(num)["occupants"]]
+
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / "house_data.json")
+
+
+def test_sqlite_building_matches_json(tmp_path, path):
+    house = open_building(path)
+    with house.batch():
+        for num, lvl in ((1, 1), (2, 2), (3, 2), (4, 3)):
+            house.register_apartment(Apartment(num, lvl, "1к" if num % 2 else "2к"))
+        for num, name, age in ((1, "Анна", 30), (2, "Борис", 45), (3, "Анна", 62), (3, "Вера", 8)):
+            house.settle_resident(num, Resident(name, age))
+    db_path = str(tmp_path / "house_data.db")
+    database = SqliteBuilding(db_path)
+    database.import_data(path)
+    assert database.show_apartments() == house.show_apartments()
+    assert database.show_apartments(2, 2) == house.show_apartments(2, 2)
+    assert database.apartment_details(3) == house.apartment_details(3)
+    assert database.find_resident("Анна") == house.find_resident("Анна") == [1, 3]
+    assert database.search_residents(min_age=20, min_floor=2) == house.search_residents(min_age=20, min_floor=2)
+    database.settle_resident(4, Resident("Глеб", 5))
+    database.evict_resident(1, "Анна")
+    database.demolish_apartment(2)
+    reopened = SqliteBuilding(db_path)
+    reopened.import_data(path)
+    assert [apt["num"] for apt in reopened.show_apartments()] == [1, 3, 4]
+    assert reopened.find_resident("Анна") == [3]
+    assert reopened.apartment_details(4)["occupants"] == [{"full_name": "Глеб", "years_old": 5}]
+    assert not reopened.has_apartment(2)
+
+
+def test_written_file_matches_json(path):
+    house = open_building(path)
+    house.register_apartment(Apartment(1, 1, "студия"))
+    house.register_apartment(Apartment(12, 3, "2к \"угловая\""))
+    house.settle_resident(12, Resident("О'Брайен\tБ.", 41))
+    house.settle_resident(12, Resident("Ян", 4))
+    house.flush()
+    expected = {str(num): apartment.to_dict() for num, apartment in house.units.items()}
+    with open(path, encoding="utf-8") as file:
+        assert file.read() == json.dumps(expected, indent=4, ensure_ascii=False)
+    house.evict_resident(12, "Ян")
+    house.flush()
+    with open(path, encoding="utf-8") as file:
+        assert json.load(file)["12"]["occupants"] == [{"full_name": "О'Брайен\tБ.", "years_old": 41}]
+
+
+def test_floor_range_listing(path):
+    house = open_building(path)
+    for num, lvl in ((1, 1), (2, 1), (3, 2), (4, 4), (5, 4)):
+        house.register_apartment(Apartment(num, lvl, "1к"))
+    house.demolish_apartment(3)
+    assert [apt["num"] for apt in house.show_apartments(1, 2)] == [1, 2]
+    assert [apt["num"] for apt in house.show_apartments(min_floor=2)] == [4, 5]
+    assert [apt["num"] for apt in house.show_apartments(max_floor=3)] == [1, 2]
+    assert len(house.show_apartments()) == 4
+
+
+def test_resident_index_search():
+    apartments = [Apartment(num, num // 2, "1к") for num in range(6)]
+    for num, apartment in enumerate(apartments):
+        apartment.settle_resident(Resident(f"p{num}", 20 + num * 10))
+    index = ResidentIndex(apartments)
+    found = index.search(min_age=30, max_age=60, min_floor=1)
+    assert sorted(person.full_name for _, person in found) == ["p2", "p3", "p4"]
+    index.remove_apartment(apartments[2])
+    assert index.apartments_on(1, 1) == [3]
+    assert sorted(person.full_name for _, person in index.search(min_age=30, max_age=60)) == ["p1", "p3", "p4"]
+
+
+def test_pending_changes_merge_with_other_writer(path):
+    first = open_building(path)
+    for num in (1, 2, 3):
+        first.register_apartment(Apartment(num, num, "1к"))
+    second = open_building(path)
+    first.settle_resident(1, Resident("Анна", 30))
+    first.demolish_apartment(3)
+    with second.batch():
+        second.settle_resident(2, Resident("Борис", 40))
+        second.settle_resident(3, Resident("Вера", 50))
+        second.register_apartment(Apartment(4, 2, "2к"))
+    assert sorted(second.units) == [1, 2, 4]
+    assert residents(second, 1) == ["Анна"]
+    assert residents(second, 2) == ["Борис"]
+    first.evict_resident(2, "Борис")
+    reloaded = open_building(path)
+    assert sorted(reloaded.units) == [1, 2, 4]
+    assert residents(reloaded, 1) == ["Анна"]
+    assert residents(reloaded, 2) == []
+
+
+def test_merge_keeps_index_in_sync(path):
+    first = open_building(path)
+    first.register_apartment(Apartment(1, 5, "студия"))
+    second = open_building(path)
+    first.settle_resident(1, Resident("Анна", 30))
+    second.register_apartment(Apartment(2, 7, "студия"))
+    second.settle_resident(2, Resident("Анна", 31))
+    assert second.find_resident("Анна") == [1, 2]
+    assert [person["num"] for person in second.search_residents(min_floor=6)] == [2]
+
+
+def test_portfolio_recomputes_only_changed_buildings(tmp_path):
+    directory = str(tmp_path / "portfolio")
+    portfolio = Portfolio(directory)
+    for name in ("a", "b", "c"):
+        assert portfolio.add_building(name)
+    assert not portfolio.add_building("a")
+    with pytest.raises(ValueError):
+        portfolio.path("../a")
+    house = portfolio.building("a")
+    house.register_apartment(Apartment(1, 1, "1к"))
+    house.register_apartment(Apartment(2, 1, "2к"))
+    house.settle_resident(1, Resident("Анна", 34))
+    house.flush()
+    summary, changed = portfolio.collect()
+    assert changed == ["a", "b", "c"]
+    assert summary["a"]["apartments"] == 2 and summary["b"]["apartments"] == 0
+    assert portfolio.collect(workers=1) == (summary, [])
+    other = portfolio.building("b")
+    other.register_apartment(Apartment(1, 3, "1к"))
+    other.flush()
+    report = Portfolio(directory).report(workers=1)
+    assert (report["buildings"], report["recomputed"], report["apartments"], report["occupied"],
+            report["residents"]) == (3, 1, 3, 1, 1)
+    assert report["vacancy_by_category"] == {"1к": {"apartments": 2, "vacant": 1, "vacancy": 50.0},
+                                             "2к": {"apartments": 1, "vacant": 1, "vacancy": 100.0}}
+    assert report["age_distribution"] == {"30-39": 1}